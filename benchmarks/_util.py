@@ -0,0 +1,76 @@
+# benchmarks/_util.py
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, TypeVar
+
+from PIL import Image
+from pydantic_core import Url
+
+from mywbooks.download_manager import DownlaodManager
+
+T = TypeVar("T")
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+class MemoryDownloadManager(DownlaodManager):
+    """Serves bytes from a dict instead of the network (cache dir still used)."""
+
+    def __init__(self, base_cache_dir: Path, mapping: dict[str, bytes]) -> None:
+        super().__init__(base_cache_dir)
+        self._mapping = mapping
+
+    def get_data(
+        self,
+        url: Url,
+        *,
+        fileext: Optional[str] = None,
+        cache_filename: Optional[str] = None,
+        ignore_cache: bool = False,
+    ) -> bytes:
+        return self._mapping[str(url)]
+
+
+def make_jpeg_bytes(w: int, h: int, seed: int = 0) -> bytes:
+    """A noisy JPEG, so it does not compress to nothing."""
+    im = Image.effect_noise((w, h), 40 + seed % 20).convert("RGB")
+    b = BytesIO()
+    im.save(b, format="JPEG", quality=85)
+    return b.getvalue()
+
+
+def lorem_chapter(i: int, paragraphs: int = 40) -> str:
+    words = (
+        "the witch walked through the silent hall while ember light "
+        "flickered over ancient stone and whispered names of the fallen"
+    ).split()
+    out = [f"<h1>Chapter {i}</h1>"]
+    for p in range(paragraphs):
+        n = 60 + (i * 7 + p * 13) % 40
+        out.append(
+            "<p>" + " ".join(words[(i + p + k) % len(words)] for k in range(n)) + "</p>"
+        )
+    return "\n".join(out)
+
+
+def best_of(fn: Callable[[], T], repeat: int = 3) -> tuple[float, T]:
+    """Run `fn` `repeat` times, return (best wall time in seconds, last result)."""
+    best = float("inf")
+    result: T
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+@contextmanager
+def report(title: str) -> Iterator[None]:
+    print(f"== {title} ==")
+    yield
+    print()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# benchmarks/bench_api_concurrency.py
+#
+# Request throughput of GET /api/books at increasing concurrency: the
+# async route (async session) against the previous sync route, which holds
+# a threadpool thread for each request's whole DB round-trip. Requests go
+# in-process through the ASGI app, so only the server side is measured.
+# Requests that fail (a connection pool checkout timing out) are counted.
+#
+# Runs on a SQLite file; set MYWBOOKS_BENCH_POSTGRES_URL (e.g.
+# postgresql+psycopg://user:pw@localhost/bench) to also run on PostgreSQL.
+#
+#   uv run python -m benchmarks.bench_api_concurrency [concurrency...]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_ISSUER", "https://bench.test/auth/v1")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "bench")
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, contains_eager, sessionmaker
+
+from mywbooks import db, models
+from mywbooks.api.app import app
+from mywbooks.api.auth import CurrentUser, get_or_create_user_by_sub, verify_jwt
+from mywbooks.api.routers.books import BookOut
+from mywbooks.models import Base, ProviderKey
+
+BOOKS = 50
+REQUESTS = 2_000
+POOL_TIMEOUT = 5  # seconds; create_engine's default is 30
+SUB = "bench-user"
+
+
+@app.get("/bench/sync-books", response_model=list[BookOut])
+def list_my_books_sync(
+    user: CurrentUser, session: Session = Depends(db.get_db)
+) -> list[BookOut]:
+    # The route before it was async
+    local_user = get_or_create_user_by_sub(session, user)
+    q = (
+        select(models.Book)
+        .join(models.BookUser, models.BookUser.book_id == models.Book.id)
+        .outerjoin(models.Book.stats)
+        .options(contains_eager(models.Book.stats))
+        .where(
+            models.BookUser.user_id == local_user.id,
+            models.BookUser.in_library.is_(True),
+        )
+        .order_by(models.Book.title.asc())
+    )
+    return [BookOut.from_model(b) for b in session.scalars(q).all()]
+
+
+def seed(url: str) -> None:
+    engine = db.make_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User).values(
+                id=1,
+                email="bench@bench.test",
+                auth_provider="supabase",
+                auth_subject=SUB,
+            )
+        )
+        conn.execute(
+            insert(models.Book),
+            [
+                {
+                    "id": b,
+                    "provider": ProviderKey.ROYALROAD,
+                    "provider_fiction_uid": f"royalroad:{b}",
+                    "source_url": f"https://www.royalroad.com/fiction/{b}",
+                    "title": f"Book {b}",
+                    "language": "en",
+                }
+                for b in range(1, BOOKS + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.BookStats),
+            [{"book_id": b, "chapter_count": b} for b in range(1, BOOKS + 1)],
+        )
+        conn.execute(
+            insert(models.BookUser),
+            [{"user_id": 1, "book_id": b} for b in range(1, BOOKS + 1)],
+        )
+    engine.dispose()
+
+
+async def load(client: httpx.AsyncClient, path: str, concurrency: int) -> str:
+    """Throughput of REQUESTS requests, `concurrency` at a time, and failures."""
+    todo = iter(range(REQUESTS))
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in todo:
+            resp = await client.get(path)
+            errors += resp.status_code != 200
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rps = (REQUESTS - errors) / (time.perf_counter() - t0)
+    return f"{rps:>8.0f}/s {errors:>5} err"
+
+
+async def run(url: str, levels: list[int]) -> None:
+    seed(url)
+    engine = db.make_engine(url, pool_timeout=POOL_TIMEOUT)
+    async_engine = db.make_async_engine(url, pool_timeout=POOL_TIMEOUT)
+    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def get_db():  # type: ignore[no-untyped-def]
+        with SessionLocal() as session:
+            yield session
+
+    async def get_async_db():  # type: ignore[no-untyped-def]
+        async with AsyncSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[db.get_db] = get_db
+    app.dependency_overrides[db.get_async_db] = get_async_db
+    app.dependency_overrides[verify_jwt] = lambda: {"sub": SUB}
+
+    print(f"{engine.dialect.name}: {BOOKS} books per listing, {REQUESTS} requests")
+    print(f"{'concurrency':>11} {'sync route':>20} {'async route':>20}")
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        # Warm up both pools
+        await load(c, "/bench/sync-books", 10)
+        await load(c, "/api/books", 10)
+        for n in levels:
+            sync = await load(c, "/bench/sync-books", n)
+            async_ = await load(c, "/api/books", n)
+            print(f"{n:>11} {sync:>20} {async_:>20}")
+
+    app.dependency_overrides.clear()
+    await async_engine.dispose()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    print()
+
+
+def main(levels: list[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite:///{Path(tmp) / 'bench.db'}", levels))
+
+    pg_url = os.getenv("MYWBOOKS_BENCH_POSTGRES_URL")
+    if pg_url:
+        asyncio.run(run(pg_url, levels))
+    else:
+        print("(set MYWBOOKS_BENCH_POSTGRES_URL to also run on PostgreSQL)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1, 10, 100, 500])
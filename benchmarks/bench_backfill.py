@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# benchmarks/bench_backfill.py
+#
+# Moving legacy chapter HTML to the content store while the app keeps
+# writing: the previous migration step (all batches in one transaction)
+# against the batched backfill (one transaction per batch of ids). Reports
+# the duration of the move and the latency / failures of an app-like writer
+# committing small transactions next to it.
+#
+# Runs on a SQLite file; set MYWBOOKS_BENCH_POSTGRES_URL (e.g.
+# postgresql+psycopg://user:pw@localhost/bench) to also run on PostgreSQL.
+#
+#   uv run python -m benchmarks.bench_backfill [chapters] [pause]
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from sqlalchemy import Engine, insert, text, update
+from sqlalchemy.exc import OperationalError
+
+from mywbooks import models
+from mywbooks.content_store import encode_content, put_contents
+from mywbooks.db import make_engine
+from mywbooks.migrations import BACKFILLS, run_backfill, run_migrations
+from mywbooks.models import Base, ProviderKey
+
+from ._util import lorem_chapter
+
+BOOKS = 20
+
+
+def one_transaction(engine: Engine, pause: float) -> None:
+    # The migration step before backfills
+    select_batch = text(
+        "SELECT id, content_html FROM chapters "
+        "WHERE content_html IS NOT NULL AND content_hash IS NULL LIMIT 500"
+    )
+    update_chapter = text(
+        "UPDATE chapters SET content_hash = :content_hash, "
+        "content_size = :content_size, content_html = NULL WHERE id = :id"
+    )
+    with engine.begin() as conn:
+        while rows := conn.execute(select_batch).all():
+            contents = [(id_, encode_content(html)) for id_, html in rows]
+            put_contents(conn, (c for _, c in contents))
+            conn.execute(
+                update_chapter,
+                [
+                    {"id": id_, "content_hash": c.hash, "content_size": c.size}
+                    for id_, c in contents
+                ],
+            )
+
+
+def batched(engine: Engine, pause: float) -> None:
+    run_backfill(engine, BACKFILLS["chapters.content_hash"], pause=pause)
+
+
+def seed(engine: Engine, n: int) -> None:
+    Base.metadata.drop_all(engine)
+    for name in ("schema_migrations", "schema_backfills"):
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.Book),
+            [
+                {
+                    "id": b,
+                    "provider": ProviderKey.ROYALROAD,
+                    "provider_fiction_uid": f"royalroad:{b}",
+                    "source_url": f"https://www.royalroad.com/fiction/{b}",
+                    "title": f"Book {b}",
+                    "language": "en",
+                }
+                for b in range(1, BOOKS + 1)
+            ],
+        )
+        html = [lorem_chapter(i) for i in range(100)]
+        conn.execute(
+            insert(models.Chapter),
+            [
+                {
+                    "book_id": i % BOOKS + 1,
+                    "index": i // BOOKS,
+                    "title": f"Chapter {i}",
+                    "provider_chapter_id": f"royalroad:{i}",
+                    "source_url": f"https://www.royalroad.com/chapter/{i}",
+                    "is_fetched": True,
+                    # Unique content, as every chapter's is
+                    "content_html": f"<p>{i}</p>{html[i % 100]}",
+                }
+                for i in range(n)
+            ],
+        )
+
+
+def run(
+    name: str,
+    engine: Engine,
+    move: Callable[[Engine, float], None],
+    n: int,
+    pause: float,
+) -> None:
+    seed(engine, n)
+    latencies: list[float] = []
+    errors = 0
+    moving = threading.Event()
+    moving.set()
+
+    def writer() -> None:
+        # The app: small commits, e.g. a book's metadata refresh
+        nonlocal errors
+        book_id = 0
+        while moving.is_set():
+            book_id = book_id % BOOKS + 1
+            t0 = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        update(models.Book)
+                        .where(models.Book.id == book_id)
+                        .values(title=f"Book {book_id} ({t0:.0f})")
+                    )
+            except OperationalError:  # "database is locked"
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - t0)
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    t0 = time.perf_counter()
+    move(engine, pause)
+    elapsed = time.perf_counter() - t0
+    moving.clear()
+    thread.join()
+
+    lat = sorted(latencies) or [0.0]
+    p99 = lat[min(len(lat) - 1, int(0.99 * len(lat)))]
+    print(
+        f"  {name:<16} {elapsed:>7.2f}s   writer: {len(latencies):>5} commits  "
+        f"p99 {p99 * 1000:>8.1f}ms  max {lat[-1] * 1000:>8.1f}ms  errors {errors}"
+    )
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def main(n: int, pause: float) -> None:
+    print(f"{n} legacy chapters, pause {pause:g}s between batches")
+    with tempfile.TemporaryDirectory() as tmp:
+        print("sqlite")
+        url = f"sqlite:///{Path(tmp) / 'one.db'}"
+        run("one transaction", make_engine(url), one_transaction, n, pause)
+        url = f"sqlite:///{Path(tmp) / 'batched.db'}"
+        run("batched", make_engine(url), batched, n, pause)
+
+    pg_url = os.getenv("MYWBOOKS_BENCH_POSTGRES_URL")
+    if pg_url:
+        print("postgresql")
+        run("one transaction", make_engine(pg_url), one_transaction, n, pause)
+        run("batched", make_engine(pg_url), batched, n, pause)
+    else:
+        print("(set MYWBOOKS_BENCH_POSTGRES_URL to also run on PostgreSQL)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20_000, float(args[1]) if len(args) > 1 else 0.0)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# benchmarks/bench_chapter_upsert.py
+#
+# Chapter-index upsert of a ToC refresh: the previous per-ref SELECT loop
+# against the bulk upsert, for a first import, an unchanged refresh and a
+# refresh where a chapter inserted at the front renumbers all others.
+#
+# Runs on a SQLite file; set MYWBOOKS_BENCH_POSTGRES_URL (e.g.
+# postgresql+psycopg://user:pw@localhost/bench) to also run on PostgreSQL.
+#
+#   uv run python -m benchmarks.bench_chapter_upsert [sizes...]
+import os
+import sys
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+
+from pydantic_core import Url
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from mywbooks import models
+from mywbooks.book import ChapterRef
+from mywbooks.models import Base, ProviderKey
+from mywbooks.providers import Provider, get_provider_by_key
+from mywbooks.services.ingest import _upsert_chapter_index_from_refs
+
+from ._util import best_of
+
+Upsert = Callable[[Session, Provider, list[ChapterRef], int], None]
+
+
+def per_ref_loop(
+    db: Session, prov: Provider, refs: list[ChapterRef], book_id: int
+) -> None:
+    # The implementation before the bulk upsert: one SELECT per ref
+    for idx, ref in enumerate(refs):
+        existing = db.execute(
+            select(models.Chapter).where(
+                models.Chapter.book_id == book_id,
+                models.Chapter.provider_chapter_id == ref.id,
+            )
+        ).scalar_one_or_none()
+        if not existing:
+            db.add(
+                models.Chapter(
+                    book_id=book_id,
+                    index=idx,
+                    title=ref.title or f"Chapter {idx+1}",
+                    provider_chapter_id=ref.id,
+                    source_url=str(ref.url),
+                    published_at=ref.published_at,
+                    is_fetched=False,
+                )
+            )
+        else:
+            existing.index = idx
+            if ref.title:
+                existing.title = ref.title
+            existing.source_url = str(ref.url)
+    db.commit()
+
+
+def toc(ids: range) -> list[ChapterRef]:
+    return [
+        ChapterRef(
+            id=f"royalroad:{i}",
+            url=Url(f"https://www.royalroad.com/fiction/1/chapter/{i}"),
+            title=f"Chapter {i}",
+        )
+        for i in ids
+    ]
+
+
+def run(url: str, sizes: list[int]) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+
+    with SessionLocal() as db:
+        book = models.Book(
+            provider=ProviderKey.ROYALROAD,
+            provider_fiction_uid="royalroad:bench-upsert",
+            source_url="https://www.royalroad.com/fiction/1",
+            title="Bench",
+            language="en",
+        )
+        db.add(book)
+        db.commit()
+        book_id = book.id
+
+    def clear(db: Session) -> None:
+        db.execute(delete(models.Chapter).where(models.Chapter.book_id == book_id))
+        db.commit()
+
+    print(f"{engine.dialect.name}")
+    print(
+        f"{'chapters':>8} {'variant':<14} {'import':>10} {'refresh':>10} {'renumber':>10}"
+    )
+    for n in sizes:
+        refs = toc(range(1, n + 1))
+        renumbered = toc(range(0, 1)) + refs
+        for name, fn in [("per-ref loop", per_ref_loop), ("bulk", None)]:
+            upsert: Upsert = fn or _upsert_chapter_index_from_refs
+            repeat = 1 if (fn and n >= 10_000) else 3
+
+            def import_() -> None:
+                with SessionLocal() as db:
+                    clear(db)
+                    upsert(db, prov, refs, book_id)
+
+            def refresh(refs: list[ChapterRef]) -> Callable[[], None]:
+                def go() -> None:
+                    with SessionLocal() as db:
+                        upsert(db, prov, refs, book_id)
+
+                return go
+
+            tocs = [renumbered, refs]
+
+            def renumber() -> None:
+                # Alternates, so every call shifts all indexes by one
+                tocs.reverse()
+                refresh(tocs[0])()
+
+            t_import, _ = best_of(import_, repeat)
+            t_refresh, _ = best_of(refresh(refs), repeat)
+            t_renumber, _ = best_of(renumber, repeat)
+            print(
+                f"{n:>8} {name:<14} {t_import * 1000:>8.1f}ms {t_refresh * 1000:>8.1f}ms "
+                f"{t_renumber * 1000:>8.1f}ms"
+            )
+
+    with SessionLocal() as db:
+        clear(db)
+        db.execute(delete(models.Book).where(models.Book.id == book_id))
+        db.commit()
+    engine.dispose()
+    print()
+
+
+def main(sizes: list[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        run(f"sqlite:///{Path(tmp) / 'bench.db'}", sizes)
+
+    pg_url = os.getenv("MYWBOOKS_BENCH_POSTGRES_URL")
+    if pg_url:
+        run(pg_url, sizes)
+    else:
+        print("(set MYWBOOKS_BENCH_POSTGRES_URL to also run on PostgreSQL)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 1_000, 10_000])
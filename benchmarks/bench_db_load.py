@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# benchmarks/bench_db_load.py
+#
+# Concurrent read/write load against each database configuration: API-like
+# readers (library listing, a book's chapters) run next to worker-like
+# writers committing backfill batches, for a fixed time. Reports throughput,
+# latency percentiles and failed operations ("database is locked").
+#
+#   default  create_engine(url), as db.py did before: rollback journal
+#   tuned    mywbooks.db.make_engine(url): WAL, synchronous=NORMAL, ...
+#
+# Runs on a SQLite file; set MYWBOOKS_BENCH_POSTGRES_URL (e.g.
+# postgresql+psycopg://user:pw@localhost/bench) to also run on PostgreSQL.
+#
+#   uv run python -m benchmarks.bench_db_load [seconds] [readers] [writers]
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import Engine, create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from mywbooks import models
+from mywbooks.book_stats import bump_book_stats
+from mywbooks.db import make_engine
+from mywbooks.models import Base, ProviderKey
+
+BOOKS = 200
+CHAPTERS = 100
+USERS = 20
+BATCH = 50  # chapters per write transaction, as a backfill batch
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, seconds: float) -> str:
+        lat = sorted(self.latencies) or [0.0]
+
+        def pct(p: float) -> float:
+            return lat[min(len(lat) - 1, int(p * len(lat)))] * 1000
+
+        return (
+            f"{len(self.latencies) / seconds:>8.0f}/s  p50 {pct(0.5):>7.1f}ms  "
+            f"p99 {pct(0.99):>7.1f}ms  max {lat[-1] * 1000:>7.1f}ms  "
+            f"errors {self.errors}"
+        )
+
+
+def seed(engine: Engine) -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"id": u, "email": f"user{u}@bench.test"} for u in range(1, USERS + 1)],
+        )
+        conn.execute(
+            insert(models.Book),
+            [
+                {
+                    "id": b,
+                    "provider": ProviderKey.ROYALROAD,
+                    "provider_fiction_uid": f"royalroad:{b}",
+                    "source_url": f"https://www.royalroad.com/fiction/{b}",
+                    "title": f"Book {b}",
+                    "language": "en",
+                }
+                for b in range(1, BOOKS + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.BookUser),
+            [
+                {"user_id": b % USERS + 1, "book_id": b, "in_library": True}
+                for b in range(1, BOOKS + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.Chapter),
+            [
+                {
+                    "book_id": b,
+                    "index": i,
+                    "title": f"Chapter {i + 1}",
+                    "provider_chapter_id": f"royalroad:{b}:{i}",
+                    "source_url": f"https://www.royalroad.com/chapter/{b}/{i}",
+                    "is_fetched": False,
+                }
+                for b in range(1, BOOKS + 1)
+                for i in range(CHAPTERS)
+            ],
+        )
+
+
+def read(db: Session, rng: random.Random) -> None:
+    user_id = rng.randint(1, USERS)
+    db.execute(
+        select(models.Book, models.BookStats)
+        .join(models.BookUser, models.BookUser.book_id == models.Book.id)
+        .outerjoin(models.Book.stats)
+        .where(models.BookUser.user_id == user_id)
+    ).all()
+    db.execute(
+        select(models.Chapter.id, models.Chapter.title)
+        .where(models.Chapter.book_id == rng.randint(1, BOOKS))
+        .order_by(models.Chapter.index)
+    ).all()
+    db.rollback()
+
+
+def write(db: Session, rng: random.Random) -> None:
+    book_id = rng.randint(1, BOOKS)
+    ids = db.scalars(
+        select(models.Chapter.id).where(models.Chapter.book_id == book_id).limit(BATCH)
+    ).all()
+    db.execute(
+        update(models.Chapter),
+        [
+            {
+                "id": i,
+                "content_hash": f"{rng.getrandbits(256):064x}",
+                "is_fetched": True,
+            }
+            for i in ids
+        ],
+    )
+    bump_book_stats(db, book_id, fetched=len(ids), size=len(ids) * 20_000)
+    db.commit()
+
+
+def run(name: str, engine: Engine, seconds: float, readers: int, writers: int) -> None:
+    seed(engine)
+    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+    reads, writes = Stats(), Stats()
+    stop = time.monotonic() + seconds
+
+    def loop(
+        op: Callable[[Session, random.Random], None], stats: Stats, n: int
+    ) -> None:
+        rng = random.Random(n)
+        with SessionLocal() as db:
+            while time.monotonic() < stop:
+                t0 = time.perf_counter()
+                try:
+                    op(db, rng)
+                except OperationalError:  # "database is locked"
+                    db.rollback()
+                    stats.errors += 1
+                else:
+                    stats.latencies.append(time.perf_counter() - t0)
+
+    threads = [
+        threading.Thread(target=loop, args=(read, reads, n)) for n in range(readers)
+    ] + [
+        threading.Thread(target=loop, args=(write, writes, 1000 + n))
+        for n in range(writers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"  {name:<8} reads  {reads.summary(seconds)}")
+    print(f"  {'':<8} writes {writes.summary(seconds)}")
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def main(seconds: float, readers: int, writers: int) -> None:
+    print(f"{readers} readers, {writers} writers, {seconds:g}s each")
+    with tempfile.TemporaryDirectory() as tmp:
+        print("sqlite")
+        url = f"sqlite:///{Path(tmp) / 'default.db'}"
+        run("default", create_engine(url), seconds, readers, writers)
+        url = f"sqlite:///{Path(tmp) / 'tuned.db'}"
+        run("tuned", make_engine(url), seconds, readers, writers)
+
+    pg_url = os.getenv("MYWBOOKS_BENCH_POSTGRES_URL")
+    if pg_url:
+        print("postgresql")
+        run("default", create_engine(pg_url), seconds, readers, writers)
+        run("tuned", make_engine(pg_url), seconds, readers, writers)
+    else:
+        print("(set MYWBOOKS_BENCH_POSTGRES_URL to also run on PostgreSQL)")
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    seconds, readers, writers = args + [10.0, 8, 4][len(args) :]
+    main(seconds, int(readers), int(writers))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# benchmarks/bench_epub_compression.py
+#
+# Build time against output size for every EPUB compression preset.
+#
+#   uv run python -m benchmarks.bench_epub_compression [chapters] [images]
+import sys
+import tempfile
+from pathlib import Path
+
+from pydantic_core import Url
+
+from mywbooks.book import BookConfig, Chapter
+from mywbooks.ebook_generator import EbookGenerator, EbookGeneratorConfig
+from mywbooks.epub_writer import COMPRESSION_PRESETS, EpubCompression
+
+from ._util import MemoryDownloadManager, best_of, lorem_chapter, make_jpeg_bytes
+
+
+def main(n_chapters: int = 300, n_images: int = 40) -> None:
+    cover_url = "https://bench.test/cover.jpg"
+    image_urls = [f"https://bench.test/img{i}.jpg" for i in range(n_images)]
+    mapping = {cover_url: make_jpeg_bytes(600, 900)}
+    mapping.update({u: make_jpeg_bytes(800, 600, i) for i, u in enumerate(image_urls)})
+
+    presets = {"ebooklib-default": EpubCompression(6, store_precompressed=False)}
+    presets.update(COMPRESSION_PRESETS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        dm = MemoryDownloadManager(tmp_path, mapping)
+        css = tmp_path / "bench.css"
+        css.write_text("body { font-family: serif; }")
+
+        def build(compression: EpubCompression) -> int:
+            cfg = EbookGeneratorConfig(
+                book_config=BookConfig(
+                    title="Bench",
+                    language="en",
+                    author="Bench",
+                    cover_image=Url(cover_url),
+                ),
+                epub_css_filepath=str(css),
+                compression=compression,
+            )
+            gen = EbookGenerator("bench", dm, cfg)
+            for i in range(n_chapters):
+                html = lorem_chapter(i)
+                if n_images:
+                    html += f'<img src="{image_urls[i % n_images]}">'
+                gen.add_chapter(Chapter(f"Chapter {i}", html, {}, None))
+            out = tmp_path / "bench.epub"
+            gen.export_as_epub(out)
+            return out.stat().st_size
+
+        build(EpubCompression())  # warm the image cache
+
+        print(f"{n_chapters} chapters, {n_images} images")
+        print(f"{'preset':<18} {'build [s]':>10} {'size [KiB]':>11}")
+        for name, compression in presets.items():
+            seconds, size = best_of(lambda: build(compression))
+            print(f"{name:<18} {seconds:>10.3f} {size / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
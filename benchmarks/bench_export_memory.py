@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# benchmarks/bench_export_memory.py
+#
+# Peak Python memory of exporting a book from the DB, by chapter count: the
+# previous export (all chapter rows loaded, content kept in the generator)
+# against the streamed export (chunked rows, content spooled to disk).
+#
+#   uv run python -m benchmarks.bench_export_memory [sizes...]
+import sys
+import tempfile
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from pydantic_core import Url
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from mywbooks import models
+from mywbooks.book import BookConfig
+from mywbooks.book import Chapter as ChapterDTO
+from mywbooks.content_store import (
+    chapter_values,
+    encode_content,
+    put_contents,
+    read_chapter_html,
+)
+from mywbooks.ebook_generator import EbookGenerator, EbookGeneratorConfig
+from mywbooks.models import Base, ProviderKey
+from mywbooks.services.book_ops import export_book_to_epub_from_db
+
+from ._util import MemoryDownloadManager, lorem_chapter, make_jpeg_bytes
+
+COVER_URL = "https://bench.test/cover.jpg"
+
+
+def load_all(
+    db: Session, book: models.Book, cfg: EbookGeneratorConfig, out: Path, dm
+) -> None:
+    # The export before streaming: every row in a list, content in memory
+    rows = (
+        db.query(models.Chapter)
+        .filter(models.Chapter.book_id == book.id)
+        .order_by(models.Chapter.index)
+        .all()
+    )
+    gen = EbookGenerator(f"book-{book.id}", dm, cfg)
+    for chm in rows:
+        gen.add_chapter(ChapterDTO.from_model(chm, html=read_chapter_html(db, chm)))
+    gen.export_as_epub(out)
+
+
+def streamed(
+    db: Session, book: models.Book, cfg: EbookGeneratorConfig, out: Path, dm
+) -> None:
+    export_book_to_epub_from_db(db, book, cfg, out, dm=dm, ensure_content=False)
+
+
+def main(sizes: list[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        engine = create_engine(f"sqlite:///{tmp_path / 'bench.db'}")
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+        dm = MemoryDownloadManager(tmp_path, {COVER_URL: make_jpeg_bytes(600, 900)})
+        css = tmp_path / "bench.css"
+        css.write_text("body { font-family: serif; }")
+
+        print(f"{'chapters':>8} {'load all':>12} {'streamed':>12}")
+        for n in sizes:
+            with SessionLocal() as db:
+                book = models.Book(
+                    provider=ProviderKey.ROYALROAD,
+                    provider_fiction_uid=f"royalroad:bench-export-{n}",
+                    source_url=f"https://www.royalroad.com/fiction/{n}",
+                    title="Bench",
+                    language="en",
+                )
+                db.add(book)
+                db.commit()
+                contents = [encode_content(lorem_chapter(i)) for i in range(n)]
+                put_contents(db, contents)
+                db.execute(
+                    insert(models.Chapter),
+                    [
+                        {
+                            "book_id": book.id,
+                            "index": i,
+                            "title": f"Chapter {i + 1}",
+                            "provider_chapter_id": f"royalroad:{n}:{i}",
+                            "source_url": f"https://www.royalroad.com/chapter/{i}",
+                            "is_fetched": True,
+                            **chapter_values(c),
+                        }
+                        for i, c in enumerate(contents)
+                    ],
+                )
+                db.commit()
+                book_id = book.id
+            del contents
+
+            cfg = EbookGeneratorConfig(
+                book_config=BookConfig(
+                    title="Bench",
+                    language="en",
+                    author="Bench",
+                    cover_image=Url(COVER_URL),
+                ),
+                epub_css_filepath=str(css),
+            )
+
+            peaks = []
+            export: Callable[..., None]
+            for export in (load_all, streamed):
+                with SessionLocal() as db:
+                    book = db.get(models.Book, book_id)
+                    assert book is not None
+                    tracemalloc.start()
+                    export(db, book, cfg, tmp_path / "out.epub", dm)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                peaks.append(peak)
+
+            print(f"{n:>8} {peaks[0] / 2**20:>10.1f}MB {peaks[1] / 2**20:>10.1f}MB")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 500, 2_000])
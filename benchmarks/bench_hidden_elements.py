@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# benchmarks/bench_hidden_elements.py
+#
+# Cost of stripping the CSS-hidden anti-piracy elements from a RoyalRoad
+# chapter (examples/Untouchable_chapter-5.html): the old per-class pattern
+# (regex per <style>, then find_all per class) against the single pass,
+# next to the whole parse+extract time per backend.
+#
+#   uv run python -m benchmarks.bench_hidden_elements [repeat]
+import re
+import sys
+
+from bs4 import BeautifulSoup
+
+from mywbooks.parsing import available_parser_backends, get_parser_backend
+from mywbooks.providers.royalroad import RoyalRoadChapterPageExtractor
+
+from ._util import EXAMPLES_DIR, best_of
+
+PAGE = EXAMPLES_DIR / "Untouchable_chapter-5.html"
+
+
+def per_class(soup: BeautifulSoup) -> None:
+    # What the unused helpers did before
+    assert soup.head is not None
+    names = []
+    for style_tag in soup.head.find_all("style"):
+        m = re.search(r"\.(.*?)\s*{[^}]*display:\s*none;[^}]*}", style_tag.get_text())
+        if m:
+            names.append(m.group(1))
+    content = soup.select_one("div.chapter-inner")
+    assert content is not None
+    for name in names:
+        for el in content.find_all(class_=name):
+            el.extract()
+
+
+def main(repeat: int = 20) -> None:
+    page = PAGE.read_bytes()
+    ex = RoyalRoadChapterPageExtractor()
+
+    print(f"{'backend':<11} {'step':<26} {'time [ms]':>9}")
+    soups = iter([BeautifulSoup(page, "lxml") for _ in range(repeat)])
+    seconds, _ = best_of(lambda: per_class(next(soups)), repeat)
+    print(f"{'bs4':<11} {'strip, per class (old)':<26} {seconds * 1000:>9.3f}")
+
+    for name in available_parser_backends():
+        backend = get_parser_backend(name)
+
+        roots = iter([backend.parse(page, ex.REGIONS) for _ in range(repeat)])
+
+        def strip() -> int:
+            root = next(roots)
+            content = root.select_one("div.chapter-inner")
+            assert content is not None
+            hidden = ex.identify_hiddden_class_names(root)
+            return ex.dispose_hidden_elements(hidden, content)
+
+        strip_s, removed = best_of(strip, repeat)
+        total_s, _ = best_of(
+            lambda: ex.extract_nodes(backend.parse(page, ex.REGIONS)), repeat
+        )
+        print(
+            f"{name:<11} {f'strip, single pass ({removed})':<26} {strip_s * 1000:>9.3f}"
+        )
+        print(f"{'':<11} {'parse + extract (total)':<26} {total_s * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# benchmarks/bench_image_memory.py
+#
+# Peak Python memory of exporting an image-heavy book, against the total
+# size of its (resized) image payload.
+#
+#   uv run python -m benchmarks.bench_image_memory [images]
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from pydantic_core import Url
+
+from mywbooks.book import BookConfig, Chapter
+from mywbooks.ebook_generator import EbookGenerator, EbookGeneratorConfig
+
+from ._util import MemoryDownloadManager, make_jpeg_bytes
+
+
+def main(n_images: int = 150) -> None:
+    cover_url = "https://bench.test/cover.jpg"
+    image_urls = [f"https://bench.test/img{i}.jpg" for i in range(n_images)]
+    mapping = {cover_url: make_jpeg_bytes(600, 900)}
+    mapping.update({u: make_jpeg_bytes(1024, 768, i) for i, u in enumerate(image_urls)})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        dm = MemoryDownloadManager(tmp_path, mapping)
+        css = tmp_path / "bench.css"
+        css.write_text("body { font-family: serif; }")
+        cfg = EbookGeneratorConfig(
+            book_config=BookConfig(
+                title="Bench", language="en", author="Bench", cover_image=Url(cover_url)
+            ),
+            epub_css_filepath=str(css),
+        )
+
+        def export() -> EbookGenerator:
+            gen = EbookGenerator("bench", dm, cfg)
+            for i, u in enumerate(image_urls):
+                gen.add_chapter(Chapter(f"Chapter {i}", f'<img src="{u}">', {}, None))
+            gen.export_as_epub(tmp_path / "bench.epub")
+            return gen
+
+        gen = export()  # fill the resize cache, so only the export is measured
+        payload = sum(
+            p.stat().st_size
+            for im in gen.images_new.values()
+            if (p := im.image_path) is not None
+        )
+        del gen
+
+        tracemalloc.start()
+        gen = export()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{n_images} images")
+        print(f"image payload  {payload / 2**20:8.2f} MiB")
+        print(f"export peak    {peak / 2**20:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# benchmarks/bench_parser_backends.py
+#
+# Parse + extract time per HTML parser backend, on the pages in examples/.
+# RoyalRoad pages run the full chapter extraction; other pages only the
+# parse and a title lookup. The "bs4, per-call compile" row is the old
+# pattern: BeautifulSoup + select_one, recompiling every selector.
+#
+#   uv run python -m benchmarks.bench_parser_backends [repeat]
+import sys
+
+from bs4 import BeautifulSoup
+
+from mywbooks.models import ProviderKey
+from mywbooks.parsing import available_parser_backends, get_parser_backend
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.royalroad import RoyalRoadChapterPageExtractor
+
+from ._util import EXAMPLES_DIR, best_of
+
+PATREON_TITLE = 'span[data-tag="post-title"]'
+
+
+def legacy_rr(page: bytes) -> None:
+    soup = BeautifulSoup(page, "lxml")
+    ex = RoyalRoadChapterPageExtractor
+    for sel in ex.TITLE_SELECTORS:
+        if soup.select_one(sel) is not None:
+            break
+    for sel in ex.CONTENT_SELECTORS:
+        node = soup.select_one(sel)
+        if node is not None:
+            str(node)
+            break
+
+
+def main(repeat: int = 5) -> None:
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    pages = sorted(EXAMPLES_DIR.glob("*.html"))
+    backends = available_parser_backends()
+
+    print(f"{'page':<34} {'backend':<24} {'parse [ms]':>10} {'+extract [ms]':>14}")
+    for path in pages:
+        page = path.read_bytes()
+        is_rr = b"royalroad" in page[:20000].lower()
+
+        rows = []
+        if is_rr:
+            parse_s, _ = best_of(lambda: BeautifulSoup(page, "lxml"), repeat)
+            total_s, _ = best_of(lambda: legacy_rr(page), repeat)
+            rows.append(("bs4, per-call compile", parse_s, total_s))
+
+        for name in backends:
+            backend = get_parser_backend(name)
+            parse_s, _ = best_of(lambda: backend.parse(page), repeat)
+            if is_rr:
+                extract = lambda: prov.extract_chapter_html(page, parser=backend)
+            else:
+                extract = lambda: backend.parse(page).select_one(PATREON_TITLE)
+            total_s, _ = best_of(extract, repeat)
+            rows.append((name, parse_s, total_s))
+
+        label = path.name if len(path.name) <= 33 else path.name[:30] + "..."
+        for name, parse_s, total_s in rows:
+            print(
+                f"{label:<34} {name:<24} {parse_s * 1000:>10.2f} {total_s * 1000:>14.2f}"
+            )
+            label = ""
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# benchmarks/bench_partial_parsing.py
+#
+# Time and memory per chapter page when the parser builds the whole DOM
+# against only the regions the extractor needs, on the pages in examples/.
+# Memory is the tracemalloc peak during parse+extract and what the parsed
+# tree still holds afterwards (Python allocations only: lxml/lexbor trees
+# live in C and are not counted).
+#
+#   uv run python -m benchmarks.bench_partial_parsing [repeat]
+import gc
+import sys
+import tracemalloc
+from typing import Sequence
+
+from mywbooks.models import ProviderKey
+from mywbooks.parsing import (
+    ParserBackend,
+    Region,
+    available_parser_backends,
+    get_parser_backend,
+    regions,
+)
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.royalroad import RoyalRoadChapterPageExtractor
+
+from ._util import EXAMPLES_DIR, best_of
+
+RR_REGIONS = RoyalRoadChapterPageExtractor.REGIONS
+PATREON_REGIONS = regions('div[data-tag="post-card"]', "style")
+PATREON_TITLE = 'span[data-tag="post-title"]'
+
+
+def run(
+    backend: ParserBackend, page: bytes, is_rr: bool, rg: Sequence[Region] | None
+) -> object:
+    root = backend.parse(page, regions=rg)
+    if is_rr:
+        ex = RoyalRoadChapterPageExtractor()
+        found = ex.extract_nodes(root)
+        assert found is not None
+        found[1].html()
+    else:
+        assert root.select_one(PATREON_TITLE) is not None
+    return root
+
+
+def memory(fn) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = fn()
+        retained, peak = tracemalloc.get_traced_memory()
+        del kept
+    finally:
+        tracemalloc.stop()
+    return peak, retained
+
+
+def main(repeat: int = 5) -> None:
+    get_provider_by_key(ProviderKey.ROYALROAD)  # warm the registry
+
+    print(
+        f"{'page':<30} {'backend':<11} {'mode':<8} "
+        f"{'time [ms]':>9} {'peak [KiB]':>11} {'kept [KiB]':>11}"
+    )
+    for path in sorted(EXAMPLES_DIR.glob("*.html")):
+        page = path.read_bytes()
+        is_rr = b"royalroad" in page[:20000].lower()
+        rg = RR_REGIONS if is_rr else PATREON_REGIONS
+
+        label = path.name if len(path.name) <= 29 else path.name[:26] + "..."
+        for name in available_parser_backends():
+            backend = get_parser_backend(name)
+            for mode, mode_rg in [("full", None), ("regions", rg)]:
+                fn = lambda: run(backend, page, is_rr, mode_rg)
+                seconds, _ = best_of(fn, repeat)
+                peak, kept = memory(fn)
+                print(
+                    f"{label:<30} {name:<11} {mode:<8} {seconds * 1000:>9.2f}"
+                    f" {peak / 1024:>11.0f} {kept / 1024:>11.0f}"
+                )
+                label = ""
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# benchmarks/bench_patreon.py
+#
+# Patreon post extraction on examples/Netherwitch - 41 _ Patreon.html (600 KB):
+# the old full-soup DOM walk against the provider's embedded-JSON path, with
+# time and tracemalloc peak memory.
+#
+#   uv run python -m benchmarks.bench_patreon [repeat]
+import gc
+import sys
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from mywbooks.models import ProviderKey
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.patreon import Patreon_ChapterPageExtractor
+
+from ._util import EXAMPLES_DIR, best_of
+
+PAGE = EXAMPLES_DIR / "Netherwitch - 41 _ Patreon.html"
+
+
+def peak_memory(fn) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(repeat: int = 5) -> None:
+    page = PAGE.read_bytes()
+    prov = get_provider_by_key(ProviderKey.PATREON)
+    legacy = Patreon_ChapterPageExtractor()
+
+    def dom_walk() -> str:
+        out = legacy._walk_dom(BeautifulSoup(page, "lxml"))
+        assert out is not None
+        return str(out.content)
+
+    def embedded_json() -> str:
+        out = prov.extract_chapter_html(page)
+        assert out is not None
+        return out.content_html
+
+    print(f"{PAGE.name} ({len(page) // 1024} KiB)")
+    print(f"{'variant':<24} {'time [ms]':>10} {'peak [KiB]':>11}")
+    for name, fn in [
+        ("full soup + DOM walk", dom_walk),
+        ("embedded post JSON", embedded_json),
+    ]:
+        seconds, _ = best_of(fn, repeat)
+        print(f"{name:<24} {seconds * 1000:>10.2f} {peak_memory(fn) / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
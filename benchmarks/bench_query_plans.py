@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# benchmarks/bench_query_plans.py
+#
+# Query-plan audit of the hot queries: seeds a synthetic library, then
+# checks that every query's EXPLAIN plan uses its index (and no full scan of
+# the table) and that it runs within its latency budget. Exits non-zero on
+# a regression.
+#
+# Runs on a SQLite file; set MYWBOOKS_BENCH_POSTGRES_URL (e.g.
+# postgresql+psycopg://user:pw@localhost/bench) to also run on PostgreSQL.
+#
+#   uv run python -m benchmarks.bench_query_plans [books] [chapters-per-book]
+import os
+import sys
+import tempfile
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from sqlalchemy import Connection, Engine, create_engine, event, exists, insert, select
+from sqlalchemy import text as sql_text
+
+from mywbooks import models
+from mywbooks.content_store import missing_content
+from mywbooks.maintenance.cleanup import expired_tasks
+from mywbooks.models import Base, ProviderKey
+
+from ._util import best_of
+
+USERS = 50
+BOOKS_PER_USER = 100
+TASKS_PER_USER = 1_000
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+class HotQuery(NamedTuple):
+    name: str
+    stmt: Any
+    index: str  # must appear in the plan
+    table: str  # must not be scanned in full
+    budget_ms: float
+
+
+def hot_queries(book_id: int, user_id: int) -> list[HotQuery]:
+    Chapter, Task, BookUser = models.Chapter, models.Task, models.BookUser
+    return [
+        HotQuery(
+            "backfill: chapters missing content",
+            select(Chapter.id, Chapter.source_url, Chapter.title)
+            .where(Chapter.book_id == book_id, missing_content())
+            .order_by(Chapter.index.asc()),
+            "ix_chapters_book_missing_content",
+            "chapters",
+            5.0,
+        ),
+        HotQuery(
+            "export: any chapter missing content",
+            select(exists().where(Chapter.book_id == book_id, missing_content())),
+            "ix_chapters_book_missing_content",
+            "chapters",
+            5.0,
+        ),
+        HotQuery(
+            "export: fetched chapters in order",
+            select(Chapter.id, Chapter.title, Chapter.content_hash)
+            .where(Chapter.book_id == book_id, Chapter.is_fetched.is_(True))
+            .order_by(Chapter.index.asc()),
+            "ix_chapters_book_fetched_index",
+            "chapters",
+            20.0,
+        ),
+        HotQuery(
+            "GET /tasks: a user's tasks, newest first",
+            select(Task)
+            .where(Task.user_id == user_id)
+            .order_by(Task.created_at.desc())
+            .limit(50),
+            "ix_tasks_user_created",
+            "tasks",
+            5.0,
+        ),
+        HotQuery(
+            "cleanup: expired tasks",
+            select(Task.id).where(expired_tasks(NOW)),
+            "ix_tasks_status_finished",
+            "tasks",
+            50.0,
+        ),
+        HotQuery(
+            "GET /books: a user's library",
+            select(models.Book, models.BookStats)
+            .join(BookUser, BookUser.book_id == models.Book.id)
+            .outerjoin(models.Book.stats)
+            .where(BookUser.user_id == user_id, BookUser.in_library.is_(True))
+            .order_by(models.Book.title.asc()),
+            "ix_book_users_user_in_library",
+            "book_users",
+            10.0,
+        ),
+    ]
+
+
+def seed(engine: Engine, n_books: int, n_chapters: int) -> None:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"id": u, "email": f"user{u}@bench.test"} for u in range(1, USERS + 1)],
+        )
+        conn.execute(
+            insert(models.Book),
+            [
+                {
+                    "id": b,
+                    "provider": ProviderKey.ROYALROAD,
+                    "provider_fiction_uid": f"royalroad:{b}",
+                    "source_url": f"https://www.royalroad.com/fiction/{b}",
+                    "title": f"Book {b}",
+                    "language": "en",
+                }
+                for b in range(1, n_books + 1)
+            ],
+        )
+        conn.execute(
+            insert(models.BookUser),
+            [
+                {
+                    "user_id": u,
+                    "book_id": (u * 7 + k) % n_books + 1,
+                    "in_library": k % 10 != 0,
+                }
+                for u in range(1, USERS + 1)
+                for k in range(min(BOOKS_PER_USER, n_books))
+            ],
+        )
+        for b in range(1, n_books + 1):
+            # Most chapters fetched; the last few of every book still missing
+            conn.execute(
+                insert(models.Chapter),
+                [
+                    {
+                        "book_id": b,
+                        "index": i,
+                        "title": f"Chapter {i + 1}",
+                        "provider_chapter_id": f"royalroad:{b}:{i}",
+                        "source_url": f"https://www.royalroad.com/chapter/{b}/{i}",
+                        "is_fetched": i < n_chapters - 3,
+                        "content_hash": (
+                            f"{b:032x}{i:032x}" if i < n_chapters - 3 else None
+                        ),
+                    }
+                    for i in range(n_chapters)
+                ],
+            )
+        statuses = list(models.TaskStatus)
+        conn.execute(
+            insert(models.Task),
+            [
+                {
+                    "type": models.TaskType.DOWNLOAD_BOOK,
+                    "status": statuses[t % len(statuses)],
+                    "user_id": u,
+                    "book_id": t % n_books + 1,
+                    "created_at": NOW - timedelta(hours=t),
+                    "finished_at": NOW - timedelta(hours=t),
+                }
+                for u in range(1, USERS + 1)
+                for t in range(TASKS_PER_USER)
+            ],
+        )
+    with engine.begin() as conn:
+        # Planner statistics
+        conn.execute(sql_text("ANALYZE"))
+
+
+def explain(conn: Connection, stmt: Any) -> str:
+    conn.info["explain"] = True
+    try:
+        return "\n".join(str(row[-1]) for row in conn.execute(stmt).cursor.fetchall())
+    finally:
+        conn.info["explain"] = False
+
+
+def audit(query: HotQuery, plan: str, dialect: str) -> list[str]:
+    problems = []
+    if query.index not in plan:
+        problems.append(f"does not use {query.index}")
+    full_scan = (
+        f"Seq Scan on {query.table}"
+        if dialect == "postgresql"
+        else f"SCAN {query.table}"
+    )
+    # In SQLite, "SCAN t USING INDEX" walks the whole index as well
+    if any(line.strip().startswith(full_scan) for line in plan.splitlines()):
+        problems.append(f"scans all of {query.table}")
+    return problems
+
+
+def run(url: str, n_books: int, n_chapters: int) -> bool:
+    engine = create_engine(url)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _explain(
+        conn: Connection, cursor: Any, statement: str, params: Any, *args: Any
+    ) -> tuple[str, Any]:
+        if conn.info.get("explain"):
+            if engine.dialect.name == "postgresql":
+                return "EXPLAIN " + statement, params
+            return "EXPLAIN QUERY PLAN " + statement, params
+        return statement, params
+
+    Base.metadata.drop_all(engine)
+    seed(engine, n_books, n_chapters)
+    print(
+        f"{engine.dialect.name}: {n_books} books, {n_books * n_chapters} chapters, "
+        f"{USERS * TASKS_PER_USER} tasks"
+    )
+
+    ok = True
+    with engine.connect() as conn:
+        for query in hot_queries(book_id=n_books // 2, user_id=USERS // 2):
+            plan = explain(conn, query.stmt)
+            execute: Callable[[], Any] = lambda: conn.execute(query.stmt).all()
+            t, rows = best_of(execute, 5)
+            problems = audit(query, plan, engine.dialect.name)
+            if t * 1000 > query.budget_ms:
+                problems.append(f"over budget ({query.budget_ms:g}ms)")
+            ok = ok and not problems
+
+            status = "ok" if not problems else "FAIL: " + "; ".join(problems)
+            print(
+                f"  {query.name:<42} {t * 1000:>7.2f}ms {len(rows):>6} rows  {status}"
+            )
+            for line in plan.splitlines():
+                print(f"      {line}")
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    print()
+    return ok
+
+
+def main(n_books: int, n_chapters: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = run(f"sqlite:///{Path(tmp) / 'bench.db'}", n_books, n_chapters)
+
+    pg_url = os.getenv("MYWBOOKS_BENCH_POSTGRES_URL")
+    if pg_url:
+        ok = run(pg_url, n_books, n_chapters) and ok
+    else:
+        print("(set MYWBOOKS_BENCH_POSTGRES_URL to also run on PostgreSQL)")
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [1_000, 200][len(args) :]))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# benchmarks/bench_url_layer.py
+#
+# URL parsing + hashing cost of a 2,000-link ToC: the pre-interning pattern
+# (Url() and md5 per use) against the interned canonical_url layer, on a
+# first and a repeated ToC refresh.
+#
+#   uv run python -m benchmarks.bench_url_layer [links]
+import hashlib
+import sys
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from pydantic_core import Url
+
+from mywbooks.providers.royalroad import _collect_rr_chapter_links
+from mywbooks.urls import _canonical_url, canonical_url, md5_hex
+
+from ._util import best_of
+
+BASE = "https://www.royalroad.com/fiction/21220/mother-of-learning"
+
+
+def toc_html(n: int) -> str:
+    rows = "".join(
+        f'<tr><td><a href="/fiction/21220/mother-of-learning/chapter/{100000 + i}/'
+        f'chapter-{i}">Chapter {i}</a></td></tr>'
+        for i in range(n)
+    )
+    return f'<html><body><table id="chapters">{rows}</table></body></html>'
+
+
+def uncached(hrefs: list[str]) -> None:
+    # What ToC discovery did per link: Url() for the id, twice more for the
+    # ref, and md5 for every cache filename lookup
+    for href in hrefs:
+        full = urljoin(BASE, href)
+        Url(full), Url(full), Url(full)
+        hashlib.md5(str(Url(full)).encode("utf-8")).hexdigest()
+
+
+def interned(hrefs: list[str]) -> None:
+    for href in hrefs:
+        cu = canonical_url(href, BASE)
+        canonical_url(cu.text).url, cu.hash
+
+
+def main(n: int = 2000) -> None:
+    soup = BeautifulSoup(toc_html(n), "lxml")
+    hrefs = [str(a["href"]) for a in soup.select("a")]
+
+    def cold() -> None:
+        _canonical_url.cache_clear()
+        md5_hex.cache_clear()
+        interned(hrefs)
+
+    print(f"{n} ToC links")
+    print(f"{'variant':<28} {'time [ms]':>10}")
+    for name, fn in [
+        ("Url()+md5 per use", lambda: uncached(hrefs)),
+        ("canonical_url, first refresh", cold),
+        ("canonical_url, next refresh", lambda: interned(hrefs)),
+        ("_collect_rr_chapter_links", lambda: _collect_rr_chapter_links(BASE, soup)),
+    ]:
+        seconds, _ = best_of(fn, repeat=5)
+        print(f"{name:<28} {seconds * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -13,7 +13,7 @@ from contextlib import asynccontextmanager
 from fastapi import APIRouter, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from ..db import init_db
+from ..db import close_async_db, init_db
 from .auth import CurrentUser
 from .routers import books
 
@@ -23,6 +23,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Startup
     init_db()
     yield
+    await close_async_db()
 
 
 app = FastAPI(
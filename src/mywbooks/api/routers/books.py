@@ -1,22 +1,25 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.responses import FileResponse
 from pydantic import BaseModel, HttpUrl, model_validator
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager
 
 from mywbooks import models
 from mywbooks.api.auth import CurrentUser, get_or_create_user_by_sub
 from mywbooks.book import EPUB_DIR
-from mywbooks.db import get_db
+from mywbooks.db import get_async_db, get_db
 from mywbooks.download_manager import DownlaodManager, get_dm
 from mywbooks.library import add_book_to_user
 from mywbooks.services import ingest
 from mywbooks.tasks import download_book_task
+from mywbooks.utils import ensure_aware
 
 router = APIRouter()
 
@@ -35,6 +38,61 @@ class AddRoyalRoadBody(BaseModel):
         return self
 
 
+class AddPatreonBody(BaseModel):
+    url: Optional[HttpUrl] = None  # collection URL
+    collection_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_at_least_one(self) -> "AddPatreonBody":
+        if not self.url and not self.collection_id:
+            raise ValueError("Either 'url' or 'collection_id' must be provided")
+        return self
+
+
+class DownloadBookBody(BaseModel):
+    """
+    Export options for a download. With mode="delta" only the chapters after
+    `since_index` and/or `since` are packaged; with neither given, the chapters
+    since the last delivery to this user (all of them if never delivered).
+    """
+
+    mode: Literal["full", "delta"] = "full"
+    since_index: Optional[int] = None  # 0-based chapter index (exclusive)
+    since: Optional[datetime] = None
+
+    # Zip compression preset, "small" trades build time for size
+    compression: Literal["fast", "small"] = "fast"
+
+    @model_validator(mode="after")
+    def check_delta_bounds(self) -> "DownloadBookBody":
+        if self.mode == "full" and (self.since_index is not None or self.since):
+            raise ValueError("'since_index' and 'since' require mode 'delta'")
+        return self
+
+
+class BookStatsOut(BaseModel):
+    chapter_count: int
+    fetched_count: int
+    total_bytes: int
+    latest_chapter_index: Optional[int] = None
+    latest_published_at: Optional[datetime] = None
+    content_fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, b: models.Book) -> Optional["BookStatsOut"]:
+        s = b.stats
+        if s is None:
+            return None
+        return cls(
+            chapter_count=s.chapter_count,
+            fetched_count=s.fetched_count,
+            total_bytes=s.total_bytes,
+            latest_chapter_index=s.latest_chapter_index,
+            latest_published_at=ensure_aware(s.latest_published_at),
+            content_fingerprint=b.content_fingerprint,
+        )
+
+
 class BookOut(BaseModel):
     id: int
     provider: str
@@ -44,6 +102,7 @@ class BookOut(BaseModel):
     author: Optional[str] = None
     language: Optional[str] = None
     cover_url: Optional[str] = None
+    stats: Optional[BookStatsOut] = None
 
     @classmethod
     def from_model(cls, b: models.Book) -> "BookOut":
@@ -58,6 +117,7 @@ class BookOut(BaseModel):
             author=b.author,
             language=b.language,
             cover_url=b.cover_url,
+            stats=BookStatsOut.from_model(b),
         )
 
 
@@ -110,22 +170,56 @@ def add_royalroad_book(
     return BookOut.from_model(book)
 
 
-@router.get("", response_model=list[BookOut])
-def list_my_books(user: CurrentUser, db: Session = Depends(get_db)) -> list[BookOut]:
+@router.post("/patreon", response_model=BookOut, status_code=201)
+def add_patreon_book(
+    body: AddPatreonBody,
+    user: CurrentUser,
+    db: Session = Depends(get_db),
+    dm: DownlaodManager = Depends(get_dm),
+) -> BookOut:
     """
-    List books the current user has in their library (subscriptions).
+    Upsert a Patreon collection as a book and subscribe the current user.
     """
+    url = (
+        str(body.url)
+        if body.url
+        else f"https://www.patreon.com/collection/{body.collection_id}"
+    )
+    try:
+        book_id = ingest.upsert_book_from_url(db, models.ProviderKey.PATREON, url, dm)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     local_user = get_or_create_user_by_sub(db, user)
+    add_book_to_user(db, local_user.id, book_id)
+
+    book = db.get(models.Book, book_id)
+    if not book:
+        raise HTTPException(status_code=500, detail="Book upserted but not found.")
+    return BookOut.from_model(book)
+
+
+@router.get("", response_model=list[BookOut])
+async def list_my_books(
+    user: CurrentUser, db: AsyncSession = Depends(get_async_db)
+) -> list[BookOut]:
+    """
+    List books the current user has in their library (subscriptions), with
+    their stats, in one query.
+    """
+    local_user = await db.run_sync(get_or_create_user_by_sub, user)
 
     q = (
         select(models.Book)
         .join(models.BookUser, models.BookUser.book_id == models.Book.id)
+        .outerjoin(models.Book.stats)
+        .options(contains_eager(models.Book.stats))
         .where(
             models.BookUser.user_id == local_user.id, models.BookUser.in_library == True
         )  # noqa: E712
         .order_by(models.Book.title.asc())
     )
-    rows = db.execute(q).scalars().all()
+    rows = (await db.scalars(q)).all()
     return [BookOut.from_model(b) for b in rows]
 
 
@@ -156,11 +250,15 @@ def unsubscribe_book(
 # TODO: Here there should be some more generate config
 @router.post("/{book_id}/download")
 def download_book_now(
-    book_id: int, user: CurrentUser, db: Session = Depends(get_db)
+    book_id: int,
+    user: CurrentUser,
+    body: Optional[DownloadBookBody] = None,
+    db: Session = Depends(get_db),
 ) -> DownloadBookNowResponse:
     """
     Queue a download/export job and return a task id the client can poll.
     """
+    body = body or DownloadBookBody()
     local_user = get_or_create_user_by_sub(db, user)
 
     # Must be subscribed
@@ -174,13 +272,26 @@ def download_book_now(
     if not rel:
         raise HTTPException(status_code=403, detail="Not subscribed to this book.")
 
+    payload: dict[str, Any] = {"epub-compression": body.compression}
+    if body.mode == "delta":
+        # Resolve "since last delivery" now, so the task exports exactly that
+        since = ensure_aware(body.since)
+        if body.since_index is None and since is None:
+            since = ensure_aware(rel.last_sent_at)
+
+        payload["export-mode"] = body.mode
+        if body.since_index is not None:
+            payload["since-index"] = body.since_index
+        if since is not None:
+            payload["since-date"] = since.astimezone(timezone.utc).isoformat()
+
     # Create a Task row
     task = models.Task(
         type=models.TaskType.DOWNLOAD_BOOK,
         status=models.TaskStatus.QUEUED,
         user_id=local_user.id,
         book_id=book_id,
-        payload=None,
+        payload=payload,
     )
     db.add(task)
     db.commit()
@@ -221,6 +332,9 @@ def download_book_for_task(
         )
 
     payload = task.payload or {}
+    if payload.get("nothing-to-export"):
+        # A delta with no chapters since the last delivery
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
     output_path = payload.get("output_path")
     if not output_path:
         raise HTTPException(
@@ -5,11 +5,12 @@ from fastapi import APIRouter, Depends, Query, status
 from fastapi.exceptions import HTTPException
 from pydantic import BaseModel
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from mywbooks import models
 from mywbooks.api.auth import CurrentUser, get_or_create_user_by_sub
-from mywbooks.db import get_db  # adjust path if needed
+from mywbooks.db import get_async_db, get_db
 from mywbooks.models import Task, TaskStatus
 from mywbooks.task_cleanup import run_task_cleanup  # adjust imports
 
@@ -45,9 +46,9 @@ class CleanupResponse(BaseModel):
 
 
 @router.get("", response_model=list[TaskOut])
-def list_my_tasks(
+async def list_my_tasks(
     current_user: CurrentUser,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     status: TaskStatus | None = Query(
         default=None,
         description="Optional filter by task status",
@@ -68,7 +69,7 @@ def list_my_tasks(
     List all tasks owned by the current user.
     """
 
-    local_user = get_or_create_user_by_sub(db, current_user)
+    local_user = await db.run_sync(get_or_create_user_by_sub, current_user)
 
     # 🔐 Ownership filter
     stmt = select(Task).where(Task.user_id == local_user.id)
@@ -80,19 +81,18 @@ def list_my_tasks(
     # Order newest first + pagination
     stmt = stmt.order_by(Task.created_at.desc()).offset(offset).limit(limit)
 
-    tasks: Sequence[Task] = db.scalars(stmt).all()
+    tasks: Sequence[Task] = (await db.scalars(stmt)).all()
 
     return tasks
 
 
 @router.get("/{task_id}")
-def get_task(
-    task_id: int, user: CurrentUser, db: Session = Depends(get_db)
+async def get_task(
+    task_id: int, user: CurrentUser, db: AsyncSession = Depends(get_async_db)
 ) -> dict[str, Any]:
-    # TODO: Check user
-    local_user = get_or_create_user_by_sub(db, user)
+    local_user = await db.run_sync(get_or_create_user_by_sub, user)
 
-    task = db.get(models.Task, task_id)
+    task = await db.get(models.Task, task_id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
@@ -1,16 +1,16 @@
 import logging
 import re
 from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
 from typing import NamedTuple, Optional
-from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from pydantic_core import Url
 
 from . import models
 from .download_manager import DownlaodManager
-from .utils import url_hash
+from .urls import UrlLike, canonical_url
 
 DEFAULT_COVER_URL = Url("https://www.royalroad.com/favicon.ico")
 EPUB_DIR = Path("var/epubs").absolute()
@@ -24,29 +24,47 @@ class Image:
     url: Url
     url_hash: ImageID
     # image_hash ? TODO: It would be cool to hash the image itself
-    image_data: Optional[bytes] = None
+
+    # Handle to the resized image in the download cache. The payload itself
+    # stays on disk, so a book's images are never all in memory at once.
+    image_path: Optional[Path] = None
 
     @staticmethod
-    def by_src_url(src_url: Url) -> "Image":
-        return Image(url=src_url, url_hash=url_hash(src_url))
+    def by_src_url(src_url: UrlLike, base: Optional[str] = None) -> "Image":
+        cu = canonical_url(src_url, base)
+        return Image(url=cu.url, url_hash=cu.hash)
+
+    @property
+    def image_data(self) -> bytes | None:
+        """The resized image bytes, read from disk on every access."""
+        if self.image_path is None:
+            return None
+        return self.image_path.read_bytes()
 
-    def get_image_data(
+    def get_image_path(
         self, dm: DownlaodManager, max_width: int = 1024, max_height: int = 1024
-    ) -> bytes | None:
-        if self.image_data is not None:
-            return self.image_data
+    ) -> Path | None:
+        if self.image_path is not None:
+            return self.image_path
 
         try:
-            self.image_data = dm.get_and_cache_image_data(
+            self.image_path = dm.get_and_cache_image_path(
                 self.url, max_width=max_width, max_height=max_height
             )
-            return self.image_data
+            return self.image_path
         except Exception as e:
             logging.error(str(e))
 
             # TODO: Report this in the download status.
             return None
 
+    def get_image_data(
+        self, dm: DownlaodManager, max_width: int = 1024, max_height: int = 1024
+    ) -> bytes | None:
+        if self.get_image_path(dm, max_width, max_height) is None:
+            return None
+        return self.image_data
+
     def get_id(self) -> ImageID:
         return self.url_hash
 
@@ -67,6 +85,7 @@ class ChapterRef:
     id: str  # provider chapter id, e.g. "royalroad:21220:ch-123"
     url: Url  # absolute chapter URL
     title: Optional[str] = None
+    published_at: Optional[datetime] = None
 
 
 class Chapter(NamedTuple):
@@ -76,6 +95,9 @@ class Chapter(NamedTuple):
 
     source_url: Optional[str]
 
+    # Stable identifier, e.g. the provider chapter id "royalroad:1269041"
+    id: Optional[str] = None
+
     def get_content(self, include_images: bool, include_chapter_title: bool) -> str:
         content: list[str] = []
 
@@ -91,26 +113,27 @@ class Chapter(NamedTuple):
         return "".join(content)
 
     @classmethod
-    def from_model(cls, model: models.Chapter) -> "Chapter":
+    def from_model(cls, model: models.Chapter, html: str | None = None) -> "Chapter":
+        """`html`: the content, as read from the content store (see content_store)"""
         if not model.is_fetched:
             raise RuntimeError("Trying to turn unfetched chapter model into Chapter")
 
-        html = model.content_html or ""
+        html = html if html is not None else model.content_html
+        if html is None:
+            raise RuntimeError(f"Fetched chapter {model.id} has no content")
         bs = BeautifulSoup(html, features="lxml")
 
         images = {}
         for tag in bs.select("img[src]"):
-            src = str(tag["src"]).strip()
-            full: Url = Url(
-                src if src.startswith("http") else urljoin(model.source_url, src)
-            )
-            images[url_hash(full)] = Image.by_src_url(full)
+            im = Image.by_src_url(str(tag["src"]), model.source_url)
+            images[im.get_id()] = im
 
         return Chapter(
             title=model.title,
             content=html,
             images=images,
             source_url=model.source_url,
+            id=model.provider_chapter_id,
         )
 
 
@@ -0,0 +1,88 @@
+"""
+Per-book statistics (BookStats), for listing a library without aggregating
+over its chapters.
+
+Ingest and content fetches know what they changed, so they add to the stats
+(`bump_book_stats`) in the same transaction as the chapters. Changes that
+are not simple additions, such as a renumbered ToC, recompute the book's
+stats from its chapters instead (`refresh_book_stats`, one aggregate query).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import ColumnElement, Select, case, func, select, update
+from sqlalchemy.orm import Session
+
+from .models import BookStats, Chapter
+from .utils import naive_utc
+
+
+def stats_query() -> Select[int, int, int, int, int | None, datetime | None]:
+    """BookStats columns computed from the chapters, per book_id."""
+    return select(
+        Chapter.book_id,
+        func.count(Chapter.id),
+        func.coalesce(func.sum(case((Chapter.is_fetched, 1), else_=0)), 0),
+        func.coalesce(func.sum(Chapter.content_size), 0),
+        func.max(Chapter.index),
+        func.max(Chapter.published_at),
+    ).group_by(Chapter.book_id)
+
+
+def refresh_book_stats(db: Session, book_id: int) -> BookStats:
+    """Recompute the book's stats from its chapters. The caller commits."""
+    row = db.execute(stats_query().where(Chapter.book_id == book_id)).one_or_none()
+
+    stats = db.get(BookStats, book_id) or BookStats(book_id=book_id)
+    stats.chapter_count = row[1] if row else 0
+    stats.fetched_count = row[2] if row else 0
+    stats.total_bytes = row[3] if row else 0
+    stats.latest_chapter_index = row[4] if row else None
+    stats.latest_published_at = row[5] if row else None
+    db.add(stats)
+    db.flush()
+    return stats
+
+
+def bump_book_stats(
+    db: Session,
+    book_id: int,
+    *,
+    chapters: int = 0,
+    fetched: int = 0,
+    size: int = 0,
+    latest_index: int | None = None,
+    latest_published_at: datetime | None = None,
+) -> None:
+    """
+    Add new chapters / newly fetched content to the book's stats, in one
+    UPDATE. Books without stats yet get them computed. The caller commits.
+    """
+    values: dict[str, Any] = {
+        "chapter_count": BookStats.chapter_count + chapters,
+        "fetched_count": BookStats.fetched_count + fetched,
+        "total_bytes": BookStats.total_bytes + size,
+    }
+    if latest_index is not None:
+        values["latest_chapter_index"] = _greatest(
+            BookStats.latest_chapter_index, latest_index
+        )
+    if latest_published_at is not None:
+        values["latest_published_at"] = _greatest(
+            BookStats.latest_published_at, naive_utc(latest_published_at)
+        )
+
+    result = db.execute(
+        update(BookStats).where(BookStats.book_id == book_id).values(values),
+        execution_options={"synchronize_session": False},
+    )
+    if not getattr(result, "rowcount", 0):
+        refresh_book_stats(db, book_id)
+
+
+def _greatest(column: Any, value: Any) -> ColumnElement[Any]:
+    # GREATEST() is not in SQLite, and max(NULL, x) is NULL in both
+    return case((column.is_(None) | (column < value), value), else_=column)
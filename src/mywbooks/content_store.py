@@ -0,0 +1,247 @@
+"""
+Chapter content store.
+
+Chapter HTML is kept compressed in the `chapter_contents` table, addressed
+by the sha256 of the HTML; a Chapter row only holds the hash and size. So
+listing, counting and ToC queries over chapters never load content bytes,
+and identical chapters are stored once.
+
+Besides the exact hash, chapters get a hash of their normalized content
+(text and image sources, see `content_stats`), which survives markup-only
+changes: it tells whether the author edited the text. Books get a
+fingerprint over their chapters' exact hashes, so work derived from the
+HTML (e.g. an export) can be reused while the fingerprint is unchanged.
+
+A chapter's blob must exist while the chapter points at it (a foreign key
+on PostgreSQL); reading a chapter whose blob is gone raises
+`MissingContentError` rather than passing for an empty chapter.
+
+Blobs are zstd-compressed when `zstandard` is installed (`mywbooks[zstd]`),
+else zlib. Each blob records its encoding, so both remain readable.
+Chapters from before the store keep their HTML in the legacy
+`Chapter.content_html` column until migrated (migration 4).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html as html_lib
+import re
+import threading
+import unicodedata
+import zlib
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+from sqlalchemy import ColumnElement, Connection, and_, delete, exists, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .db import insert_ignoring_duplicates
+from .models import Book, Chapter, ChapterContent
+
+try:
+    import zstandard
+except ImportError:  # optional: mywbooks[zstd]
+    zstandard = None  # type: ignore[assignment]
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+# Encoding of newly stored content
+CONTENT_ENCODING = "zstd" if zstandard is not None else "zlib"
+
+# zstd (de)compressors are not thread-safe; one per thread
+_local = threading.local()
+
+_SKIP_RE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+_IMG_SRC_RE = re.compile(r"""<img\b[^>]*?\bsrc\s*=\s*["']([^"']*)""", re.IGNORECASE)
+# Inline elements don't separate words: H<b>i</b> is one word
+_INLINE_TAG_RE = re.compile(
+    r"</?(?:a|abbr|b|bdi|bdo|cite|code|data|del|dfn|em|font|i|ins|kbd|mark|q|s|"
+    r"samp|small|span|strong|sub|sup|time|u|var|wbr)\b[^>]*>",
+    re.IGNORECASE,
+)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+class MissingContentError(RuntimeError):
+    def __init__(self, chapter_id: int, content_hash: str):
+        self.chapter_id = chapter_id
+        self.content_hash = content_hash
+        super().__init__(
+            f"Content {content_hash} of chapter {chapter_id} is not stored"
+        )
+
+
+class ContentStats(NamedTuple):
+    text_hash: str  # sha256 of the normalized content
+    word_count: int
+
+
+class StoredContent(NamedTuple):
+    hash: str  # sha256 of the UTF-8 HTML
+    size: int  # uncompressed, in bytes
+    encoding: str
+    data: bytes
+    stats: ContentStats
+
+
+def content_stats(html: str) -> ContentStats:
+    """
+    Normalized content: the words of the text (NFC, whitespace collapsed)
+    and the image sources. Markup-only changes (attributes, randomized class
+    names, formatting) keep the hash; edits of the text or images change it.
+    """
+    html = _SKIP_RE.sub(" ", html)
+    images = _IMG_SRC_RE.findall(html)
+    text = _TAG_RE.sub(" ", _INLINE_TAG_RE.sub("", html))
+    text = unicodedata.normalize("NFC", html_lib.unescape(text))
+    words = text.split()
+    normalized = " ".join(words) + "\n" + "\n".join(images)
+    return ContentStats(
+        hashlib.sha256(normalized.encode("utf-8")).hexdigest(), len(words)
+    )
+
+
+def encode_content(html: str, encoding: str | None = None) -> StoredContent:
+    raw = html.encode("utf-8")
+    encoding = encoding or CONTENT_ENCODING
+    if encoding == "zstd":
+        data = _zstd().compress(raw)
+    elif encoding == "zlib":
+        data = zlib.compress(raw, ZLIB_LEVEL)
+    elif encoding == "identity":
+        data = raw
+    else:
+        raise ValueError(f"Unknown content encoding '{encoding}'")
+    return StoredContent(
+        hashlib.sha256(raw).hexdigest(), len(raw), encoding, data, content_stats(html)
+    )
+
+
+def decode_content(encoding: str, data: bytes) -> str:
+    raw: bytes
+    if encoding == "zstd":
+        raw = _zstd_decompressor().decompress(data)
+    elif encoding == "zlib":
+        raw = zlib.decompress(data)
+    elif encoding == "identity":
+        raw = data
+    else:
+        raise ValueError(f"Unknown content encoding '{encoding}'")
+    return raw.decode("utf-8")
+
+
+def put_contents(bind: Session | Connection, contents: Iterable[StoredContent]) -> None:
+    """Store the blobs not stored yet (one executemany)."""
+    rows = {
+        c.hash: {"hash": c.hash, "encoding": c.encoding, "data": c.data}
+        for c in contents
+    }
+    if rows:
+        bind.execute(
+            insert_ignoring_duplicates(bind, ChapterContent.__table__),
+            list(rows.values()),
+        )
+
+
+def chapter_values(content: StoredContent) -> dict[str, Any]:
+    """Chapter columns pointing at `content`."""
+    return {
+        "content_hash": content.hash,
+        "content_size": content.size,
+        "content_html": None,
+        "text_hash": content.stats.text_hash,
+        "word_count": content.stats.word_count,
+    }
+
+
+def read_chapter_html(db: Session, chapter: Chapter) -> str | None:
+    if chapter.content_hash is None:
+        return chapter.content_html
+    row = db.execute(
+        select(ChapterContent.encoding, ChapterContent.data).where(
+            ChapterContent.hash == chapter.content_hash
+        )
+    ).one_or_none()
+    if row is None:
+        raise MissingContentError(chapter.id, chapter.content_hash)
+    return decode_content(row.encoding, row.data)
+
+
+def read_contents(db: Session, hashes: Iterable[str]) -> dict[str, str]:
+    """HTML by content hash, for many chapters in one query."""
+    wanted = set(hashes)
+    if not wanted:
+        return {}
+    rows = db.execute(
+        select(ChapterContent.hash, ChapterContent.encoding, ChapterContent.data).where(
+            ChapterContent.hash.in_(wanted)
+        )
+    )
+    return {r.hash: decode_content(r.encoding, r.data) for r in rows}
+
+
+def missing_content() -> ColumnElement[bool]:
+    """Filter for chapters without stored content."""
+    return and_(Chapter.content_hash.is_(None), Chapter.content_html.is_(None))
+
+
+def update_content_fingerprint(db: Session, book_id: int) -> str | None:
+    """
+    Recompute Book.content_fingerprint: a hash over the book's chapters with
+    stored content, in order (id, title and exact content hash). None while
+    no chapter has content. The caller commits.
+    """
+    rows = db.execute(
+        select(Chapter.provider_chapter_id, Chapter.title, Chapter.content_hash)
+        .where(Chapter.book_id == book_id, Chapter.content_hash.is_not(None))
+        .order_by(Chapter.index.asc())
+    ).all()
+
+    fingerprint = None
+    if rows:
+        h = hashlib.sha256()
+        for chapter_id, title, content_hash in rows:
+            h.update(f"{chapter_id}\t{title}\t{content_hash}\n".encode("utf-8"))
+        fingerprint = h.hexdigest()
+
+    db.execute(
+        update(Book).where(Book.id == book_id).values(content_fingerprint=fingerprint)
+    )
+    return fingerprint
+
+
+def delete_orphan_contents(db: Session) -> int:
+    """Delete blobs no chapter points at (e.g. after deleting a book)."""
+    try:
+        result = db.execute(
+            delete(ChapterContent).where(
+                ~exists().where(Chapter.content_hash == ChapterContent.hash)
+            )
+        )
+        db.commit()
+    except IntegrityError:
+        # A chapter was pointed at a blob meanwhile; left to the next run
+        db.rollback()
+        return 0
+    return int(getattr(result, "rowcount", 0) or 0)
+
+
+def _zstd() -> Any:
+    if zstandard is None:
+        raise RuntimeError("zstd content requires the 'zstandard' package")
+    c = getattr(_local, "compressor", None)
+    if c is None:
+        c = _local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return c
+
+
+def _zstd_decompressor() -> Any:
+    if zstandard is None:
+        raise RuntimeError("zstd content requires the 'zstandard' package")
+    d = getattr(_local, "decompressor", None)
+    if d is None:
+        d = _local.decompressor = zstandard.ZstdDecompressor()
+    return d
@@ -1,21 +1,148 @@
+"""
+Database engine and sessions.
+
+The database is chosen with DATABASE_URL: a SQLite file by default (dev),
+PostgreSQL in production (e.g. postgresql+psycopg://user:pw@host/mywbooks,
+with `mywbooks[postgres]`).
+
+PostgreSQL connections are pooled (MYWBOOKS_DB_POOL_SIZE, plus up to
+MYWBOOKS_DB_MAX_OVERFLOW under load) and checked before use, so connections
+dropped by the server are replaced instead of failing a request.
+
+SQLite connections get SQLITE_PRAGMAS: WAL, so readers don't block the
+writer and the other way round; synchronous=NORMAL, which is safe with WAL
+and syncs at checkpoints instead of every commit; a busy timeout, so
+concurrent writers wait instead of failing with "database is locked"; and
+memory-mapped reads.
+
+The API's read-heavy routes use async sessions (`get_async_db`), on the same
+database through its async driver (aiosqlite, or psycopg's async mode); see
+`async_url`.
+"""
+
 from __future__ import annotations
 
-from collections.abc import Iterator
+import functools
+import os
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import Connection, Engine, Insert, create_engine, event, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Session, sessionmaker
 
-# Dev: SQLite file; prod: switch to Postgres
-DATABASE_URL = "sqlite:///./mywbooks.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mywbooks.db")
+
+DB_POOL_SIZE = int(os.getenv("MYWBOOKS_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("MYWBOOKS_DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = 1800  # seconds; below common server/proxy idle timeouts
+
+SQLITE_BUSY_TIMEOUT_MS = 10_000
+SQLITE_PRAGMAS: dict[str, str | int] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": 256 << 20,
+}
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """create_engine() arguments for the database at `url`."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # The driver's own wait for locks, on top of busy_timeout
+        return {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    if backend == "postgresql":
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_pre_ping": True,
+            "pool_recycle": DB_POOL_RECYCLE,
+        }
+    return {}
+
+
+def make_engine(
+    url: str = DATABASE_URL,
+    *,
+    sqlite_pragmas: dict[str, str | int] | None = None,
+    **kw: Any,
+) -> Engine:
+    """
+    An engine for `url`, configured for its database (see the module doc).
+    `sqlite_pragmas` replaces SQLITE_PRAGMAS; `kw` overrides engine options.
+    """
+    engine = create_engine(url, **{**engine_options(url), **kw})
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine, sqlite_pragmas)
+    return engine
+
+
+# sync driver -> async driver, by backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "psycopg"}
+
+
+def async_url(url: str) -> URL:
+    """`url` with the async driver of its backend, e.g. sqlite+aiosqlite://."""
+    u = make_url(url)
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver for '{u.get_backend_name()}'")
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}")
+
 
-engine = create_engine(DATABASE_URL, future=True)
-SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+def make_async_engine(
+    url: str = DATABASE_URL,
+    *,
+    sqlite_pragmas: dict[str, str | int] | None = None,
+    **kw: Any,
+) -> AsyncEngine:
+    """The async counterpart of make_engine(), for the same `url`."""
+    engine = create_async_engine(async_url(url), **{**engine_options(url), **kw})
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas)
+    return engine
+
+
+def _apply_sqlite_pragmas(
+    engine: Engine, pragmas: dict[str, str | int] | None = None
+) -> None:
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_conn: Any, record: Any) -> None:
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+engine = make_engine()
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@functools.cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    # Created on first use, so the async drivers are only needed by the API
+    return async_sessionmaker(make_async_engine(), expire_on_commit=False)
 
 
 def init_db() -> None:
+    from .migrations import run_migrations
     from .models import Base  # register models
 
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 
 # Only intended to be used by FastAPI
@@ -25,3 +152,32 @@ def get_db() -> Iterator[Session]:
         yield db
     finally:
         db.close()
+
+
+# Only intended to be used by FastAPI
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def close_async_db() -> None:
+    if get_async_sessionmaker.cache_info().currsize:
+        bind = get_async_sessionmaker().kw["bind"]
+        await bind.dispose()
+        get_async_sessionmaker.cache_clear()
+
+
+def insert_ignoring_duplicates(bind: Session | Connection, table: Any) -> Insert:
+    """
+    INSERT that skips rows conflicting with a unique constraint (e.g. inserted
+    concurrently), where the dialect supports it.
+    """
+    if isinstance(bind, Session):
+        dialect = bind.get_bind().dialect.name
+    else:
+        dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return insert(table)
@@ -8,7 +8,7 @@ from bs4 import BeautifulSoup
 from PIL import Image
 from pydantic_core import Url
 
-from mywbooks.utils import url_hash
+from mywbooks.urls import UrlLike, canonical_url
 
 # TODO
 ## - Logging
@@ -20,11 +20,10 @@ class DownlaodManager:
     def __init__(self, base_cache_dir: Path) -> None:
         self.base_cache_dir = base_cache_dir
 
-    def get_url_hash(self, url: Url) -> str:
-        # return hashlib.md5(str(url).encode("utf-8")).hexdigest()
-        return url_hash(url)
+    def get_url_hash(self, url: UrlLike) -> str:
+        return canonical_url(url).hash
 
-    def get_cache_filename(self, url: Url, fileext: Optional[str] = None) -> str:
+    def get_cache_filename(self, url: UrlLike, fileext: Optional[str] = None) -> str:
         hash_filename = self.get_url_hash(url)
         if fileext is not None:
             hash_filename += fileext
@@ -94,22 +93,27 @@ class DownlaodManager:
         )
         return BeautifulSoup(content, features="lxml")
 
-    def get_and_cache_image_data(
+    def get_and_cache_image_path(
         self,
         url: Url,
         *,
         ignore_cache: bool = False,
         max_width: int = 8096,
         max_height: int = 8096,
-    ) -> bytes:
+    ) -> Path:
+        """
+        Download, resize and cache an image, returning the path of the resized
+        JPEG in the cache. The bytes are not kept in memory.
+        """
         cache_filename = "%s_%u_%u.jpg" % (
             self.get_cache_filename(url, fileext=""),
             max_width,
             max_height,
         )
+        cache_filepath = self.base_cache_dir / cache_filename
 
         if not ignore_cache and self.is_valid_cache(cache_filename):
-            return self.read_valid_cache_file(cache_filename)
+            return cache_filepath
 
         content = self.get_and_cache_data(url, fileext=None, ignore_cache=ignore_cache)
 
@@ -117,8 +121,21 @@ class DownlaodManager:
 
         im = Image.open(content_io, "r").convert("RGB")
         im.thumbnail((max_width, max_height))
-        im.save(self.base_cache_dir / cache_filename)
-        return self.read_valid_cache_file(cache_filename)
+        im.save(cache_filepath)
+        return cache_filepath
+
+    def get_and_cache_image_data(
+        self,
+        url: Url,
+        *,
+        ignore_cache: bool = False,
+        max_width: int = 8096,
+        max_height: int = 8096,
+    ) -> bytes:
+        path = self.get_and_cache_image_path(
+            url, ignore_cache=ignore_cache, max_width=max_width, max_height=max_height
+        )
+        return self.read_valid_cache_file(path.name)
 
 
 def get_dm() -> Iterator[DownlaodManager]:
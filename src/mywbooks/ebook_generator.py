@@ -1,7 +1,9 @@
 import logging
+import re
 import sys
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import NamedTuple, Optional
 from urllib.parse import urljoin
@@ -12,6 +14,12 @@ from pydantic_core import Url
 
 from mywbooks.book import BookConfig, Chapter, Image
 from mywbooks.download_manager import DownlaodManager
+from mywbooks.epub_writer import (
+    EpubCompression,
+    EpubFileItem,
+    EpubSpooledHtml,
+    write_epub,
+)
 
 
 @dataclass
@@ -59,6 +67,13 @@ class EbookGeneratorConfig(NamedTuple):
     epub_cover_image_path: str = "cover.png"
     epub_images_path: str = "images"
 
+    # Zip compression of the written .epub (see epub_writer.COMPRESSION_PRESETS)
+    compression: EpubCompression = EpubCompression()
+
+    # `dcterms:modified` of the package, None gives a fixed date. Never the
+    # wall clock: equal content must give byte-identical files.
+    modified: Optional[datetime] = None
+
 
 class EbookGenerator:
     book_id: str
@@ -68,8 +83,10 @@ class EbookGenerator:
     ebook: epub.EpubBook
 
     chapters: list[Chapter]
+    # Where chapter content is spooled; None keeps it in `chapters`
+    spool_dir: Optional[Path]
     # images: dict[str, tuple[str, epub.EpubImage]]
-    images_new: dict[str, Image]  #  The keys should be the src_url
+    images_new: dict[str, Image]  # Keyed by image id (canonical url hash)
 
     # images_new: ImageMap
 
@@ -79,13 +96,21 @@ class EbookGenerator:
         download_manager: DownlaodManager,
         config: EbookGeneratorConfig,
         chapter_page_exacter: Optional[ChapterPageExtractor] = None,
+        *,
+        spool_dir: Optional[Path] = None,
     ):
+        """
+        With a `spool_dir`, every added chapter is rendered and written there
+        right away; only its title and images are kept in memory, so memory
+        use does not grow with the content of the book.
+        """
         self.book_id = book_id
         self.config = config
         self.chapter_page_exacter = chapter_page_exacter
         self.download_manager = download_manager
         self.chapters = []
         self.images_new = {}
+        self.spool_dir = spool_dir
 
     def add_chapter(self, chapter: Chapter) -> None:
         """
@@ -99,17 +124,22 @@ class EbookGenerator:
         # Reuse the existing image management to:
         # - dedupe images across chapters
         # - rewrite <img src> → packaged path (e.g., 'images/<id>.jpg')
-        ch_images = self.manage_chapter_img_tags(bs)
+        ch_images = self.manage_chapter_img_tags(bs, chapter.source_url)
 
         # Store the (possibly) rewritten HTML string
-        self.chapters.append(
-            Chapter(
-                title=chapter.title,
-                content=str(bs),
-                images=ch_images,
-                source_url=chapter.source_url,
-            )
+        rewritten = Chapter(
+            title=chapter.title,
+            content=str(bs),
+            images=ch_images,
+            source_url=chapter.source_url,
+            id=chapter.id,
         )
+        if self.spool_dir is not None:
+            self._spool_path(len(self.chapters) + 1).write_text(
+                self._render(rewritten), encoding="utf-8"
+            )
+            rewritten = rewritten._replace(content="")
+        self.chapters.append(rewritten)
 
     def add_chapter_page(
         self,
@@ -128,7 +158,7 @@ class EbookGenerator:
         extracted_content = extractor(bs)
         assert extracted_content is not None  # TODO: Log error instead
 
-        chpr_images = self.manage_chapter_img_tags(extracted_content.content)
+        chpr_images = self.manage_chapter_img_tags(extracted_content.content, src_url)
 
         self.chapters.append(
             Chapter(
@@ -140,7 +170,7 @@ class EbookGenerator:
         )
 
     def manage_chapter_img_tags(
-        self, bs: Tag, source_url: Url | None = None
+        self, bs: Tag, source_url: Optional[str] = None
     ) -> dict[str, Image]:
         images: dict[str, Image] = {}
 
@@ -155,17 +185,11 @@ class EbookGenerator:
 
             assert isinstance(src_url, str)
 
-            im = images.get(src_url)
-            if not im:
-                im = self.images_new.get(src_url)
-                if not im:
-                    # TODO: full_url = urljoin(source_url, src_url)
-                    full_url = src_url
-
-                    im = Image.by_src_url(Url(src_url))
-                    self.images_new[src_url] = im
-
-                images[src_url] = im
+            # Relative sources resolve against the chapter page; the same
+            # image referenced differently is still packaged once
+            im = Image.by_src_url(src_url, source_url)
+            im = self.images_new.setdefault(im.get_id(), im)
+            images[im.get_id()] = im
 
             img["src"] = im.get_ebook_src(self.config.epub_images_path)
         return images
@@ -208,38 +232,67 @@ class EbookGenerator:
         # Include the chapters
         chapter_count = 0
         for chtr in self.chapters:
-            content = chtr.get_content(
-                include_images=self.config.include_images,
-                include_chapter_title=self.config.include_chapter_titles,
-            )
-
             # We are counting the added chapters
             chapter_count += 1
-            epub_chapter = epub.EpubHtml(
-                title=chtr.title, file_name=f"chapter_{chapter_count}.xhtml"
-            )
-            epub_chapter.set_content("".join(content))
+            if self.spool_dir is not None:
+                # Rendered when added; read back when written
+                epub_chapter = EpubSpooledHtml(
+                    content_path=self._spool_path(chapter_count),
+                    uid=_epub_chapter_uid(chtr, chapter_count),
+                    title=chtr.title,
+                    file_name=f"chapter_{chapter_count}.xhtml",
+                )
+            else:
+                epub_chapter = epub.EpubHtml(
+                    uid=_epub_chapter_uid(chtr, chapter_count),
+                    title=chtr.title,
+                    file_name=f"chapter_{chapter_count}.xhtml",
+                )
+                epub_chapter.set_content(self._render(chtr))
 
             ebook.add_item(epub_chapter)
             ebook.toc.append(epub_chapter)
             ebook.spine.append(epub_chapter)
 
-        # Include the Images
+        # Include the Images (by handle; streamed from the cache when written)
         for _, im in self.images_new.items():
-            if not im.get_image_data(
+            image_path = im.get_image_path(
                 self.download_manager, *self.config.image_resize_max
-            ):
+            )
+            if image_path is None:
                 continue
 
             ebook.add_item(
-                epub.EpubImage(
+                EpubFileItem(
                     uid=im.get_id(),
                     file_name=im.get_ebook_src(self.config.epub_images_path),
                     media_type=im.get_media_type(),
-                    content=im.image_data,
+                    file_path=image_path,
                 )
             )
 
         ebook.add_item(epub.EpubNcx())
         ebook.add_item(epub.EpubNav())
-        epub.write_epub(local_epub_filepath, ebook)
+        write_epub(
+            local_epub_filepath,
+            ebook,
+            compression=self.config.compression,
+            modified=self.config.modified,
+        )
+
+    def _render(self, chapter: Chapter) -> str:
+        return chapter.get_content(
+            include_images=self.config.include_images,
+            include_chapter_title=self.config.include_chapter_titles,
+        )
+
+    def _spool_path(self, position: int) -> Path:
+        assert self.spool_dir is not None
+        return self.spool_dir / f"chapter_{position}.html"
+
+
+def _epub_chapter_uid(chapter: Chapter, position: int) -> str:
+    """Manifest id of a chapter: its own id where known (XML NCName-safe)."""
+    if chapter.id is None:
+        return f"chapter_{position}"
+    return "ch-" + re.sub(r"[^A-Za-z0-9_.-]", "-", chapter.id)
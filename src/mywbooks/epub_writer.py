@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import shutil
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from ebooklib import epub
+
+# Members with these extensions are already compressed; deflating them again
+# costs CPU for (close to) no size gain.
+PRECOMPRESSED_EXTENSIONS = frozenset(
+    {".jpg", ".jpeg", ".png", ".gif", ".webp", ".woff", ".woff2", ".mp3", ".mp4"}
+)
+
+
+# Builds are reproducible: every zip member gets this timestamp, and it is
+# the default `dcterms:modified` of the package.
+REPRODUCIBLE_EPOCH = datetime(1980, 1, 1)
+
+
+class EpubCompression(NamedTuple):
+    # Deflate level (0-9) for text members (XHTML, CSS, OPF, NCX)
+    text_level: int = 6
+    # Store images and other already-compressed members uncompressed
+    store_precompressed: bool = True
+
+
+COMPRESSION_PRESETS: dict[str, EpubCompression] = {
+    # Interactive downloads: the user is waiting for the file
+    "fast": EpubCompression(text_level=1),
+    # Email delivery: attachment size limits matter more than build time
+    "small": EpubCompression(text_level=9),
+}
+
+
+def get_compression_preset(name: str) -> EpubCompression:
+    preset = COMPRESSION_PRESETS.get(name)
+    if preset is None:
+        raise ValueError(
+            f"Unknown compression preset '{name}', expected one of {list(COMPRESSION_PRESETS)}"
+        )
+    return preset
+
+
+class _EpubZipFile(zipfile.ZipFile):
+    """
+    ZipFile choosing the compression of every member from its name, and
+    writing fixed member metadata so equal content gives equal bytes.
+    """
+
+    def __init__(self, file: str | Path, compression: EpubCompression) -> None:
+        super().__init__(
+            file,
+            "w",
+            zipfile.ZIP_DEFLATED,
+            compresslevel=compression.text_level,
+        )
+        self._epub_compression = compression
+
+    def _member_compress_type(self, arcname: str) -> int:
+        if arcname == "mimetype":
+            # The EPUB spec requires the mimetype member to be stored
+            return zipfile.ZIP_STORED
+        if (
+            self._epub_compression.store_precompressed
+            and Path(arcname).suffix.lower() in PRECOMPRESSED_EXTENSIONS
+        ):
+            return zipfile.ZIP_STORED
+        if self._epub_compression.text_level == 0:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def _member_info(self, arcname: str) -> zipfile.ZipInfo:
+        zinfo = zipfile.ZipInfo(arcname, date_time=REPRODUCIBLE_EPOCH.timetuple()[:6])
+        zinfo.create_system = 3  # unix, independent of the build host
+        zinfo.external_attr = 0o644 << 16
+        zinfo.compress_type = self._member_compress_type(arcname)
+        zinfo.compress_level = self.compresslevel
+        return zinfo
+
+    def write_file(self, arcname: str, path: Path) -> None:
+        """Stream a file into the archive, without reading it into memory."""
+        with open(path, "rb") as src, self.open(self._member_info(arcname), "w") as dst:
+            shutil.copyfileobj(src, dst, 1 << 16)
+
+    def writestr(  # type: ignore[override]
+        self,
+        zinfo_or_arcname: str | zipfile.ZipInfo,
+        data: str | bytes,
+        compress_type: Optional[int] = None,
+        compresslevel: Optional[int] = None,
+    ) -> None:
+        if isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo = zinfo_or_arcname
+        else:
+            zinfo = self._member_info(zinfo_or_arcname)
+
+        super().writestr(
+            zinfo,
+            data,
+            compress_type=self._member_compress_type(zinfo.filename),
+            # A given ZipInfo would otherwise fall back to zlib's default level
+            compresslevel=(
+                compresslevel if compresslevel is not None else self.compresslevel
+            ),
+        )
+
+
+class EpubFileItem(epub.EpubImage):  # type: ignore[misc]
+    """
+    An item whose content lives in a file (e.g. a cached image). The file is
+    streamed into the archive when written; `get_content` reads it on demand.
+    """
+
+    def __init__(
+        self, *, uid: str, file_name: str, media_type: str, file_path: Path
+    ) -> None:
+        super().__init__(uid=uid, file_name=file_name, media_type=media_type)
+        self.file_path = file_path
+
+    def get_content(self, default: bytes = b"") -> bytes:
+        try:
+            return self.file_path.read_bytes()
+        except OSError:
+            return default
+
+
+class EpubSpooledHtml(epub.EpubHtml):  # type: ignore[misc]
+    """
+    A chapter whose body HTML is kept in a file (`content_path`) instead of
+    memory; it is read back when the chapter is written.
+    """
+
+    def __init__(self, *, content_path: Path, **kw: Any) -> None:
+        self.content_path = content_path
+        super().__init__(**kw)
+
+    @property
+    def content(self) -> bytes:
+        try:
+            return self.content_path.read_bytes()
+        except FileNotFoundError:
+            return b""
+
+    @content.setter
+    def content(self, value: str | bytes | None) -> None:
+        if value:
+            data = value.encode("utf-8") if isinstance(value, str) else value
+            self.content_path.write_bytes(data)
+
+
+class EpubZipWriter(epub.EpubWriter):  # type: ignore[misc]
+    """ebooklib's EpubWriter, with per-member compression."""
+
+    def __init__(
+        self,
+        name: str | Path,
+        book: epub.EpubBook,
+        compression: EpubCompression,
+        options: Optional[dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(str(name), book, options)
+        self.compression = compression
+
+    def write(self) -> None:
+        self.out = _EpubZipFile(self.file_name, self.compression)
+        try:
+            self.out.writestr("mimetype", "application/epub+zip")
+
+            self._write_container()
+            self._write_opf()
+            self._write_items()
+        finally:
+            self.out.close()
+
+    def _write_items(self) -> None:
+        folder = self.book.FOLDER_NAME
+        for item in self.book.get_items():
+            if isinstance(item, epub.EpubNcx):
+                self.out.writestr(f"{folder}/{item.file_name}", self._get_ncx())
+            elif isinstance(item, epub.EpubNav):
+                self.out.writestr(f"{folder}/{item.file_name}", self._get_nav(item))
+            elif isinstance(item, EpubFileItem):
+                self.out.write_file(f"{folder}/{item.file_name}", item.file_path)
+            elif item.manifest:
+                self.out.writestr(f"{folder}/{item.file_name}", item.get_content())
+            else:
+                self.out.writestr(item.file_name, item.get_content())
+
+
+def write_epub(
+    path: str | Path,
+    book: epub.EpubBook,
+    *,
+    compression: EpubCompression = EpubCompression(),
+    modified: Optional[datetime] = None,
+    options: Optional[dict[str, Any]] = None,
+) -> None:
+    """
+    Like `ebooklib.epub.write_epub`, but raises on errors and is reproducible:
+    `modified` (default REPRODUCIBLE_EPOCH) replaces the wall clock time.
+    """
+    options = {"mtime": modified or REPRODUCIBLE_EPOCH, **(options or {})}
+    writer = EpubZipWriter(path, book, compression, options)
+    writer.process()
+    writer.write()
@@ -1,11 +1,28 @@
 import time
+from datetime import datetime
 
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, and_, or_, select
 
+from ..content_store import delete_orphan_contents
 from ..db import SessionLocal
 from ..models import Task
 from ..task_cleanup import TASK_RETENTION, run_task_cleanup
-from ..utils import ensure_aware, utcnow
+from ..utils import naive_utc, utcnow
+
+
+def expired_tasks(now: datetime) -> ColumnElement[bool]:
+    """
+    Tasks finished longer ago than their status' retention; statuses without
+    a retention rule are kept. One range per status on the (status,
+    finished_at) index.
+    """
+    now = naive_utc(now)
+    return or_(
+        *(
+            and_(Task.status == status, Task.finished_at < now - retention)
+            for status, retention in TASK_RETENTION.items()
+        )
+    )
 
 
 def cleanup_expired_tasks() -> int:
@@ -17,29 +34,27 @@ def cleanup_expired_tasks() -> int:
     deleted = 0
 
     with SessionLocal() as db:
-        stmt = select(Task).where(Task.finished_at.is_not(None))
-        tasks = db.scalars(stmt).all()
-
-        for task in tasks:
-            retention = TASK_RETENTION.get(task.status)
-            if retention is None:
-                # no retention rule => keep
-                continue
-
-            finished_at = ensure_aware(task.finished_at)
-            if finished_at and finished_at < now - retention:
-                run_task_cleanup(task)
-                db.delete(task)
-                deleted += 1
+        for task in db.scalars(select(Task).where(expired_tasks(now))).all():
+            run_task_cleanup(task)
+            db.delete(task)
+            deleted += 1
 
         db.commit()
 
     return deleted
 
 
+def cleanup_orphan_contents() -> int:
+    """Delete stored chapter contents no chapter refers to anymore."""
+    with SessionLocal() as db:
+        return delete_orphan_contents(db)
+
+
 def cleanup_once() -> None:
     deleted = cleanup_expired_tasks()
     print(f"[cleanup] deleted {deleted} expired tasks")
+    deleted = cleanup_orphan_contents()
+    print(f"[cleanup] deleted {deleted} orphaned chapter contents")
 
 
 def cleanup_loop(interval_seconds: int = 60 * 60) -> None:
@@ -51,6 +66,8 @@ def cleanup_loop(interval_seconds: int = 60 * 60) -> None:
         try:
             deleted = cleanup_expired_tasks()
             print(f"[cleanup] deleted {deleted} expired tasks")
+            deleted = cleanup_orphan_contents()
+            print(f"[cleanup] deleted {deleted} orphaned chapter contents")
         except Exception as e:
             print(f"[cleanup] error: {e}")
         time.sleep(interval_seconds)
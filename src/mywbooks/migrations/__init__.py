@@ -0,0 +1,323 @@
+"""
+Schema migrations for existing databases.
+
+`init_db()` creates missing tables with `create_all`, which never alters a
+table that already exists. Changes to existing tables are registered as
+ordered steps (see `steps.py`); applied versions are recorded in the
+`schema_migrations` table. Steps must be idempotent, since on a fresh
+database `create_all` has already produced the final schema.
+
+Data changes over large tables are not done in a step, whose transaction
+would hold its locks over the whole table. They are registered as backfills
+instead (`@backfill`), which `run_backfills()` runs while the app keeps
+serving: in batches of primary keys, one short transaction per batch,
+optionally pausing between batches. Each backfill's progress is recorded
+with its batch in `schema_backfills`, so an interrupted run resumes where
+it stopped. Until its backfill has finished, the code must accept rows in
+both the old and the new form.
+
+    python -m mywbooks.migrations status
+    python -m mywbooks.migrations upgrade
+    python -m mywbooks.migrations backfill [--batch-size N] [--pause S]
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from ..utils import utcnow
+
+MigrationFn = Callable[[Connection], None]
+# (conn, lo, hi) -> number of rows changed, for the rows with lo < id <= hi
+BackfillFn = Callable[[Connection, int, int], int]
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    fn: MigrationFn
+    transaction: bool
+
+
+class Backfill(NamedTuple):
+    name: str
+    table: str  # walked by its integer `id`
+    after: int  # the migration adding the columns it fills in
+    batch_size: int
+    fn: BackfillFn
+
+
+MIGRATIONS: dict[int, Migration] = {}
+# Run in registration order
+BACKFILLS: dict[str, Backfill] = {}
+
+
+def migration(
+    version: int, name: str, *, transaction: bool = True
+) -> Callable[[MigrationFn], MigrationFn]:
+    """
+    Wrapper for registering a migration step. Steps with transaction=False
+    run on an autocommit connection, as needed by CREATE INDEX CONCURRENTLY
+    (see `create_index`); they must be safe to re-run after a partial run.
+    """
+
+    def wrapper(fn: MigrationFn) -> MigrationFn:
+        if version in MIGRATIONS:
+            raise RuntimeError(f"Duplicate migration version {version}")
+        MIGRATIONS[version] = Migration(version, name, fn, transaction)
+        return fn
+
+    return wrapper
+
+
+def backfill(
+    name: str, *, table: str, after: int, batch_size: int = 500
+) -> Callable[[BackfillFn], BackfillFn]:
+    """
+    Wrapper for registering a backfill. The function is called once per
+    batch of `table` ids and must only change rows that still need it.
+    """
+
+    def wrapper(fn: BackfillFn) -> BackfillFn:
+        if name in BACKFILLS:
+            raise RuntimeError(f"Duplicate backfill {name!r}")
+        BACKFILLS[name] = Backfill(name, table, after, batch_size, fn)
+        return fn
+
+    return wrapper
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255)),
+    Column("applied_at", DateTime),
+)
+
+schema_backfills = Table(
+    "schema_backfills",
+    _metadata,
+    Column("name", String(255), primary_key=True),
+    Column("last_id", Integer, nullable=False),  # resume marker
+    Column("rows", Integer, nullable=False),
+    Column("updated_at", DateTime),
+    Column("finished_at", DateTime),
+)
+
+
+def _setup(engine: Engine) -> None:
+    from . import steps  # noqa: F401  (registers the steps)
+
+    _metadata.create_all(bind=engine)
+
+
+def applied_migrations(engine: Engine) -> set[int]:
+    _setup(engine)
+    with engine.connect() as conn:
+        return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Apply pending migrations, each in its own transaction."""
+    applied = applied_migrations(engine)
+
+    done: list[int] = []
+    for version in sorted(MIGRATIONS.keys() - applied):
+        m = MIGRATIONS[version]
+        if m.transaction:
+            with engine.begin() as conn:
+                m.fn(conn)
+                _record_migration(conn, m)
+        else:
+            with engine.connect() as conn:
+                m.fn(conn.execution_options(isolation_level="AUTOCOMMIT"))
+            with engine.begin() as conn:
+                _record_migration(conn, m)
+        done.append(version)
+    return done
+
+
+def _record_migration(conn: Connection, m: Migration) -> None:
+    conn.execute(
+        insert(schema_migrations).values(
+            version=m.version, name=m.name, applied_at=utcnow()
+        )
+    )
+
+
+## ---- Backfills ----
+
+BackfillProgress = Callable[[Backfill, int, int], None]
+
+
+def run_backfills(
+    engine: Engine,
+    names: Iterable[str] | None = None,
+    *,
+    batch_size: int | None = None,
+    pause: float = 0.0,
+    progress: BackfillProgress | None = None,
+) -> dict[str, int]:
+    """
+    Run the unfinished backfills (all, or `names`) to the end, skipping those
+    whose migration is not applied yet. Returns the rows changed per
+    backfill by this run.
+    """
+    applied = applied_migrations(engine)
+    selected = BACKFILLS.values() if names is None else [BACKFILLS[n] for n in names]
+    return {
+        bf.name: run_backfill(
+            engine, bf, batch_size=batch_size, pause=pause, progress=progress
+        )
+        for bf in selected
+        if bf.after in applied
+    }
+
+
+def run_backfill(
+    engine: Engine,
+    bf: Backfill,
+    *,
+    batch_size: int | None = None,
+    pause: float = 0.0,
+    progress: BackfillProgress | None = None,
+) -> int:
+    """
+    Run one backfill from its resume marker, a batch of ids per transaction,
+    sleeping `pause` seconds between batches (to leave the database to the
+    app). `progress` is called after each batch with the last id done and
+    the rows changed so far.
+    """
+    marker = schema_backfills.c
+    with engine.begin() as conn:
+        state = conn.execute(
+            select(marker.finished_at).where(marker.name == bf.name)
+        ).one_or_none()
+        if state is None:
+            conn.execute(
+                insert(schema_backfills).values(name=bf.name, last_id=0, rows=0)
+            )
+        elif state.finished_at is not None:
+            return 0
+
+    next_batch = text(
+        f"SELECT max(id) FROM (SELECT id FROM {bf.table} WHERE id > :last_id "
+        "ORDER BY id LIMIT :limit) AS batch"
+    )
+    changed = 0
+    while True:
+        with engine.begin() as conn:
+            # Locked, so that concurrent runs take turns per batch
+            last_id = conn.execute(
+                select(marker.last_id).where(marker.name == bf.name).with_for_update()
+            ).scalar_one()
+            hi = conn.scalar(
+                next_batch, {"last_id": last_id, "limit": batch_size or bf.batch_size}
+            )
+            now = utcnow()
+            if hi is None:
+                conn.execute(
+                    update(schema_backfills)
+                    .where(marker.name == bf.name)
+                    .values(updated_at=now, finished_at=now)
+                )
+                return changed
+
+            n = bf.fn(conn, last_id, hi)
+            conn.execute(
+                update(schema_backfills)
+                .where(marker.name == bf.name)
+                .values(last_id=hi, rows=marker.rows + n, updated_at=now)
+            )
+        changed += n
+        if progress:
+            progress(bf, hi, changed)
+        if pause:
+            time.sleep(pause)
+
+
+def backfill_status(engine: Engine) -> list[tuple[Backfill, int, int, bool]]:
+    """(backfill, last id done, rows changed, finished) per backfill."""
+    _setup(engine)
+    with engine.connect() as conn:
+        state = {row.name: row for row in conn.execute(select(schema_backfills)).all()}
+    return [
+        (
+            bf,
+            state[bf.name].last_id if bf.name in state else 0,
+            state[bf.name].rows if bf.name in state else 0,
+            bf.name in state and state[bf.name].finished_at is not None,
+        )
+        for bf in BACKFILLS.values()
+    ]
+
+
+## ---- Helpers for steps ----
+
+
+def add_column_if_missing(conn: Connection, table: str, column: Column) -> bool:  # type: ignore[type-arg]
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return False
+
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    return True
+
+
+def create_index(conn: Connection, index: Index) -> None:
+    """
+    Create `index` if it is missing. On PostgreSQL, in a step with
+    transaction=False, it is built CONCURRENTLY: without blocking writes to
+    the table.
+    """
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+    if _concurrently(conn):
+        # An interrupted concurrent build leaves an invalid index behind
+        valid = conn.scalar(
+            text(
+                "SELECT i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ),
+            {"name": index.name},
+        )
+        if valid is False:
+            drop_index(conn, str(index.name))
+        ddl = ddl.replace("INDEX", "INDEX CONCURRENTLY", 1)
+    conn.execute(text(ddl))
+
+
+def drop_index(conn: Connection, name: str) -> None:
+    """Drop the index `name` if it exists (CONCURRENTLY, see `create_index`)."""
+    concurrently = " CONCURRENTLY" if _concurrently(conn) else ""
+    conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+
+def _concurrently(conn: Connection) -> bool:
+    return (
+        conn.dialect.name == "postgresql"
+        and conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+    )
@@ -0,0 +1,101 @@
+"""
+Schema migrations and backfills for the database at DATABASE_URL.
+
+    python -m mywbooks.migrations status
+    python -m mywbooks.migrations upgrade
+    python -m mywbooks.migrations backfill [NAME...] [--batch-size N] [--pause S]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import Engine, column, func, select, table
+
+from . import steps  # noqa: F401  (registers the steps)
+from . import (
+    BACKFILLS,
+    MIGRATIONS,
+    Backfill,
+    applied_migrations,
+    backfill_status,
+    run_backfills,
+    run_migrations,
+)
+
+
+def status(engine: Engine) -> None:
+    applied = applied_migrations(engine)
+    for version, m in sorted(MIGRATIONS.items()):
+        state = "applied" if version in applied else "pending"
+        print(f"[migrations] {version:>3} {m.name:<48} {state}")
+
+    with engine.connect() as conn:
+        for bf, last_id, rows, finished in backfill_status(engine):
+            if finished:
+                state = f"finished, {rows} rows"
+            elif bf.after not in applied:
+                state = f"needs migration {bf.after}"
+            else:
+                max_id = conn.scalar(
+                    select(func.max(table(bf.table, column("id")).c.id))
+                )
+                state = f"at id {last_id} of {max_id or 0}, {rows} rows"
+            print(f"[backfill]   {bf.name:<48} {state}")
+
+
+def upgrade(engine: Engine) -> None:
+    from ..models import Base
+
+    Base.metadata.create_all(bind=engine)
+    done = run_migrations(engine)
+    for version in done:
+        print(f"[migrations] applied {version}: {MIGRATIONS[version].name}")
+    if not done:
+        print("[migrations] up to date")
+
+
+def backfill(
+    engine: Engine, names: list[str], batch_size: int | None, pause: float
+) -> None:
+    def progress(bf: Backfill, last_id: int, rows: int) -> None:
+        print(f"[backfill] {bf.name}: at id {last_id}, {rows} rows")
+
+    done = run_backfills(
+        engine, names or None, batch_size=batch_size, pause=pause, progress=progress
+    )
+    for name, rows in done.items():
+        print(f"[backfill] {name}: finished, {rows} rows changed")
+    for name in [n for n in names or BACKFILLS if n not in done]:
+        print(f"[backfill] {name}: skipped, its migration is not applied")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mywbooks.migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="applied migrations and backfill progress")
+    commands.add_parser("upgrade", help="apply pending schema migrations")
+    p = commands.add_parser("backfill", help="run unfinished backfills, resumable")
+    p.add_argument("names", nargs="*", metavar="NAME", help=", ".join(BACKFILLS))
+    p.add_argument("--batch-size", type=int, help="ids per batch (transaction)")
+    p.add_argument(
+        "--pause", type=float, default=0.0, help="seconds to sleep between batches"
+    )
+    args = parser.parse_args(argv)
+    if args.command == "backfill":
+        if unknown := [n for n in args.names if n not in BACKFILLS]:
+            parser.error(f"unknown backfill: {', '.join(unknown)}")
+
+    from ..db import engine
+
+    match args.command:
+        case "status":
+            status(engine)
+        case "upgrade":
+            upgrade(engine)
+        case "backfill":
+            backfill(engine, args.names, args.batch_size, args.pause)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Integer,
+    String,
+    exists,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+
+from . import add_column_if_missing, backfill, create_index, drop_index, migration
+
+
+@migration(1, "chapters.published_at")
+def _chapters_published_at(conn: Connection) -> None:
+    add_column_if_missing(conn, "chapters", Column("published_at", DateTime))
+
+
+@migration(2, "providerkey.PATREON")
+def _provider_key_patreon(conn: Connection) -> None:
+    # Only PostgreSQL stores ProviderKey as a native enum type
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TYPE providerkey ADD VALUE IF NOT EXISTS 'PATREON'"))
+
+
+@migration(3, "chapters.parse_error")
+def _chapters_parse_error(conn: Connection) -> None:
+    add_column_if_missing(conn, "chapters", Column("parse_error", String(255)))
+
+
+@migration(4, "chapters.content_hash (content store)")
+def _chapters_content_store(conn: Connection) -> None:
+    from ..models import Base
+
+    Base.metadata.tables["chapter_contents"].create(conn, checkfirst=True)
+    add_column_if_missing(conn, "chapters", Column("content_hash", String(64)))
+    add_column_if_missing(conn, "chapters", Column("content_size", Integer))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_chapters_content_hash "
+            "ON chapters (content_hash)"
+        )
+    )
+
+
+@backfill("chapters.content_hash", table="chapters", after=5)
+def _move_legacy_content(conn: Connection, lo: int, hi: int) -> int:
+    from ..content_store import chapter_values, encode_content, put_contents
+    from ..models import BookStats, Chapter
+
+    # Move the legacy HTML over, with every column derived from it (so the
+    # chapters.text_hash backfill may have finished first). SQLite only
+    # returns the freed space to the OS after a VACUUM.
+    rows = conn.execute(
+        text(
+            "SELECT id, book_id, content_html FROM chapters "
+            "WHERE id > :lo AND id <= :hi "
+            "AND content_html IS NOT NULL AND content_hash IS NULL"
+        ),
+        {"lo": lo, "hi": hi},
+    ).all()
+    if not rows:
+        return 0
+
+    contents = [(id_, encode_content(html)) for id_, _, html in rows]
+    put_contents(conn, (c for _, c in contents))
+    conn.execute(
+        text(
+            "UPDATE chapters SET content_hash = :content_hash, "
+            "content_size = :content_size, content_html = :content_html, "
+            "text_hash = :text_hash, word_count = :word_count WHERE id = :id"
+        ),
+        [{"id": id_, **chapter_values(c)} for id_, c in contents],
+    )
+
+    # Stats the app created meanwhile counted these chapters without a size
+    if inspect(conn).has_table("book_stats"):
+        conn.execute(
+            update(BookStats)
+            .where(BookStats.book_id.in_({book_id for _, book_id, _ in rows}))
+            .values(
+                total_bytes=select(func.coalesce(func.sum(Chapter.content_size), 0))
+                .where(Chapter.book_id == BookStats.book_id)
+                .scalar_subquery()
+            )
+        )
+    return len(rows)
+
+
+@migration(5, "chapters.text_hash, books.content_fingerprint")
+def _content_fingerprints(conn: Connection) -> None:
+    add_column_if_missing(conn, "chapters", Column("text_hash", String(64)))
+    add_column_if_missing(conn, "chapters", Column("word_count", Integer))
+    add_column_if_missing(conn, "books", Column("content_fingerprint", String(64)))
+
+
+@backfill("chapters.text_hash", table="chapters", after=5)
+def _chapter_text_stats(conn: Connection, lo: int, hi: int) -> int:
+    from ..content_store import content_stats, decode_content
+
+    # Fingerprints are filled in by the next content update of each book
+    rows = conn.execute(
+        text(
+            "SELECT c.id, s.encoding, s.data FROM chapters c "
+            "JOIN chapter_contents s ON s.hash = c.content_hash "
+            "WHERE c.id > :lo AND c.id <= :hi AND c.text_hash IS NULL"
+        ),
+        {"lo": lo, "hi": hi},
+    ).all()
+    if not rows:
+        return 0
+
+    conn.execute(
+        text(
+            "UPDATE chapters SET text_hash = :text_hash, word_count = :word_count "
+            "WHERE id = :id"
+        ),
+        [
+            {"id": id_, **content_stats(decode_content(enc, data))._asdict()}
+            for id_, enc, data in rows
+        ],
+    )
+    return len(rows)
+
+
+@migration(6, "book_stats")
+def _book_stats(conn: Connection) -> None:
+    from ..models import Base
+
+    Base.metadata.tables["book_stats"].create(conn, checkfirst=True)
+
+
+@backfill("book_stats", table="books", after=6, batch_size=100)
+def _fill_book_stats(conn: Connection, lo: int, hi: int) -> int:
+    from ..book_stats import stats_query
+    from ..models import BookStats, Chapter
+
+    # Books without chapters get their stats on the next ToC update
+    missing = ~exists().where(BookStats.book_id == Chapter.book_id)
+    result = conn.execute(
+        insert(BookStats).from_select(
+            [
+                "book_id",
+                "chapter_count",
+                "fetched_count",
+                "total_bytes",
+                "latest_chapter_index",
+                "latest_published_at",
+            ],
+            stats_query().where(Chapter.book_id > lo, Chapter.book_id <= hi, missing),
+        )
+    )
+    return result.rowcount
+
+
+@migration(7, "indexes for hot queries", transaction=False)
+def _hot_query_indexes(conn: Connection) -> None:
+    from ..models import Base
+
+    # Now partial (content_hash IS NOT NULL)
+    drop_index(conn, "ix_chapters_content_hash")
+    names = {
+        "ix_chapters_content_hash",
+        "ix_chapters_book_fetched_index",
+        "ix_chapters_book_missing_content",
+        "ix_book_users_user_in_library",
+        "ix_tasks_user_created",
+        "ix_tasks_status_finished",
+    }
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name in names:
+                create_index(conn, index)
+
+
+@migration(8, "chapters.content_hash foreign key")
+def _chapters_content_hash_fk(conn: Connection) -> None:
+    # SQLite cannot add a constraint to a table; its single writer does not
+    # let orphan cleanup interleave with a chapter write anyway
+    if conn.dialect.name != "postgresql":
+        return
+    names = {fk["name"] for fk in inspect(conn).get_foreign_keys("chapters")}
+    if "fk_chapters_content_hash" in names:
+        return
+    # NOT VALID: checked for new writes only, without scanning the table.
+    # Chapters already pointing at a missing blob fail their export.
+    conn.execute(
+        text(
+            "ALTER TABLE chapters ADD CONSTRAINT fk_chapters_content_hash "
+            "FOREIGN KEY (content_hash) REFERENCES chapter_contents (hash) "
+            "NOT VALID"
+        )
+    )
@@ -6,15 +6,19 @@ from typing import Any
 
 from sqlalchemy import (
     JSON,
+    BigInteger,
     Boolean,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
     inspect,
+    text,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -25,7 +29,7 @@ from .utils import utcnow
 
 class ProviderKey(StrEnum):
     ROYALROAD = "royalroad"
-    # PATREON = "patreon"
+    PATREON = "patreon"
     # WUXIAWORLD = "wuxiaworld"
 
 
@@ -89,7 +93,7 @@ class User(Base):
     )
 
     kindle_email: Mapped[str | None] = mapped_column(String(255), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
 
     library: Mapped[list["BookUser"]] = relationship(
         back_populates="user", cascade="all, delete"
@@ -114,9 +118,11 @@ class Book(Base):
     author: Mapped[str | None] = mapped_column(String(255))
     language: Mapped[str] = mapped_column(String(16), default="en")
     cover_url: Mapped[str | None] = mapped_column(String(1024))
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
+    # hash over the chapters' exact content hashes, see content_store
+    content_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=utcnow(), onupdate=utcnow()
+        DateTime, default=utcnow, onupdate=utcnow
     )
 
     chapters: Mapped[list["Chapter"]] = relationship(
@@ -125,12 +131,39 @@ class Book(Base):
     users: Mapped[list["BookUser"]] = relationship(
         back_populates="book", cascade="all, delete"
     )
+    stats: Mapped["BookStats | None"] = relationship(
+        back_populates="book", cascade="all, delete-orphan"
+    )
 
     __table_args__ = (
         UniqueConstraint("provider_fiction_uid", name="uq_book_provider_fiction_uid"),
     )
 
 
+class BookStats(Base):
+    """
+    Per-book chapter statistics, so listings don't aggregate over chapters.
+    Kept up to date by ingest and content fetches (see book_stats).
+    """
+
+    __tablename__ = "book_stats"
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", ondelete="CASCADE"), primary_key=True
+    )
+    chapter_count: Mapped[int] = mapped_column(Integer, default=0)
+    fetched_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, default=0)  # uncompressed
+    latest_chapter_index: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    latest_published_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=utcnow, onupdate=utcnow
+    )
+
+    book: Mapped[Book] = relationship(back_populates="stats")
+
+
 class Chapter(Base):
     __tablename__ = "chapters"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -140,12 +173,29 @@ class Chapter(Base):
     # order within the book; we keep as integer position
     index: Mapped[int] = mapped_column(Integer)
     title: Mapped[str] = mapped_column(String(255))
-    content_html: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # legacy, uncompressed; new content goes to ChapterContent (see content_store).
+    # Deferred: loaded on access, or with undefer() where content is needed
+    content_html: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    # sha256 of the content HTML, the key of its ChapterContent row. The key
+    # keeps orphan cleanup from deleting a blob a chapter is being pointed at
+    content_hash: Mapped[str | None] = mapped_column(
+        String(64),
+        ForeignKey("chapter_contents.hash", name="fk_chapters_content_hash"),
+        nullable=True,
+    )
+    content_size: Mapped[int | None] = mapped_column(Integer, nullable=True)  # bytes
+    # normalized content (see content_store.content_stats), for change detection
+    text_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    word_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
     provider_chapter_id: Mapped[str] = mapped_column(String(32))  # e.g. "1269041"
     source_url: Mapped[str] = mapped_column(String(1024))
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    # as reported by the provider's ToC, when known
+    published_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     fetched_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     is_fetched: Mapped[bool] = mapped_column(Boolean)
+    # why the last extraction failed (a sandbox limit, ...), cleared on success
+    parse_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
     book: Mapped[Book] = relationship(back_populates="chapters")
 
@@ -153,9 +203,41 @@ class Chapter(Base):
         UniqueConstraint(
             "book_id", "provider_chapter_id", name="uq_chapter_book_chapid"
         ),
+        # Content lookups by hash. Partial, so the planner does not take it
+        # for "content_hash IS NULL" (its stats describe unique values)
+        Index(
+            "ix_chapters_content_hash",
+            "content_hash",
+            sqlite_where=text("content_hash IS NOT NULL"),
+            postgresql_where=text("content_hash IS NOT NULL"),
+        ),
+        # Export: a book's fetched chapters, in order
+        Index("ix_chapters_book_fetched_index", "book_id", "is_fetched", "index"),
+        # Backfill: a book's chapters without content, in order. Partial, so
+        # it only holds the (few) chapters still to fetch
+        Index(
+            "ix_chapters_book_missing_content",
+            "book_id",
+            "index",
+            sqlite_where=text("content_hash IS NULL AND content_html IS NULL"),
+            postgresql_where=text("content_hash IS NULL AND content_html IS NULL"),
+        ),
     )
 
 
+class ChapterContent(Base):
+    """
+    Compressed chapter HTML, addressed by its sha256. Chapters with identical
+    content share a row, so the encoding is kept with the data.
+    """
+
+    __tablename__ = "chapter_contents"
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    encoding: Mapped[str] = mapped_column(String(16))  # "zstd", "zlib", "identity"
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+
+
 class BookUser(Base):
     __tablename__ = "book_users"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -176,6 +258,8 @@ class BookUser(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "book_id", name="uq_bookuser_user_book"),
+        # A user's library
+        Index("ix_book_users_user_in_library", "user_id", "in_library"),
     )
 
 
@@ -209,6 +293,13 @@ class Task(Base):
     attempts: Mapped[int] = mapped_column(Integer, default=0)
     error: Mapped[str | None]
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
-    started_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
-    finished_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+
+    __table_args__ = (
+        # A user's tasks, newest first
+        Index("ix_tasks_user_created", "user_id", "created_at"),
+        # Expired tasks, by status (see maintenance.cleanup)
+        Index("ix_tasks_status_finished", "status", "finished_at"),
+    )
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from mywbooks.ebook_generator import ExtractOptions
+from mywbooks.providers.base import ExtractedChapter, Provider
+from mywbooks.sandbox import ParseSandbox
+
+
+class ParseCache:
+    """
+    Extractor output (title + cleaned content HTML) on disk, keyed by the
+    sha256 of the raw page, the provider and its EXTRACTOR_VERSION.
+
+    Layout: `<cache_dir>/<provider>/v<version>/<sha[:2]>/<sha>.json`, so a
+    version bump only misses (and `prune` can drop) that provider's entries.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+
+    def path_for(self, provider: Provider, page: bytes) -> Path:
+        digest = hashlib.sha256(page).hexdigest()
+        return (
+            self.cache_dir
+            / provider.provider_key()
+            / f"v{provider.EXTRACTOR_VERSION}"
+            / digest[:2]
+            / f"{digest}.json"
+        )
+
+    def get(self, provider: Provider, page: bytes) -> Optional[ExtractedChapter]:
+        try:
+            with open(self.path_for(provider, page), "rb") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return ExtractedChapter(title=data["title"], content_html=data["content_html"])
+
+    def put(self, provider: Provider, page: bytes, extracted: ExtractedChapter) -> None:
+        path = self.path_for(provider, page)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write-then-rename, so concurrent workers never read a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(extracted._asdict(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def prune(self, provider: Provider) -> int:
+        """Delete entries of older extractor versions; returns files removed."""
+        current = f"v{provider.EXTRACTOR_VERSION}"
+        removed = 0
+        root = self.cache_dir / provider.provider_key()
+        if not root.is_dir():
+            return 0
+        for version_dir in root.iterdir():
+            if version_dir.name == current or not version_dir.is_dir():
+                continue
+            for entry in sorted(version_dir.rglob("*"), reverse=True):
+                if entry.is_dir():
+                    entry.rmdir()
+                else:
+                    entry.unlink()
+                    removed += 1
+            version_dir.rmdir()
+        return removed
+
+    def extract(
+        self,
+        provider: Provider,
+        page: bytes,
+        *,
+        options: Optional[ExtractOptions] = None,
+        sandbox: ParseSandbox | None = None,
+    ) -> Optional[ExtractedChapter]:
+        """
+        `provider.extract_chapter_html`, through the cache. Misses are parsed
+        in `sandbox` when given (may raise ParseFailure).
+        """
+        cached = self.get(provider, page)
+        if cached is not None:
+            return cached
+
+        if sandbox is not None:
+            extracted = sandbox.extract_chapter_html(provider, page, options=options)
+        else:
+            extracted = provider.extract_chapter_html(page, options=options)
+        if extracted is not None:
+            self.put(provider, page, extracted)
+        return extracted
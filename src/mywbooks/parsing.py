@@ -0,0 +1,413 @@
+"""
+HTML parser backends for chapter extraction.
+
+Providers select nodes through `Node.select_one` with CSS selector strings;
+each backend compiles a selector once and reuses it. Backends:
+
+- "bs4":        BeautifulSoup (lxml tree builder) + soupsieve, always available
+- "lxml":       lxml.html + XPath compiled by cssselect (`mywbooks[lxml]`)
+- "selectolax": selectolax's lexbor engine (`mywbooks[selectolax]`)
+
+Output HTML differs in serialization details only (e.g. `<br/>` vs `<br>`).
+
+`parse` can be limited to the page regions a provider needs (e.g. the
+content div and the `<style>` blocks); everything outside them (scripts,
+navigation, comments, sidebars) is then not kept in the tree.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Mapping, NamedTuple, Optional, Sequence
+
+from bs4 import BeautifulSoup, ElementFilter, Tag
+
+# Backend used when none is requested; "auto" picks the fastest installed one
+DEFAULT_PARSER = os.getenv("MYWBOOKS_HTML_PARSER", "auto")
+
+
+class ParserUnavailableError(RuntimeError):
+    def __init__(self, name: str, reason: str):
+        self.name = name
+        self.reason = reason
+        super().__init__(f"HTML parser backend '{name}' is not available: {reason}")
+
+
+# A simple selector: tag, #id, .class and [attr="value"], e.g. `div.chapter-inner`
+_REGION_RE = re.compile(
+    r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[#.][\w-]+|\[[\w-]+="[^"]*"\])*)$'
+)
+_REGION_PART_RE = re.compile(r'([#.])([\w-]+)|\[([\w-]+)="([^"]*)"\]')
+
+
+class Region(NamedTuple):
+    """
+    A page region to keep when parsing. Matching only looks at the element
+    itself (no combinators), so it can be decided while the page is parsed.
+    """
+
+    css: str
+    tag: str | None
+    id: str | None
+    classes: frozenset[str]
+    attrs: tuple[tuple[str, str], ...]
+
+    @classmethod
+    def parse(cls, css: str) -> Region:
+        m = _REGION_RE.match(css.strip())
+        if not m or not css.strip():
+            raise ValueError(f"Not a simple selector: '{css}'")
+
+        _id: str | None = None
+        classes: set[str] = set()
+        attrs: list[tuple[str, str]] = []
+        for kind, name, attr, value in _REGION_PART_RE.findall(m.group("rest")):
+            if kind == "#":
+                _id = name
+            elif kind == ".":
+                classes.add(name)
+            else:
+                attrs.append((attr, value))
+
+        tag = m.group("tag")
+        return cls(
+            css=css.strip(),
+            tag=tag.lower() if tag else None,
+            id=_id,
+            classes=frozenset(classes),
+            attrs=tuple(attrs),
+        )
+
+    def matches(self, name: str, attrs: Mapping[str, Any]) -> bool:
+        if self.tag is not None and name != self.tag:
+            return False
+        if self.id is not None and attrs.get("id") != self.id:
+            return False
+        if self.classes:
+            cls = attrs.get("class") or ""
+            names = cls.split() if isinstance(cls, str) else cls
+            if not self.classes.issubset(names):
+                return False
+        return all(attrs.get(k) == v for k, v in self.attrs)
+
+
+def regions(*css: str) -> tuple[Region, ...]:
+    return tuple(Region.parse(c) for c in css)
+
+
+class RegionFilter(ElementFilter):
+    """bs4 filter building only the subtrees rooted at one of `regions`."""
+
+    def __init__(self, regions: Sequence[Region]) -> None:
+        super().__init__()
+        self.regions = tuple(regions)
+
+    def allow_tag_creation(
+        self, nsprefix: str | None, name: str, attrs: Mapping[Any, str] | None
+    ) -> bool:
+        return any(r.matches(name, attrs or {}) for r in self.regions)
+
+    def allow_string_creation(self, string: str) -> bool:
+        # Consulted only outside the regions, where text is never needed
+        return False
+
+
+class Node(ABC):
+    """A parsed element (or the whole document)."""
+
+    __slots__ = ()
+
+    @abstractmethod
+    def select_one(self, css: str) -> Optional[Node]: ...
+
+    @abstractmethod
+    def select(self, css: str) -> list[Node]: ...
+
+    # Text content, every text piece stripped (like bs4's get_text(strip=True))
+    @abstractmethod
+    def text(self) -> str: ...
+
+    # Outer HTML of the element
+    @abstractmethod
+    def html(self) -> str: ...
+
+    # Remove every descendant carrying one of `class_names`, in one traversal.
+    # Returns the number of removed elements.
+    @abstractmethod
+    def remove_with_classes(self, class_names: frozenset[str]) -> int: ...
+
+
+class ParserBackend(ABC):
+    name: str
+
+    def __init__(self) -> None:
+        self._compiled: dict[str, Any] = {}
+
+    # With `regions`, only their subtrees need to be built. Selectors must then
+    # only rely on what is inside a region.
+    @abstractmethod
+    def parse(self, page: bytes, regions: Sequence[Region] | None = None) -> Node: ...
+
+    @abstractmethod
+    def _compile(self, css: str) -> Any: ...
+
+    def compiled(self, css: str) -> Any:
+        sel = self._compiled.get(css)
+        if sel is None:
+            sel = self._compiled[css] = self._compile(css)
+        return sel
+
+
+# ----------------- bs4 -----------------
+
+
+class Bs4Node(Node):
+    __slots__ = ("_backend", "tag")
+
+    def __init__(self, backend: Bs4Backend, tag: Tag) -> None:
+        self._backend = backend
+        self.tag = tag
+
+    def select_one(self, css: str) -> Optional[Node]:
+        tag = self._backend.compiled(css).select_one(self.tag)
+        return Bs4Node(self._backend, tag) if tag is not None else None
+
+    def select(self, css: str) -> list[Node]:
+        return [
+            Bs4Node(self._backend, t)
+            for t in self._backend.compiled(css).select(self.tag)
+        ]
+
+    def text(self) -> str:
+        return self.tag.get_text(strip=True)
+
+    def html(self) -> str:
+        return str(self.tag)
+
+    def remove_with_classes(self, class_names: frozenset[str]) -> int:
+        found = self.tag.find_all(
+            lambda t: not class_names.isdisjoint(t.get("class") or ())
+        )
+        for tag in found:
+            tag.extract()
+        return len(found)
+
+
+class Bs4Backend(ParserBackend):
+    name = "bs4"
+
+    def __init__(self, features: str = "lxml") -> None:
+        super().__init__()
+        self.features = features
+
+    def parse(self, page: bytes, regions: Sequence[Region] | None = None) -> Node:
+        parse_only = RegionFilter(regions) if regions else None
+        return Bs4Node(
+            self,
+            BeautifulSoup(
+                page,
+                features=self.features,
+                parse_only=parse_only,  # type: ignore[arg-type]  # ElementFilter
+            ),
+        )
+
+    def wrap(self, tag: Tag) -> Bs4Node:
+        """Wrap an already parsed soup (or tag)."""
+        return Bs4Node(self, tag)
+
+    def _compile(self, css: str) -> Any:
+        import soupsieve
+
+        return soupsieve.compile(css)
+
+
+# ----------------- lxml -----------------
+
+
+class _LxmlNode(Node):
+    __slots__ = ("_backend", "el")
+
+    def __init__(self, backend: LxmlBackend, el: Any) -> None:
+        self._backend = backend
+        self.el = el
+
+    def select_one(self, css: str) -> Optional[Node]:
+        found = self._backend.compiled(css)(self.el)
+        return _LxmlNode(self._backend, found[0]) if found else None
+
+    def select(self, css: str) -> list[Node]:
+        return [
+            _LxmlNode(self._backend, el) for el in self._backend.compiled(css)(self.el)
+        ]
+
+    def text(self) -> str:
+        return "".join(s.strip() for s in self.el.itertext())
+
+    def html(self) -> str:
+        from lxml import html
+
+        return str(html.tostring(self.el, encoding="unicode", with_tail=False))
+
+    def remove_with_classes(self, class_names: frozenset[str]) -> int:
+        found = [
+            el
+            for el in self.el.iterfind(".//*[@class]")
+            if not class_names.isdisjoint(el.get("class").split())
+        ]
+        for el in found:
+            el.drop_tree()  # keeps the tail text, like bs4's extract()
+        return len(found)
+
+
+class LxmlBackend(ParserBackend):
+    name = "lxml"
+
+    def __init__(self, encoding: str = "utf-8") -> None:
+        super().__init__()
+        try:
+            from cssselect import HTMLTranslator
+            from lxml import etree, html
+        except ImportError as e:
+            raise ParserUnavailableError(self.name, str(e)) from e
+
+        self._etree = etree
+        self._html = html
+        self._translator = HTMLTranslator()
+        self._parser = html.HTMLParser(encoding=encoding)
+        self._region_parser = html.HTMLParser(encoding=encoding, remove_comments=True)
+        self._fromstring: Callable[..., Any] = html.document_fromstring
+
+    def parse(self, page: bytes, regions: Sequence[Region] | None = None) -> Node:
+        if not regions:
+            return _LxmlNode(self, self._fromstring(page, parser=self._parser))
+
+        # libxml2 builds the whole tree (in C, faster than filtering element by
+        # element in Python); the regions are moved into a fresh document and
+        # the rest is freed right away.
+        doc = self._fromstring(page, parser=self._region_parser)
+        kept = self._html.Element("body")
+        kept_set = set()
+        for el in self.compiled(", ".join(r.css for r in regions))(doc):
+            if not any(a in kept_set for a in el.iterancestors()):
+                kept_set.add(el)
+                el.tail = None
+                kept.append(el)
+        del doc
+        return _LxmlNode(self, kept)
+
+    def _compile(self, css: str) -> Any:
+        return self._etree.XPath(self._translator.css_to_xpath(css))
+
+
+# ----------------- selectolax -----------------
+
+
+class _LexborNode(Node):
+    __slots__ = ("node",)
+
+    def __init__(self, node: Any) -> None:
+        self.node = node
+
+    def select_one(self, css: str) -> Optional[Node]:
+        found = self.node.css_first(css)
+        return _LexborNode(found) if found is not None else None
+
+    def select(self, css: str) -> list[Node]:
+        return [_LexborNode(n) for n in self.node.css(css)]
+
+    def text(self) -> str:
+        return str(self.node.text(deep=True, strip=True))
+
+    def html(self) -> str:
+        return str(self.node.html)
+
+    def remove_with_classes(self, class_names: frozenset[str]) -> int:
+        found = [
+            n
+            for n in self.node.css("[class]")
+            if not class_names.isdisjoint((n.attributes.get("class") or "").split())
+        ]
+        for n in found:
+            n.decompose()
+        return len(found)
+
+
+class SelectolaxBackend(ParserBackend):
+    """Selectors are compiled (and cached) by lexbor itself."""
+
+    name = "selectolax"
+
+    def __init__(self) -> None:
+        super().__init__()
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError as e:
+            raise ParserUnavailableError(self.name, str(e)) from e
+        self._parser_cls = LexborHTMLParser
+
+    def parse(self, page: bytes, regions: Sequence[Region] | None = None) -> Node:
+        # lexbor has no partial mode; it parses a full page faster than the
+        # other backends build a partial one
+        return _LexborNode(self._parser_cls(page).root)
+
+    def _compile(self, css: str) -> Any:
+        return css
+
+
+# ----------------- Registry -----------------
+
+PARSER_BACKENDS: dict[str, type[ParserBackend]] = {
+    "bs4": Bs4Backend,
+    "lxml": LxmlBackend,
+    "selectolax": SelectolaxBackend,
+}
+
+# Preference order for "auto". selectolax is opt-in: its HTML5 tree can
+# differ from the lxml tree the stored chapters were extracted from.
+_AUTO_ORDER = ["lxml", "bs4"]
+
+_backends: dict[str, ParserBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_parser_backend(name: str | None = None) -> ParserBackend:
+    """
+    Shared backend instance by name (default DEFAULT_PARSER), so compiled
+    selectors are reused. Raises ParserUnavailableError if not installed.
+    """
+    name = name or DEFAULT_PARSER
+    if name == "auto":
+        for candidate in _AUTO_ORDER:
+            try:
+                return get_parser_backend(candidate)
+            except ParserUnavailableError:
+                continue
+
+    backend = _backends.get(name)
+    if backend is not None:
+        return backend
+
+    cls = PARSER_BACKENDS.get(name)
+    if cls is None:
+        raise ValueError(
+            f"Unknown HTML parser backend '{name}', expected one of {list(PARSER_BACKENDS)}"
+        )
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _backends[name] = cls()
+    return backend
+
+
+def available_parser_backends() -> list[str]:
+    names = []
+    for name in PARSER_BACKENDS:
+        try:
+            get_parser_backend(name)
+        except ParserUnavailableError:
+            continue
+        names.append(name)
+    return names
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import importlib
+import logging
+import threading
 import typing
+from importlib.metadata import entry_points
 
 from ..models import ProviderKey
 from .base import Provider
@@ -11,16 +14,23 @@ from .base import Provider
 #   - A unique identifier most be added to the ProviderKey class in
 #           `models.py`, and
 #   - The module name most be added to the _PROVIDER_MODULES dict
+#
+# Third-party packages can register provider modules through the
+# `mywbooks.providers` entry point group instead (name = provider key,
+# value = module). Books are stored with a ProviderKey, so the key must
+# still be known to `models.py` to be persisted.
 
 
 # fmt: off
 _PROVIDER_MODULES: dict[str, str] = {
         ProviderKey.ROYALROAD: "royalroad",
-        # Provider.PATREON = "patreon"
+        ProviderKey.PATREON: "patreon",
         # Provider.WUXIAWORLD = "wuxiaworld"
 }
 # fmt: on
 
+ENTRY_POINT_GROUP = "mywbooks.providers"
+
 
 class _ProviderInfo(typing.NamedTuple):
     provider_key: str
@@ -30,32 +40,64 @@ class _ProviderInfo(typing.NamedTuple):
     instance: Provider
 
 
-def get_provider_by_key(key: str) -> Provider:
-    # Store provider_register as function attribute
-    if not hasattr(get_provider_by_key, "initialized_value"):
-        setattr(
-            get_provider_by_key,
-            "provider_register",
-            {},
-        )
-    provider_register: dict[str, _ProviderInfo] = getattr(
-        get_provider_by_key, "provider_register"
-    )
+# Loaded providers; written only while holding _registry_lock
+_provider_register: dict[str, _ProviderInfo] = {}
+_registry_lock = threading.Lock()
+_entry_point_modules: dict[str, str] | None = None
+
 
-    # Check for provider in registry
-    pinfo = provider_register.get(key)
+def get_provider_by_key(key: str) -> Provider:
+    # Fast path: a dict lookup, no locking once the provider is loaded
+    pinfo = _provider_register.get(key)
     if pinfo:
         return pinfo.instance
 
-    # If not loaded, look up module name
+    with _registry_lock:
+        # Another thread may have loaded it while we waited
+        pinfo = _provider_register.get(key)
+        if not pinfo:
+            pinfo = _load_provider(key)
+            _provider_register[key] = pinfo
+
+    return pinfo.instance
+
+
+def warm_providers() -> list[str]:
+    """
+    Load every known provider (built-in and entry points), so the first task
+    of a worker does not pay for the imports. Returns the loaded keys.
+    """
+    keys = [*_PROVIDER_MODULES, *_discover_entry_point_modules()]
+    for key in keys:
+        get_provider_by_key(key)
+    return keys
+
+
+def _discover_entry_point_modules() -> dict[str, str]:
+    global _entry_point_modules
+
+    if _entry_point_modules is None:
+        _entry_point_modules = {
+            ep.name: ep.value for ep in entry_points(group=ENTRY_POINT_GROUP)
+        }
+    return _entry_point_modules
+
+
+def _load_provider(key: str) -> _ProviderInfo:
+    # Look up module name: built-in first, then third-party entry points
     mname = _PROVIDER_MODULES.get(key)
-    if not mname:
-        raise ValueError(f"No provider registered for {key}")
+    if mname:
+        module_path, package = f".{mname}", __name__
+    else:
+        mname = _discover_entry_point_modules().get(key)
+        if not mname:
+            raise ValueError(f"No provider registered for {key}")
+        module_path, package = mname, None
 
     # Load module
-    print("Loading provider module for '{key}', at  '{mname}'")
+    logging.info(f"Loading provider module for '{key}', at '{mname}'")
 
-    module = importlib.import_module(f".{mname}", package=__name__)
+    module = importlib.import_module(module_path, package=package)
 
     def _get_assert_var(var_name: str, desc: str) -> typing.Any:
         if not hasattr(module, var_name):
@@ -78,17 +120,13 @@ def get_provider_by_key(key: str) -> Provider:
     # Set _provider_key attribute of Provider class
     setattr(_class, "_provider_key", key)
 
-    instance: Provider = _class()
-
-    provider_register[key] = _ProviderInfo(
+    return _ProviderInfo(
         provider_key=key,
         module_name=mname,
         short_name=short_name,
         provider_class=_class,
-        instance=instance,
+        instance=_class(),
     )
 
-    return instance
-
 
-__all__ = ["Provider", "get_provider_by_key"]
+__all__ = ["Provider", "get_provider_by_key", "warm_providers"]
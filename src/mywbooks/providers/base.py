@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import NamedTuple, Optional
+from datetime import datetime
+from typing import ClassVar, NamedTuple, Optional
 
 from bs4 import BeautifulSoup
 from pydantic_core import Url
@@ -9,6 +10,7 @@ from pydantic_core import Url
 from mywbooks.book import BookConfig, ChapterRef
 from mywbooks.download_manager import DownlaodManager
 from mywbooks.ebook_generator import ChapterPageContent, ExtractOptions
+from mywbooks.parsing import ParserBackend
 
 
 class InvalidProviderError(Exception):
@@ -29,9 +31,22 @@ class Fiction(NamedTuple):
     chapter_refs: list[ChapterRef]
 
 
+class ExtractedChapter(NamedTuple):
+    title: str | None
+    content_html: str
+
+
+class ChapterUpdates(NamedTuple):
+    refs: list[ChapterRef]  # chapters published after `since`, oldest first
+    complete: bool  # False if there may be more (rediscover the full ToC)
+
+
 class Provider(ABC):
     """Stateless provider interface. No ORM/DTO state inside."""
 
+    # Bump when extraction output changes; invalidates cached parse results
+    EXTRACTOR_VERSION: ClassVar[int] = 1
+
     @classmethod
     def provider_key(cls) -> str:
         if not hasattr(cls, "_provider_key"):
@@ -55,12 +70,49 @@ class Provider(ABC):
     @abstractmethod
     def discover_fiction(self, dm: DownlaodManager, fiction_url: Url) -> Fiction: ...
 
+    # Optional: the one page discovery parses, so that the caller can download
+    # it and parse it apart (`parse_fiction_page`, e.g. in the parse sandbox).
+    # Returns None if discovery is not a single page.
+    def fiction_page_url(self, fiction_url: Url) -> Url | None:
+        return None
+
+    def parse_fiction_page(self, fiction_url: Url, page: bytes) -> Fiction:
+        raise NotImplementedError(
+            f"{type(self).__name__} does not discover fictions from one page"
+        )
+
     # Extract a chapter’s title+content from its page
     @abstractmethod
     def extract_chapter(
         self, soup: BeautifulSoup, *, options: Optional[ExtractOptions] = None
     ) -> ChapterPageContent | None: ...
 
+    # Extract a chapter's title+content straight from the page bytes. Providers
+    # override this to run on a faster parser backend; the default parses
+    # with BeautifulSoup and delegates to `extract_chapter`.
+    def extract_chapter_html(
+        self,
+        page: bytes,
+        *,
+        options: Optional[ExtractOptions] = None,
+        parser: ParserBackend | None = None,
+    ) -> ExtractedChapter | None:
+        extracted = self.extract_chapter(
+            BeautifulSoup(page, features="lxml"), options=options
+        )
+        if extracted is None:
+            return None
+        return ExtractedChapter(
+            title=extracted.title, content_html=str(extracted.content)
+        )
+
+    # Optional: cheaply list chapters published after `since` (e.g. from a
+    # feed), without fetching the full ToC. Returns None if not supported.
+    def poll_updates(
+        self, dm: DownlaodManager, fiction_uid: str, since: datetime | None
+    ) -> ChapterUpdates | None:
+        return None
+
     ### Maybe
     # @abstractmethod
     # def canonical_chapter_url(self, chapter_id_prefixed: str) -> str: ...
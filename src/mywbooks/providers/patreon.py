@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import functools
+import html as html_lib
+import json
+import re
+from datetime import datetime
+from typing import Any, Iterator, Optional, override
+from urllib.parse import urlencode, urlparse
+
+from bs4 import BeautifulSoup, ResultSet, Tag
+from pydantic_core import Url
+
+from mywbooks.book import DEFAULT_COVER_URL, BookConfig, ChapterRef
+from mywbooks.download_manager import DownlaodManager
+from mywbooks.ebook_generator import (
+    ChapterPageContent,
+    ChapterPageExtractor,
+    ExtractOptions,
+)
+from mywbooks.parsing import ParserBackend
+from mywbooks.urls import canonical_url
+
+from .base import ExtractedChapter, Fiction, Provider
+
+# ================= Header =================
+
+PROVIDER_SHORT_NAME = "Patreon"
+
+# ==========================================
+
+PATREON_ORIGIN = "https://www.patreon.com"
+
+# A fiction is a post collection, e.g. https://www.patreon.com/collection/1270974
+COLLECTION_ID_RE = re.compile(r"/collection/(\d+)(?:/|$)", re.IGNORECASE)
+
+COLLECTION_API = PATREON_ORIGIN + "/api/collection/{id}"
+POSTS_API = PATREON_ORIGIN + "/api/posts"
+
+# Post pages carry the post (title, content HTML, dates) as Next.js page data
+NEXT_DATA_RE = re.compile(rb'<script[^>]*\bid="__NEXT_DATA__"[^>]*>')
+# Start of the post object within it; lets us decode the post alone (~60 KB)
+# instead of the whole page data (~400 KB)
+POST_DATA_RE = re.compile(
+    r'"pageBootstrap"\s*:\s*\{\s*"post"\s*:\s*\{\s*"data"\s*:\s*(?=\{)'
+)
+
+# Navigation paragraphs ("<< Chapter 40 | Table of Contents") around a post
+_LEADING_P_RE = re.compile(r"^\s*<p\b[^>]*>(.*?)</p>", re.DOTALL)
+_TRAILING_P_RE = re.compile(r"<p\b[^>]*>(.*)</p>\s*$", re.DOTALL)
+_LINK_RE = re.compile(r"<a\b[^>]*>.*?</a>", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_NAV_CHARS = " \t\r\n|<>«»‹›·•-–—/\xa0"
+
+
+# ----------------- Exceptions -----------------
+
+
+class PostParseError(Exception):
+    def __init__(self, reason: str, *, url: str | None):
+        self.reason = reason
+        self.url = url
+        msg = f"Patreon post parse failed: {reason}"
+        if url:
+            msg += f" | url={url}"
+        super().__init__(msg)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (functools.partial(self.__class__, url=self.url), (self.reason,))
+
+
+# ----------------- Provider -----------------
+
+
+class PatreonProvider(Provider):
+    def __init__(self) -> None:
+        self._extractor = Patreon_ChapterPageExtractor()
+
+    def fiction_uid_from_url(self, url: str) -> str | None:
+        m = COLLECTION_ID_RE.search(urlparse(url).path)
+        if not m:
+            return None
+        return f"{self.provider_key()}:{m.group(1)}"
+
+    def fiction_url_from_uid(self, uid: str) -> str:
+        [_, _id] = uid.split(":", 1)
+        return f"{PATREON_ORIGIN}/collection/{_id}"
+
+    def discover_fiction(self, dm: DownlaodManager, fiction_url: Url) -> Fiction:
+        """Metadata and ToC of a collection, from Patreon's JSON:API listings."""
+        uid = self.fiction_uid_from_url(str(fiction_url))
+        if not uid:
+            raise ValueError("Could not extract Patreon collection id from URL")
+        [_, collection_id] = uid.split(":", 1)
+
+        collection = _get_json(
+            dm,
+            COLLECTION_API.format(id=collection_id),
+            {
+                "include": "campaign",
+                "fields[collection]": "title,thumbnail",
+                "fields[campaign]": "name,avatar_photo_url",
+            },
+        )
+
+        refs = [
+            ChapterRef(
+                id=f"{self.provider_key()}:{post['id']}",
+                url=canonical_url(
+                    (post.get("attributes") or {}).get("url")
+                    or f"{PATREON_ORIGIN}/posts/{post['id']}"
+                ).url,
+                title=(post.get("attributes") or {}).get("title"),
+                published_at=_parse_date(
+                    (post.get("attributes") or {}).get("published_at")
+                ),
+            )
+            for post in _iter_collection_posts(dm, collection_id)
+        ]
+        return Fiction(
+            uid=uid,
+            source_url=Url(self.fiction_url_from_uid(uid)),
+            meta=_collection_meta(collection),
+            chapter_refs=refs,
+        )
+
+    def extract_chapter(
+        self, soup: BeautifulSoup, *, options: Optional[ExtractOptions] = None
+    ) -> ChapterPageContent | None:
+        return self._extractor.extract_chapter(soup, options=options)
+
+    def extract_chapter_html(
+        self,
+        page: bytes,
+        *,
+        options: Optional[ExtractOptions] = None,
+        parser: ParserBackend | None = None,
+    ) -> ExtractedChapter | None:
+        # The post JSON is sliced out of the raw page; no DOM is built
+        post = _embedded_post(page)
+        if post is None:
+            return super().extract_chapter_html(page, options=options, parser=parser)
+        return _post_chapter(post, options or ExtractOptions())
+
+
+# ----------------- Extractor -----------------
+
+
+class Patreon_ChapterPageExtractor(ChapterPageExtractor):
+    """
+    Extract a post from a parsed Patreon page: from the embedded post JSON,
+    or else by walking the DOM around the post title.
+    """
+
+    fiction_title_selector: str = 'span[data-tag="post-title"]'
+    fiction_content_selector: str = "div.chapter-inner"
+
+    @override
+    def extract_chapter(
+        self,
+        page_content_bs: BeautifulSoup,
+        *,
+        options: ExtractOptions | None = None,
+    ) -> Optional[ChapterPageContent]:
+        opts = options or ExtractOptions()
+
+        script = page_content_bs.find("script", id="__NEXT_DATA__")
+        if script is not None:
+            post = _post_from_next_data(script.get_text())
+            if post is not None:
+                extracted = _post_chapter(post, opts)
+                if extracted is None:
+                    return None
+                content = BeautifulSoup(extracted.content_html, "lxml").div
+                assert content is not None
+                return ChapterPageContent(title=extracted.title, content=content)
+
+        return self._walk_dom(page_content_bs)
+
+    def _walk_dom(self, bs: BeautifulSoup) -> Optional[ChapterPageContent]:
+        fic_titles: ResultSet[Tag] = bs.select(self.fiction_title_selector)
+
+        # TODO: This should be logging instead
+        assert len(fic_titles) == 1
+
+        title_tag = fic_titles[0]
+
+        fic_title = str(fic_titles[0].decode_contents())
+
+        div = title_tag.parent
+        while div is not None and len(div.contents) == 1:
+            div = div.parent
+
+        assert div is not None
+
+        div = div.parent
+        assert div is not None
+
+        assert len(div.contents) >= 2
+        div = div.contents[1]  # type: ignore[assignment]
+
+        assert isinstance(div, Tag)
+
+        while div is not None and len(div.contents) == 1:
+            div = div.contents[0]  # type: ignore[assignment]
+            assert isinstance(div, Tag)
+
+        assert isinstance(div, Tag)
+
+        # This is for Netherwitch specific
+        # could maybe have some customizable post manipulations
+        div.contents[0].decompose()
+
+        return ChapterPageContent(title=fic_title, content=div)
+
+
+# ----------------- helpers -----------------
+
+
+def _get_json(
+    dm: DownlaodManager, url: str, params: dict[str, str] | None = None
+) -> dict[str, Any]:
+    if params:
+        url += "?" + urlencode(params)
+    # Listings change with every new post; never served from the cache
+    data: dict[str, Any] = json.loads(dm.get_data(Url(url), ignore_cache=True))
+    return data
+
+
+def _iter_collection_posts(
+    dm: DownlaodManager, collection_id: str
+) -> Iterator[dict[str, Any]]:
+    """Posts of a collection in collection order, following `links.next`."""
+    url: str | None = (
+        POSTS_API
+        + "?"
+        + urlencode(
+            {
+                "filter[collection_id]": collection_id,
+                "sort": "collection_order",
+                "fields[post]": "title,url,published_at",
+                "page[count]": "100",
+            }
+        )
+    )
+    seen: set[str] = set()
+    while url and url not in seen:
+        seen.add(url)
+        doc = _get_json(dm, url)
+        yield from doc.get("data") or []
+        url = (doc.get("links") or {}).get("next")
+
+
+def _collection_meta(doc: dict[str, Any]) -> BookConfig:
+    attrs = (doc.get("data") or {}).get("attributes") or {}
+    campaign = next(
+        (
+            inc.get("attributes") or {}
+            for inc in doc.get("included") or []
+            if inc.get("type") == "campaign"
+        ),
+        {},
+    )
+
+    thumbnail = attrs.get("thumbnail") or {}
+    cover = (
+        thumbnail.get("original")
+        or thumbnail.get("large")
+        or thumbnail.get("default")
+        or campaign.get("avatar_photo_url")
+    )
+    return BookConfig(
+        title=attrs.get("title") or "Untitled",
+        author=campaign.get("name") or "",
+        language="en",  # not exposed by Patreon
+        cover_image=Url(cover) if cover else DEFAULT_COVER_URL,
+    )
+
+
+def _embedded_post(page: bytes) -> dict[str, Any] | None:
+    m = NEXT_DATA_RE.search(page)
+    if not m:
+        return None
+    end = page.find(b"</script>", m.end())
+    if end < 0:
+        return None
+
+    data = page[m.end() : end].decode("utf-8", errors="replace")
+    fast = POST_DATA_RE.search(data)
+    if fast:
+        try:
+            post, _ = json.JSONDecoder().raw_decode(data, fast.end())
+            if isinstance(post, dict):
+                return post
+        except ValueError:
+            pass
+    return _post_from_next_data(data)
+
+
+def _post_from_next_data(data: str | bytes) -> dict[str, Any] | None:
+    try:
+        doc = json.loads(data)
+        post = doc["props"]["pageProps"]["bootstrapEnvelope"]["pageBootstrap"]
+        return post["post"]["data"]  # type: ignore[no-any-return]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _post_chapter(
+    post: dict[str, Any], opts: ExtractOptions
+) -> ExtractedChapter | None:
+    attrs = post.get("attributes") or {}
+    content = attrs.get("content")
+    if not content:
+        if opts.strict:
+            raise PostParseError(
+                "Post has no text content (locked, or not a text post)", url=opts.url
+            )
+        return None
+
+    return ExtractedChapter(
+        title=attrs.get("title") or opts.fallback_title,
+        content_html=f'<div class="chapter-inner">{_strip_nav_paragraphs(content)}</div>',
+    )
+
+
+def _strip_nav_paragraphs(content: str) -> str:
+    m = _LEADING_P_RE.match(content)
+    if m and _is_nav_paragraph(m.group(1)):
+        content = content[m.end() :]
+    # Paragraphs do not nest, so the last one starts at the last "<p"
+    last = max(content.rfind("<p>"), content.rfind("<p "))
+    m = _TRAILING_P_RE.match(content, last) if last >= 0 else None
+    if m and _is_nav_paragraph(m.group(1)):
+        content = content[: m.start()]
+    return content
+
+
+def _is_nav_paragraph(inner: str) -> bool:
+    """Only links and separators, e.g. `<< <a>Chapter 40</a> | <a>ToC</a>`."""
+    if not _LINK_RE.search(inner):
+        return False
+    rest = html_lib.unescape(_TAG_RE.sub("", _LINK_RE.sub("", inner)))
+    return not rest.strip(_NAV_CHARS)
+
+
+def _parse_date(value: object) -> datetime | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import functools
+import json
 import re
-from typing import Iterable, Optional, Tuple, override
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from typing import Any, Iterable, NamedTuple, Optional, Tuple, override
 from urllib.parse import urljoin, urlparse
 
 from bs4 import BeautifulSoup, Tag
@@ -14,8 +20,19 @@ from mywbooks.ebook_generator import (
     ChapterPageExtractor,
     ExtractOptions,
 )
+from mywbooks.parsing import (
+    Bs4Backend,
+    Bs4Node,
+    Node,
+    ParserBackend,
+    RegionFilter,
+    get_parser_backend,
+    regions,
+)
+from mywbooks.urls import UrlLike, canonical_url
+from mywbooks.utils import ensure_aware
 
-from .base import Fiction, Provider
+from .base import ChapterUpdates, ExtractedChapter, Fiction, Provider
 
 # ================= Header =================
 
@@ -27,6 +44,17 @@ PROVIDER_SHORT_NAME = "RoyalRoad"
 CHAPTER_ID_RE = re.compile(r"/chapter/(\d+)", re.IGNORECASE)
 FICTION_ID_RE = re.compile(r"/fiction/(\d+)(?:/|$)", re.IGNORECASE)
 
+# Per-fiction RSS feed of the latest chapters, newest first
+SYNDICATION_URL = "https://www.royalroad.com/fiction/syndication/{id}"
+
+# CSS rules in <style> blocks, and single-class selectors within their selector lists
+CSS_RULE_RE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+CSS_DISPLAY_NONE_RE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+CSS_CLASS_SELECTOR_RE = re.compile(r"^\s*\.([\w-]+)\s*$")
+
+# Fiction pages embed the full ToC as `window.chapters = [{...}, ...];`
+EMBEDDED_CHAPTERS_RE = re.compile(r"window\.chapters\s*=\s*(?=\[)")
+
 
 # ----------------- Exceptions -----------------
 
@@ -41,6 +69,15 @@ class ChapterParseError(Exception):
             msg += f" | url={url}"
         super().__init__(msg)
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Keyword-only arguments; lets the error cross process boundaries
+        return (
+            functools.partial(
+                self.__class__, url=self.url, tried_selectors=self.tried_selectors
+            ),
+            (self.reason,),
+        )
+
 
 class FictionParseError(Exception):
     def __init__(self, reason: str, *, url: str | None, tried_selectors: list[str]):
@@ -52,11 +89,23 @@ class FictionParseError(Exception):
             msg += f" | url={url}"
         super().__init__(msg)
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Keyword-only arguments; lets the error cross process boundaries
+        return (
+            functools.partial(
+                self.__class__, url=self.url, tried_selectors=self.tried_selectors
+            ),
+            (self.reason,),
+        )
+
 
 # ----------------- Provider -----------------
 
 
 class RoyalRoadProvider(Provider):
+    # 2: hidden anti-piracy elements are stripped
+    EXTRACTOR_VERSION = 2
+
     def __init__(self) -> None:
         self._extractor = RoyalRoadChapterPageExtractor()
 
@@ -71,17 +120,24 @@ class RoyalRoadProvider(Provider):
         return f"https://www.royalroad.com/fiction/{_id}"
 
     def discover_fiction(self, dm: DownlaodManager, fiction_url: Url) -> Fiction:
+        page_url = self.fiction_page_url(fiction_url)
+        return self.parse_fiction_page(page_url, dm.get_and_cache_data(page_url))
 
+    def fiction_page_url(self, fiction_url: Url) -> Url:
         uid = self.fiction_uid_from_url(str(fiction_url))
         if not uid:
             raise ValueError("Could not extract RoyalRoad fiction id from URL")
+        return Url(self.fiction_url_from_uid(uid))
 
-        fiction_url = Url(self.fiction_url_from_uid(uid))
+    def parse_fiction_page(self, fiction_url: Url, page: bytes) -> Fiction:
+        uid = self.fiction_uid_from_url(str(fiction_url))
+        if not uid:
+            raise ValueError("Could not extract RoyalRoad fiction id from URL")
 
-        html = dm.get_and_cache_data(fiction_url).decode("utf-8")
-        meta, chapter_urls = _parse_fiction_page(str(fiction_url), html, strict=True)
+        html = page.decode("utf-8")
+        meta, toc = _parse_fiction_page_toc(str(fiction_url), html, strict=True)
 
-        def chapter_uid_from_url(url: Url) -> str:
+        def chapter_uid_from_url(url: str) -> str:
             lid = _chapter_id_from_url(url)
             if lid is None:
                 raise RuntimeError(
@@ -92,11 +148,12 @@ class RoyalRoadProvider(Provider):
 
         refs = [
             ChapterRef(
-                id=chapter_uid_from_url(Url(u)),
-                url=Url(u),
-                title=None,
+                id=chapter_uid_from_url(e.url),
+                url=canonical_url(e.url).url,
+                title=e.title,
+                published_at=e.published_at,
             )
-            for u in chapter_urls
+            for e in toc
         ]
         return Fiction(
             uid=uid,
@@ -105,11 +162,66 @@ class RoyalRoadProvider(Provider):
             chapter_refs=refs,
         )
 
+    def poll_updates(
+        self, dm: DownlaodManager, fiction_uid: str, since: datetime | None
+    ) -> ChapterUpdates | None:
+        """
+        New chapters from the fiction's syndication feed. The feed only holds
+        the latest chapters, so the result is incomplete (a gap) unless the
+        feed reaches back to `since`.
+        """
+        since = ensure_aware(since)
+        if since is None:
+            return ChapterUpdates(refs=[], complete=False)
+
+        [_, _id] = fiction_uid.split(":", 1)
+        feed = dm.get_data(Url(SYNDICATION_URL.format(id=_id)), ignore_cache=True)
+
+        refs: list[ChapterRef] = []
+        reached_since = False
+        for item in _iter_feed_items(feed):
+            if item.published_at is not None and item.published_at <= since:
+                reached_since = True
+                break
+
+            lid = _chapter_id_from_url(item.url)
+            if lid is None:
+                # Not understood; let the caller rediscover the ToC
+                return ChapterUpdates(refs=[], complete=False)
+            refs.append(
+                ChapterRef(
+                    id=f"{self.provider_key()}:{lid}",
+                    url=canonical_url(item.url).url,
+                    title=item.title,
+                    published_at=item.published_at,
+                )
+            )
+
+        # An empty feed has no gap to report, only nothing new
+        complete = reached_since or not refs
+        return ChapterUpdates(refs=refs[::-1], complete=complete)
+
     def extract_chapter(
         self, soup: BeautifulSoup, *, options: Optional[ExtractOptions] = None
     ) -> ChapterPageContent | None:
         return self._extractor.extract_chapter(soup, options=options)
 
+    def extract_chapter_html(
+        self,
+        page: bytes,
+        *,
+        options: Optional[ExtractOptions] = None,
+        parser: ParserBackend | None = None,
+    ) -> ExtractedChapter | None:
+        root = (parser or get_parser_backend()).parse(
+            page, regions=self._extractor.REGIONS
+        )
+        found = self._extractor.extract_nodes(root, options=options)
+        if found is None:
+            return None
+        title, content = found
+        return ExtractedChapter(title=title, content_html=content.html())
+
     # def canonical_chapter_url(self, chapter_id_prefixed: str) -> str:
     #     return _canonical_rr_chapter_url(chapter_id_prefixed)
 
@@ -144,14 +256,26 @@ class RoyalRoadChapterPageExtractor(ChapterPageExtractor):
         # "main",
     ]
 
+    # Page regions the selectors above (and the hidden-class scan of the
+    # `<style>` blocks) need; the rest of the page is not built
+    REGIONS = regions(
+        "div.fic-header",
+        "div.chapter-inner",
+        "#chapter-inner",
+        "#chapter-content",
+        "article.chapter-content",
+        "div.chapter-content",
+        "style",
+    )
+
     # fiction_title_selector: str = "div.fic-header h1"
     # fiction_content_selector: str = "div.chapter-inner"
 
     def _first_match(
-        self, soup: BeautifulSoup | Tag, selectors: Iterable[str]
-    ) -> Tuple[Tag | None, str | None]:
+        self, root: Node, selectors: Iterable[str]
+    ) -> Tuple[Node | None, str | None]:
         for sel in selectors:
-            node = soup.select_one(sel)
+            node = root.select_one(sel)
             if node is not None:
                 return node, sel
         return None, None
@@ -163,14 +287,28 @@ class RoyalRoadChapterPageExtractor(ChapterPageExtractor):
         *,
         options: ExtractOptions | None = None,
     ) -> Optional[ChapterPageContent]:
+        bs4 = get_parser_backend("bs4")
+        assert isinstance(bs4, Bs4Backend)
+
+        found = self.extract_nodes(bs4.wrap(page_content_bs), options=options)
+        if found is None:
+            return None
+        title, content = found
+        assert isinstance(content, Bs4Node)
+        return ChapterPageContent(title=title, content=content.tag)
+
+    def extract_nodes(
+        self, root: Node, *, options: ExtractOptions | None = None
+    ) -> Optional[Tuple[str, Node]]:
+        """Locate (title, content node) in a page parsed by any backend."""
         opts = options or ExtractOptions()
 
         # title
-        title_node, _ = self._first_match(page_content_bs, self.TITLE_SELECTORS)
-        title = title_node.get_text(strip=True) if title_node else None
+        title_node, _ = self._first_match(root, self.TITLE_SELECTORS)
+        title = title_node.text() if title_node else None
 
         # content
-        content_node, _ = self._first_match(page_content_bs, self.CONTENT_SELECTORS)
+        content_node, _ = self._first_match(root, self.CONTENT_SELECTORS)
 
         if not content_node:
             if opts.strict:
@@ -187,7 +325,7 @@ class RoyalRoadChapterPageExtractor(ChapterPageExtractor):
             else:
                 inner = content_node.select_one("h1, h2")
                 if inner:
-                    title = inner.get_text(strip=True)
+                    title = inner.text()
                 elif opts.strict:
                     raise ChapterParseError(
                         "Could not locate chapter title",
@@ -197,41 +335,38 @@ class RoyalRoadChapterPageExtractor(ChapterPageExtractor):
                 else:
                     title = "Untitled Chapter"
 
-        # TODO: We also need to do this:
-        # hidden_class_names = self.identify_hiddden_class_names(soup)
-        # self.dispose_hidden_elements(hidden_class_names, inner_content)
-
-        return ChapterPageContent(title=title, content=content_node)
+        # Anti-piracy notices are hidden with CSS; keep them out of the book
+        hidden_class_names = self.identify_hiddden_class_names(root)
+        if hidden_class_names:
+            self.dispose_hidden_elements(hidden_class_names, content_node)
 
-    def identify_hiddden_class_names(self, bs: BeautifulSoup) -> list[str]:
-        hidden_class_names: list[str] = []
+        return title, content_node
 
-        # TODO: replace this assert
-        assert bs.head is not None
+    def identify_hiddden_class_names(self, root: Node) -> frozenset[str]:
+        """Class names hidden by a `.name { display: none }` rule in any <style>."""
+        hidden_class_names: set[str] = set()
 
-        for style_tag in bs.head.find_all("style"):
-            css_content = style_tag.get_text()
-            # Use regular expressions to find the class name with display: none;
-            pattern = r"\.(.*?)\s*{[^}]*display:\s*none;[^}]*}"
-            match: Optional[re.Match[str]] = re.search(pattern, css_content)
-            if match:
-                hidden_class_names.append(match.group(1))
+        for style in root.select("style"):
+            for selectors, body in CSS_RULE_RE.findall(style.text()):
+                if not CSS_DISPLAY_NONE_RE.search(body):
+                    continue
+                for sel in selectors.split(","):
+                    m = CSS_CLASS_SELECTOR_RE.match(sel)
+                    if m:
+                        hidden_class_names.add(m.group(1))
 
-        return hidden_class_names
+        return frozenset(hidden_class_names)
 
     def dispose_hidden_elements(
-        self, hidden_class_names: list[str], content_bs: Tag
-    ) -> None:
-
-        for class_name in hidden_class_names:
-            for element in content_bs.find_all(class_=class_name):
-                element.extract()
+        self, hidden_class_names: frozenset[str], content: Node
+    ) -> int:
+        return content.remove_with_classes(hidden_class_names)
 
 
 # ----------------- helpers -----------------
 
 
-def _chapter_id_from_url(url: Url) -> str | None:
+def _chapter_id_from_url(url: UrlLike) -> str | None:
     """
     Extract a RoyalRoad chapter id and return a *namespaced* id, e.g. "royalroad:1269041".
     """
@@ -244,6 +379,16 @@ def _chapter_id_from_url(url: Url) -> str | None:
 ## ---- Private ----
 
 
+class _TocEntry(NamedTuple):
+    url: str
+    title: str | None = None
+    published_at: datetime | None = None
+
+
+# The parts of a fiction page the metadata is read from
+FICTION_META_REGIONS = regions("meta", "div.fic-header")
+
+
 def _parse_fiction_page(
     base_url: str,
     html: str,
@@ -254,7 +399,151 @@ def _parse_fiction_page(
     Extract book metadata (title, author, cover, language) and all chapter URLs
     from a RoyalRoad fiction page.
     """
+    meta, toc = _parse_fiction_page_toc(
+        base_url, html, chapter_toc_strategies=chapter_toc_strategies, strict=strict
+    )
+    return meta, [e.url for e in toc]
+
+
+def _parse_fiction_page_toc(
+    base_url: str,
+    html: str,
+    chapter_toc_strategies: int = 0,
+    strict: bool = True,
+) -> tuple[BookConfig, list[_TocEntry]]:
+    """
+    Like _parse_fiction_page, with chapter titles and dates where known.
+
+    Fast path: the embedded `window.chapters` JSON gives the whole ToC, so
+    only the header is built as a tree. Otherwise the full page is parsed and
+    the ToC selector strategies are tried.
+    """
+    toc = _extract_embedded_chapters(base_url, html)
+    if toc is not None:
+        return (
+            _parse_fiction_meta(
+                base_url,
+                BeautifulSoup(
+                    html,
+                    "lxml",
+                    parse_only=RegionFilter(FICTION_META_REGIONS),  # type: ignore[arg-type]
+                ),
+            ),
+            toc,
+        )
+
     bs = BeautifulSoup(html, "lxml")
+    meta = _parse_fiction_meta(base_url, bs)
+
+    # Chapters:
+    chapter_links = _extract_toc_chapter_links(
+        base_url, bs, strict=strict, strategies=chapter_toc_strategies
+    )
+    return meta, [_TocEntry(url=u) for u in chapter_links]
+
+
+def _extract_embedded_chapters(base_url: str, html: str) -> list[_TocEntry] | None:
+    """
+    Read the ToC from the `window.chapters` JSON of a fiction page. Returns
+    None if it is missing or not understood (the caller falls back to the DOM).
+    """
+    m = EMBEDDED_CHAPTERS_RE.search(html)
+    if not m:
+        return None
+
+    try:
+        chapters, _ = json.JSONDecoder().raw_decode(html, m.end())
+    except ValueError:
+        return None
+    if not isinstance(chapters, list):
+        return None
+
+    # Entries the page may have changed or broken are left out
+    chapters = [
+        ch
+        for ch in chapters
+        if isinstance(ch, dict)
+        and (isinstance(ch.get("url"), str) or isinstance(ch.get("id"), (int, str)))
+    ]
+
+    def order(ch: dict[str, Any]) -> float:
+        value = ch.get("order")
+        return value if isinstance(value, (int, float)) else 0
+
+    fiction_id = FICTION_ID_RE.search(urlparse(base_url).path)
+    toc: list[_TocEntry] = []
+    for ch in sorted(chapters, key=order):
+        if not ch.get("visible", 1):
+            continue
+
+        href = ch.get("url")
+        if not (isinstance(href, str) and href):
+            href = None
+            if isinstance(ch.get("id"), (int, str)) and fiction_id:
+                href = f"/fiction/{fiction_id.group(1)}/chapter/{ch['id']}"
+        if not href:
+            return None
+
+        title = ch.get("title")
+        toc.append(
+            _TocEntry(
+                url=canonical_url(href, base_url).text,
+                title=title.strip() if isinstance(title, str) else None,
+                published_at=_parse_rr_date(ch.get("date")),
+            )
+        )
+
+    return toc or None
+
+
+def _iter_feed_items(feed: bytes) -> Iterable[_TocEntry]:
+    """
+    Stream the items of a syndication feed, in feed order (newest first).
+    Elements are discarded once read, and a consumer may stop early.
+    """
+    channel_title: str | None = None
+    depth = 0
+    for event, el in ET.iterparse(BytesIO(feed), events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+
+        if el.tag == "title" and depth == 2:  # rss > channel > title
+            channel_title = (el.text or "").strip()
+        elif el.tag == "item":
+            url = (el.findtext("link") or el.findtext("guid") or "").strip()
+            title = (el.findtext("title") or "").strip()
+            # Item titles read "<fiction title> - <chapter title>"
+            if channel_title and title.startswith(f"{channel_title} - "):
+                title = title[len(channel_title) + 3 :]
+            yield _TocEntry(
+                url=url,
+                title=title or None,
+                published_at=_parse_feed_date(el.findtext("pubDate")),
+            )
+            el.clear()
+
+
+def _parse_feed_date(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return ensure_aware(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rr_date(value: object) -> datetime | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _parse_fiction_meta(base_url: str, bs: BeautifulSoup) -> BookConfig:
 
     # Title
     h1 = bs.select_one("div.fic-header h1") or bs.select_one("h1")
@@ -285,18 +574,12 @@ def _parse_fiction_page(
         lang_meta.get("content") if lang_meta and lang_meta.get("content") else "en"
     ).lower()
 
-    # Chapters:
-    chapter_links = _extract_toc_chapter_links(
-        base_url, bs, strict=strict, strategies=chapter_toc_strategies
-    )
-
-    meta = BookConfig(
+    return BookConfig(
         title=title,
         language=language,
         author=author,
         cover_image=Url(cover),
     )
-    return meta, chapter_links
 
 
 def _extract_toc_chapter_links(
@@ -355,8 +638,8 @@ def _collect_rr_chapter_links(base_url: str, scope: BeautifulSoup | Tag) -> list
         href = str(a.get("href", "")).strip()
         if not href:
             continue
-        full = urljoin(base_url, href)
-        chap_id = _chapter_id_from_url(Url(full))
+        full = canonical_url(href, base_url).text
+        chap_id = _chapter_id_from_url(full)
         if chap_id and chap_id not in seen:
             seen[chap_id] = full
 
@@ -4,4 +4,19 @@ import dramatiq
 from dramatiq.brokers.redis import RedisBroker
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
-dramatiq.set_broker(RedisBroker(url=REDIS_URL))  # type: ignore[no-untyped-call]
+
+
+class WarmProviders(dramatiq.Middleware):
+    """Load all providers once when a worker boots, before it takes messages."""
+
+    def after_worker_boot(
+        self, broker: dramatiq.Broker, worker: dramatiq.Worker
+    ) -> None:
+        from .providers import warm_providers
+
+        warm_providers()
+
+
+broker = RedisBroker(url=REDIS_URL)  # type: ignore[no-untyped-call]
+broker.add_middleware(WarmProviders())
+dramatiq.set_broker(broker)
@@ -0,0 +1,256 @@
+"""
+Bounded parsing of untrusted pages.
+
+A `ParseSandbox` runs provider parsing in a pool of worker processes. The
+pool is recycled after `max_tasks_per_child` calls, and every call has a
+wall-time limit, which starts once a worker is free for it. Each worker's
+address space is capped (RLIMIT_AS), since Linux does not enforce an RSS
+limit. Pages are downloaded by the caller: only parsing runs in a worker,
+so network time does not count toward the limits.
+
+A call that breaks a limit raises `ParseFailure` instead of tying up the
+calling thread:
+- "timeout": the wall time ran out;
+- "memory": the worker hit its memory cap;
+- "crash": the worker died;
+- "error": an exception that could not be sent back as is.
+
+Enable it for the services with MYWBOOKS_PARSE_SANDBOX=1.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import multiprocessing
+import os
+import pickle
+import resource
+import signal
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.queues import SimpleQueue
+from types import FrameType
+from typing import Any, Callable, Literal, NamedTuple, Optional, TypeVar
+
+from pydantic_core import Url
+
+from mywbooks.download_manager import DownlaodManager
+from mywbooks.ebook_generator import ExtractOptions
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.base import ExtractedChapter, Fiction, Provider
+
+T = TypeVar("T")
+
+PARSE_SANDBOX = os.getenv("MYWBOOKS_PARSE_SANDBOX", "") not in ("", "0")
+
+# Extra wall time the parent waits for a worker to report its own timeout
+# before killing the pool
+_KILL_GRACE = 5.0
+
+FailureKind = Literal["timeout", "memory", "crash", "error"]
+
+
+class ParseLimits(NamedTuple):
+    timeout: float = 30.0  # wall seconds per call
+    max_memory_mb: int = 1024  # address space per worker, 0 = unlimited
+    max_tasks_per_child: int = 100  # recycle workers after this many calls
+    workers: int = 2
+
+
+class ParseFailure(RuntimeError):
+    def __init__(self, kind: FailureKind, reason: str, url: str | None = None):
+        self.kind = kind
+        self.reason = reason
+        self.url = url
+        msg = f"Parsing failed ({kind}): {reason}"
+        if url:
+            msg += f" | url={url}"
+        super().__init__(msg)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (self.__class__, (self.kind, self.reason, self.url))
+
+
+class _WallTimeout(BaseException):
+    """Raised in a worker by SIGALRM; a BaseException, so extractors don't catch it."""
+
+
+def _on_alarm(signum: int, frame: Optional[FrameType]) -> None:
+    raise _WallTimeout()
+
+
+def _init_worker(max_memory_mb: int, pids: SimpleQueue[int]) -> None:
+    pids.put(os.getpid())
+    if max_memory_mb:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory_mb << 20, hard))
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _run_limited(fn: Callable[..., T], args: tuple[Any, ...], timeout: float) -> T:
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    except _WallTimeout:
+        raise ParseFailure("timeout", f"exceeded {timeout:g}s") from None
+    except MemoryError:
+        raise ParseFailure("memory", "exceeded the worker memory limit") from None
+    except Exception as e:
+        # Must survive the trip back to the parent
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise ParseFailure("error", f"{type(e).__name__}: {e}") from None
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ParseSandbox:
+    def __init__(self, limits: ParseLimits = ParseLimits()) -> None:
+        self.limits = limits
+        self._pool: ProcessPoolExecutor | None = None
+        # Per pool: where its workers report their PID, and the PIDs so far
+        self._workers: dict[ProcessPoolExecutor, tuple[SimpleQueue[int], set[int]]] = {}
+        # Pools broken on purpose, to kill a stuck worker
+        self._killed: weakref.WeakSet[ProcessPoolExecutor] = weakref.WeakSet()
+        self._lock = threading.Lock()
+        # A call waits for a free worker before its timeout starts
+        self._slots = threading.BoundedSemaphore(limits.workers)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Workers start small instead of forking a large parent
+                ctx = multiprocessing.get_context("forkserver")
+                pids: SimpleQueue[int] = ctx.SimpleQueue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.limits.workers,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(self.limits.max_memory_mb, pids),
+                    max_tasks_per_child=self.limits.max_tasks_per_child,
+                )
+                self._workers[self._pool] = (pids, set())
+            # Drained on every call, so recycled workers cannot fill the pipe
+            self._worker_pids(self._pool)
+            return self._pool
+
+    def _worker_pids(self, pool: ProcessPoolExecutor) -> set[int]:
+        """The pool's workers that are still running. Call with the lock held."""
+        if pool not in self._workers:
+            return set()
+        reported, pids = self._workers[pool]
+        while not reported.empty():
+            pids.add(reported.get())
+        # Only our own children, in case an exited worker's PID was reused
+        pids &= {p.pid for p in multiprocessing.active_children()}
+        return pids
+
+    def _discard(self, pool: ProcessPoolExecutor, *, kill: bool) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            pids = self._worker_pids(pool)
+            self._workers.pop(pool, None)
+            if kill:
+                self._killed.add(pool)
+        if kill:
+            # The pool breaks: calls running in other workers are retried
+            for proc in multiprocessing.active_children():
+                if proc.pid in pids:
+                    proc.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def call(self, fn: Callable[..., T], *args: Any, url: str | None = None) -> T:
+        """Run `fn(*args)` (picklable, importable) in a worker, within the limits."""
+        with self._slots:
+            return self._call(fn, args, url)
+
+    def _call(self, fn: Callable[..., T], args: tuple[Any, ...], url: str | None) -> T:
+        while True:
+            pool = self._executor()
+            try:
+                future = pool.submit(_run_limited, fn, args, self.limits.timeout)
+                return future.result(timeout=self.limits.timeout + _KILL_GRACE)
+            except ParseFailure as e:
+                e.url = e.url or url
+                raise ParseFailure(e.kind, e.reason, e.url) from None
+            except FutureTimeoutError:
+                # Stuck outside Python code, where SIGALRM cannot interrupt it
+                logging.warning(f"Parse sandbox: killing workers stuck on {url}")
+                self._discard(pool, kill=True)
+                raise ParseFailure(
+                    "timeout", f"exceeded {self.limits.timeout:g}s", url
+                ) from None
+            except BrokenProcessPool:
+                killed = pool in self._killed
+                self._discard(pool, kill=False)
+                if killed:
+                    # Not this page's doing: another call's worker was stuck
+                    continue
+                raise ParseFailure(
+                    "crash", "worker process died (killed, or out of memory)", url
+                ) from None
+
+    def extract_chapter_html(
+        self,
+        provider: Provider,
+        page: bytes,
+        *,
+        options: Optional[ExtractOptions] = None,
+    ) -> ExtractedChapter | None:
+        return self.call(
+            _extract_chapter_html,
+            provider.provider_key(),
+            page,
+            options,
+            url=options.url if options else None,
+        )
+
+    def discover_fiction(
+        self, provider: Provider, dm: DownlaodManager, fiction_url: Url
+    ) -> Fiction:
+        page_url = provider.fiction_page_url(fiction_url)
+        if page_url is None:
+            # No page to parse (e.g. JSON listings): nothing to bound
+            return provider.discover_fiction(dm, fiction_url)
+        page = dm.get_and_cache_data(page_url)
+        return self.call(
+            _parse_fiction_page,
+            provider.provider_key(),
+            str(page_url),
+            page,
+            url=str(page_url),
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                self._workers.pop(pool, None)
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+## ---- Worker entry points (by provider key, providers hold no state) ----
+
+
+def _extract_chapter_html(
+    provider_key: str, page: bytes, options: Optional[ExtractOptions]
+) -> ExtractedChapter | None:
+    return get_provider_by_key(provider_key).extract_chapter_html(page, options=options)
+
+
+def _parse_fiction_page(provider_key: str, fiction_url: str, page: bytes) -> Fiction:
+    return get_provider_by_key(provider_key).parse_fiction_page(Url(fiction_url), page)
+
+
+@functools.cache
+def get_parse_sandbox() -> ParseSandbox | None:
+    """The shared sandbox if enabled (MYWBOOKS_PARSE_SANDBOX), else None."""
+    return ParseSandbox() if PARSE_SANDBOX else None
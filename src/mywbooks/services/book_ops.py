@@ -1,25 +1,112 @@
 from __future__ import annotations
 
+import dataclasses
+import hashlib
+import itertools
+import json
+import logging
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
 from pydantic_core import Url
-from sqlalchemy.orm import Session
+from sqlalchemy import ColumnElement, exists, func, or_, select, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, undefer
 
 from mywbooks import models
 from mywbooks.book import Chapter as ChapterDTO
+from mywbooks.book_stats import bump_book_stats
+from mywbooks.content_store import (
+    MissingContentError,
+    StoredContent,
+    chapter_values,
+    encode_content,
+    missing_content,
+    put_contents,
+    read_contents,
+    update_content_fingerprint,
+)
 from mywbooks.download_manager import DownlaodManager
 from mywbooks.ebook_generator import (
     EbookGenerator,
     EbookGeneratorConfig,
     ExtractOptions,
 )
+from mywbooks.parse_cache import ParseCache
 from mywbooks.providers import get_provider_by_key
 from mywbooks.providers.base import Fiction
-from mywbooks.utils import utcnow
+from mywbooks.sandbox import ParseFailure, ParseSandbox, get_parse_sandbox
+from mywbooks.utils import ensure_aware, naive_utc, utcnow
 
 from .ingest import _upsert_book_meta  # uses list_chapter_refs()
-from .ingest import _upsert_chapter_index_from_refs
+from .ingest import _discover_fiction, _upsert_chapter_index_from_refs
+
+# Extracted chapters are cached next to the raw pages, under this directory
+PARSE_CACHE_DIRNAME = "extracted"
+
+# Bump when exports of unchanged content would come out differently, so
+# earlier exports are no longer reused (see export_fingerprint). 2: book
+# fingerprints over exact content hashes
+EXPORT_FORMAT_VERSION = 2
+
+# Content backfill: parallel downloads, and how often results are committed
+BACKFILL_CONCURRENCY = 4
+BACKFILL_BATCH_SIZE = 50
+BACKFILL_BATCH_SECONDS = 10.0
+
+# Export: chapters loaded from the DB per chunk
+EXPORT_CHUNK_SIZE = 100
+
+
+class NothingToExportError(RuntimeError):
+    def __init__(self, book_id: int, selection: "ChapterSelection"):
+        self.book_id = book_id
+        self.selection = selection
+        super().__init__(
+            f"No chapters to export for book {book_id} ({selection.describe()})"
+        )
+
+
+@dataclass(frozen=True)
+class ChapterSelection:
+    """
+    Delta selection of chapters for an export. An empty selection means the
+    whole book. Both bounds are exclusive and combine with AND.
+    """
+
+    after_index: int | None = None  # only chapters with index > after_index
+    since: datetime | None = None  # only chapters discovered/fetched after this
+
+    def is_delta(self) -> bool:
+        return self.after_index is not None or self.since is not None
+
+    def describe(self) -> str:
+        parts: list[str] = []
+        if self.after_index is not None:
+            parts.append(f"after index {self.after_index}")
+        if self.since is not None:
+            parts.append(f"since {self.since.isoformat()}")
+        return ", ".join(parts) or "full book"
+
+    def clauses(self) -> list[ColumnElement[bool]]:
+        where: list[ColumnElement[bool]] = []
+        if self.after_index is not None:
+            where.append(models.Chapter.index > self.after_index)
+        if self.since is not None:
+            since = naive_utc(self.since)
+            where.append(
+                or_(
+                    models.Chapter.created_at > since,
+                    models.Chapter.fetched_at > since,
+                )
+            )
+        return where
 
 
 def provider_for(book: models.Book) -> str:
@@ -34,52 +121,329 @@ def upsert_fiction_toc(
     Returns number of chapter refs discovered (not inserted count).
     """
     prov = get_provider_by_key(book.provider)
-    fic: Fiction = prov.discover_fiction(dm, Url(book.source_url))
+    fic: Fiction = _discover_fiction(prov, dm, Url(book.source_url))
 
     _upsert_book_meta(db, prov, fic.meta, book=book, do_inserts=do_inserts)
     _upsert_chapter_index_from_refs(db, prov, fic.chapter_refs, book.id)
     return len(fic.chapter_refs)
 
 
+def refresh_fiction_toc(db: Session, book: models.Book, dm: DownlaodManager) -> int:
+    """
+    Look for new chapters, cheaply if the provider can poll for updates. The
+    full ToC is only rediscovered when polling is unsupported or shows a gap.
+    Returns the number of new chapters.
+    """
+    prov = get_provider_by_key(book.provider)
+
+    last_index, last_published = (
+        db.query(func.max(models.Chapter.index), func.max(models.Chapter.published_at))
+        .filter(models.Chapter.book_id == book.id)
+        .one()
+    )
+    updates = prov.poll_updates(dm, book.provider_fiction_uid, last_published)
+
+    if updates is None or not updates.complete:
+        before = _chapter_count(db, book)
+        upsert_fiction_toc(db, book, dm)
+        return _chapter_count(db, book) - before
+
+    known = {
+        cid
+        for (cid,) in db.query(models.Chapter.provider_chapter_id).filter(
+            models.Chapter.book_id == book.id,
+            models.Chapter.provider_chapter_id.in_([r.id for r in updates.refs]),
+        )
+    }
+    new_refs = [r for r in updates.refs if r.id not in known]
+    if new_refs:
+        start = last_index + 1 if last_index is not None else 0
+        _upsert_chapter_index_from_refs(db, prov, new_refs, book.id, start_index=start)
+    return len(new_refs)
+
+
+def _has_chapters(db: Session, book_id: int, *where: ColumnElement[bool]) -> bool:
+    """EXISTS check, instead of loading (or counting) the chapters."""
+    return bool(
+        db.scalar(select(exists().where(models.Chapter.book_id == book_id, *where)))
+    )
+
+
+def _chapter_count(db: Session, book: models.Book) -> int:
+    return int(
+        db.scalar(
+            select(func.count(models.Chapter.id)).where(
+                models.Chapter.book_id == book.id
+            )
+        )
+        or 0
+    )
+
+
+@dataclass
+class BackfillProgress:
+    """Counters of an `ensure_chapter_content` run."""
+
+    total: int = 0  # chapters missing content when the run started
+    fetched: int = 0  # stored with content
+    failed: int = 0  # recorded in Chapter.parse_error (sandbox limits)
+    empty: int = 0  # extractor found no content
+    commits: int = 0
+
+    @property
+    def done(self) -> int:
+        return self.fetched + self.failed + self.empty
+
+
+class _Extracted(NamedTuple):
+    chapter_id: int
+    title: str | None
+    content: StoredContent | None  # compressed, ready to store
+    failure: ParseFailure | None
+
+
 def ensure_chapter_content(
-    db: Session, book: models.Book, dm: DownlaodManager, *, limit: int | None = None
-) -> int:
+    db: Session,
+    book: models.Book,
+    dm: DownlaodManager,
+    *,
+    limit: int | None = None,
+    sandbox: ParseSandbox | None = None,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    batch_seconds: float = BACKFILL_BATCH_SECONDS,
+) -> BackfillProgress:
     """
-    Fill missing Chapter.content_html in DB for this book (provider-agnostic).
-    Returns number of chapters fetched.
+    Fill in missing chapter content for this book (provider-agnostic), in
+    the content store.
+
+    Chapters are downloaded, extracted and compressed by up to `concurrency`
+    threads; extraction moves on to `sandbox` (default: the shared one, if
+    enabled). Results are written in batches, committed every `batch_size`
+    chapters or `batch_seconds`, so an interrupted run resumes from what was
+    stored, along with the book's stats. Book.content_fingerprint is updated
+    at the end.
+    Extraction results are cached by page content (see ParseCache), so
+    re-filling from already downloaded pages skips the parser.
+
+    A page breaking the sandbox limits is recorded in Chapter.parse_error and
+    skipped; it is retried on the next call. Any other error stops the run
+    after committing the chapters done so far.
     """
 
     prov = get_provider_by_key(book.provider)
+    sandbox = sandbox or get_parse_sandbox()
+    parse_cache = ParseCache(dm.base_cache_dir / PARSE_CACHE_DIRNAME)
+
+    # Plain rows, not ORM objects: the session holds nothing per chapter
     q = (
-        db.query(models.Chapter)
-        .filter(
-            models.Chapter.book_id == book.id, models.Chapter.content_html.is_(None)
-        )
+        select(models.Chapter.id, models.Chapter.source_url, models.Chapter.title)
+        .where(models.Chapter.book_id == book.id, missing_content())
         .order_by(models.Chapter.index.asc())
     )
     if limit:
         q = q.limit(limit)
-    chapters = q.all()
-
-    count = 0
-    for ch in chapters:
-        soup = dm.get_and_cache_html(Url(ch.source_url))
-        page = prov.extract_chapter(
-            soup,
-            options=ExtractOptions(
-                url=ch.source_url, strict=True, fallback_title=ch.title
-            ),
+    todo = db.execute(q).all()
+    progress = BackfillProgress(total=len(todo))
+
+    def fetch_and_extract(chapter_id: int, url: str, title: str) -> _Extracted:
+        html = dm.get_and_cache_data(Url(url), fileext=".html")
+        try:
+            page = parse_cache.extract(
+                prov,
+                html,
+                options=ExtractOptions(url=url, strict=True, fallback_title=title),
+                sandbox=sandbox,
+            )
+        except ParseFailure as e:
+            return _Extracted(chapter_id, None, None, e)
+        if page is None or not page.content_html:
+            return _Extracted(chapter_id, None, None, None)
+        return _Extracted(
+            chapter_id, page.title, encode_content(page.content_html), None
+        )
+
+    batch: list[dict[str, Any]] = []
+    blobs: list[StoredContent] = []
+    last_commit = time.monotonic()
+
+    def commit_batch() -> None:
+        nonlocal last_commit
+        if batch:
+            # Counted against the rows' prior values: a chapter re-filled
+            # (e.g. its content was lost) may already be counted
+            fetched = {v["id"]: v for v in batch if v.get("is_fetched")}
+            prior = db.execute(
+                select(
+                    models.Chapter.id,
+                    models.Chapter.is_fetched,
+                    models.Chapter.content_size,
+                ).where(models.Chapter.id.in_(fetched))
+            ).all()
+            put_contents(db, blobs)
+            db.execute(update(models.Chapter), batch)
+            newly = sum(1 for r in prior if not r.is_fetched)
+            size = sum(
+                fetched[r.id]["content_size"] - (r.content_size or 0) for r in prior
+            )
+            if newly or size:
+                bump_book_stats(db, book.id, fetched=newly, size=size)
+            db.commit()
+            progress.commits += 1
+            batch.clear()
+            blobs.clear()
+            logging.info(
+                f"Book {book.id}: {progress.done}/{progress.total} chapters"
+                f" ({progress.fetched} fetched, {progress.failed} failed)"
+            )
+        last_commit = time.monotonic()
+
+    rows = iter(todo)
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        # A bounded window of jobs, so pages are not all held at once
+        pending = {
+            pool.submit(fetch_and_extract, *row)
+            for row in itertools.islice(rows, 2 * max(concurrency, 1))
+        }
+        try:
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                # Jobs that failed go last, so results finished with them are kept
+                for future in sorted(finished, key=lambda f: f.exception() is not None):
+                    res = future.result()
+                    if res.failure is not None:
+                        logging.warning(
+                            f"Skipping chapter {res.chapter_id}: {res.failure}"
+                        )
+                        error = f"{res.failure.kind}: {res.failure.reason}"
+                        batch.append({"id": res.chapter_id, "parse_error": error[:255]})
+                        progress.failed += 1
+                    elif res.content is None:
+                        progress.empty += 1
+                    else:
+                        values = {
+                            "id": res.chapter_id,
+                            **chapter_values(res.content),
+                            "fetched_at": utcnow(),
+                            "is_fetched": True,
+                            "parse_error": None,
+                        }
+                        if res.title:
+                            values["title"] = res.title
+                        blobs.append(res.content)
+                        batch.append(values)
+                        progress.fetched += 1
+
+                    row = next(rows, None)
+                    if row is not None:
+                        pending.add(pool.submit(fetch_and_extract, *row))
+
+                if (
+                    len(batch) >= batch_size
+                    or time.monotonic() - last_commit >= batch_seconds
+                ):
+                    commit_batch()
+        finally:
+            for future in pending:
+                future.cancel()
+            commit_batch()
+            update_content_fingerprint(db, book.id)
+            db.commit()
+            if progress.commits:
+                # Bulk updates bypass the identity map; don't serve stale chapters
+                db.expire_all()
+
+    return progress
+
+
+def export_fingerprint(book: models.Book, options: dict[str, Any]) -> str | None:
+    """
+    Identifies an export: the book's content fingerprint, the provider's
+    extractor version, the book's metadata and the export `options` (a task
+    payload). None while the book has no fingerprint.
+    """
+    if book.content_fingerprint is None:
+        return None
+    key = {
+        "format": EXPORT_FORMAT_VERSION,
+        "content": book.content_fingerprint,
+        "extractor": get_provider_by_key(book.provider).EXTRACTOR_VERSION,
+        "book": [book.title, book.author, book.language, book.cover_url],
+        "options": {k: v for k, v in options.items() if k not in _NOT_EXPORT_OPTIONS},
+    }
+    return hashlib.sha256(
+        json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+# Payload entries recorded by a download task, not options of its export
+_NOT_EXPORT_OPTIONS = {"output_path", "export-fingerprint"}
+
+
+def find_reusable_export(
+    db: Session, book_id: int, fingerprint: str | None, *, recent: int = 20
+) -> Path | None:
+    """Output of an earlier export with the same fingerprint, if still on disk."""
+    if fingerprint is None:
+        return None
+    tasks = db.scalars(
+        select(models.Task)
+        .where(
+            models.Task.book_id == book_id,
+            models.Task.type == models.TaskType.DOWNLOAD_BOOK,
+            models.Task.status == models.TaskStatus.SUCCEEDED,
         )
-        if not page or not page.content:
+        .order_by(models.Task.finished_at.desc())
+        .limit(recent)
+    )
+    for task in tasks:
+        payload = task.payload or {}
+        if payload.get("export-fingerprint") != fingerprint:
             continue
-        ch.title = page.title or ch.title
-        ch.content_html = str(page.content)
-        ch.fetched_at = utcnow()
-        ch.is_fetched = True
-        count += 1
+        path = Path(payload.get("output_path") or "")
+        if path.is_file():
+            return path
+    return None
 
-    db.commit()
-    return count
+
+def iter_export_chapters(
+    db: Session,
+    book_id: int,
+    selection: ChapterSelection,
+    *,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[ChapterDTO]:
+    """
+    The selected fetched chapters, in order, loaded `chunk_size` rows at a
+    time (server-side cursor where the driver has one), with one content
+    query per chunk. Rows are expunged once converted, so neither the
+    session nor the caller holds more than a chunk (chapters the session
+    held before stay in it).
+    """
+    held = {key for key in db.identity_map.keys() if key[0] is models.Chapter}
+    stmt = (
+        select(models.Chapter)
+        .where(
+            models.Chapter.book_id == book_id,
+            models.Chapter.is_fetched.is_(True),
+            *selection.clauses(),
+        )
+        # Legacy (not migrated) content comes with the rows
+        .options(undefer(models.Chapter.content_html))
+        .order_by(models.Chapter.index.asc())
+        .execution_options(yield_per=chunk_size)
+    )
+    for chunk in db.scalars(stmt).partitions():
+        contents = read_contents(db, (c.content_hash for c in chunk if c.content_hash))
+        for chm in chunk:
+            html = None
+            if chm.content_hash:
+                html = contents.get(chm.content_hash)
+                if html is None:
+                    raise MissingContentError(chm.id, chm.content_hash)
+            yield ChapterDTO.from_model(chm, html=html)
+            if sa_inspect(chm).identity_key not in held:
+                db.expunge(chm)
 
 
 ## This should specify a collection of chapters
@@ -91,6 +455,8 @@ def export_book_to_epub_from_db(
     # exp_options: ExportOptions,
     *,
     dm: DownlaodManager,
+    selection: ChapterSelection | None = None,
+    ensure_content: bool = True,
     **kw: dict[str, Any],
     # css_path: Path,
     # out_path: Path,
@@ -100,47 +466,68 @@ def export_book_to_epub_from_db(
 ) -> Path:
     """
     Build an EPUB purely from DB rows (Book + fetched Chapters).
-    If some chapters aren’t fetched yet, call ensure_chapter_content() first.
+    Chapters not fetched yet are fetched first, unless `ensure_content` is
+    False (the caller already ran ensure_chapter_content()).
+
+    With a delta `selection`, only the selected chapters are packaged, and the
+    book gets its own identifier and title so readers keep it apart from the
+    full book. Raises NothingToExportError if the selection is empty.
     """
+    selection = selection or ChapterSelection()
 
     # Ensure at least one ToC row exists (no-op if already present)
     # NOTE: This should not be necessary, since this info is retrieved on book insertion
-    if not book.chapters:
+    if not _has_chapters(db, book.id):
         upsert_fiction_toc(db, book, dm)
 
     # If anything is missing HTML, fetch it now.
-    missing = (
-        db.query(models.Chapter)
-        .filter(
+    if ensure_content and _has_chapters(db, book.id, missing_content()):
+        ensure_chapter_content(db, book, dm)
+
+    # What gets exported, without loading it (the chapters are streamed)
+    count, first_index, last_index, newest = db.execute(
+        select(
+            func.count(),
+            func.min(models.Chapter.index),
+            func.max(models.Chapter.index),
+            func.max(models.Chapter.fetched_at),
+        ).where(
             models.Chapter.book_id == book.id,
-            models.Chapter.content_html.is_(None),
+            models.Chapter.is_fetched.is_(True),
+            *selection.clauses(),
         )
-        .count()
-    )
-    if missing:
-        ensure_chapter_content(db, book, dm)
+    ).one()
 
-    # Prepare generator config from DB-only metadata
-    gen = EbookGenerator(
-        book_id=f"book-{book.id}",
-        download_manager=dm,
-        config=cfg,
-    )
+    book_id = f"book-{book.id}"
+    if selection.is_delta():
+        if not count:
+            raise NothingToExportError(book.id, selection)
 
-    # Stream chapters from DB, in order
-    rows = (
-        db.query(models.Chapter)
-        .filter(
-            models.Chapter.book_id == book.id, models.Chapter.is_fetched == True
-        )  # noqa: E712
-        .order_by(models.Chapter.index.asc())
-        .all()
-    )
-    for chm in rows:
-        dto = ChapterDTO.from_model(
-            chm
-        )  # builds a Chapter DTO with images map, etc. :contentReference[oaicite:1]{index=1}
-        gen.add_chapter(dto)
+        first, last = first_index + 1, last_index + 1
+        book_id += f"-ch{first}-{last}"
+        cfg = cfg._replace(
+            book_config=dataclasses.replace(
+                cfg.book_config,
+                title=f"{cfg.book_config.title} (Ch. {first}-{last})",
+            )
+        )
+
+    # The package is as new as its newest chapter, which keeps the build
+    # reproducible for unchanged content
+    if cfg.modified is None and newest is not None:
+        cfg = cfg._replace(modified=ensure_aware(newest))
+
+    # Chapter content is spooled to disk as it streams in, and read back
+    # while the EPUB is written
+    with tempfile.TemporaryDirectory(prefix="mywbooks-export-") as spool:
+        gen = EbookGenerator(
+            book_id=book_id,
+            download_manager=dm,
+            config=cfg,
+            spool_dir=Path(spool),
+        )
+        for dto in iter_export_chapters(db, book.id, selection):
+            gen.add_chapter(dto)
 
-    gen.export_as_epub(out_path)
+        gen.export_as_epub(out_path)
     return out_path
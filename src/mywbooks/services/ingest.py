@@ -1,26 +1,38 @@
 from __future__ import annotations
 
+from typing import Any
+
 from pydantic_core import Url
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from mywbooks.providers.base import Fiction
 
 from .. import models
 from ..book import BookConfig, ChapterRef
+from ..book_stats import bump_book_stats, refresh_book_stats
+from ..db import insert_ignoring_duplicates
 from ..download_manager import DownlaodManager
-from ..models import Book, Chapter
+from ..models import Book, BookStats, Chapter
 from ..providers import Provider, ProviderKey, get_provider_by_key
+from ..sandbox import get_parse_sandbox
+from ..utils import ensure_aware, naive_utc
 
 
 def upsert_royalroad_book_from_url(
     db: Session, fiction_url: Url | str, dm: DownlaodManager
 ) -> int:
-    prov: Provider = get_provider_by_key(ProviderKey.ROYALROAD)
+    return upsert_book_from_url(db, ProviderKey.ROYALROAD, fiction_url, dm)
+
+
+def upsert_book_from_url(
+    db: Session, provider_key: ProviderKey, fiction_url: Url | str, dm: DownlaodManager
+) -> int:
+    prov: Provider = get_provider_by_key(provider_key)
 
     # TODO: Combine with upsert_fiction_toc
 
-    fic: Fiction = prov.discover_fiction(dm, Url(str(fiction_url)))
+    fic: Fiction = _discover_fiction(prov, dm, Url(str(fiction_url)))
 
     book_id = _upsert_book_meta(
         db,
@@ -35,6 +47,14 @@ def upsert_royalroad_book_from_url(
     return book_id
 
 
+def _discover_fiction(prov: Provider, dm: DownlaodManager, fiction_url: Url) -> Fiction:
+    """`prov.discover_fiction`, in the parse sandbox when enabled."""
+    sandbox = get_parse_sandbox()
+    if sandbox is not None:
+        return sandbox.discover_fiction(prov, dm, fiction_url)
+    return prov.discover_fiction(dm, fiction_url)
+
+
 def _upsert_book_meta(
     db: Session,
     prov: Provider,
@@ -63,13 +83,14 @@ def _upsert_book_meta(
             raise RuntimeError("source_url was not provided for new insert")
 
         book = Book(
-            provider=ProviderKey.ROYALROAD,
+            provider=ProviderKey(prov.provider_key()),
             provider_fiction_uid=fiction_uid,
             source_url=source_url,
             title=meta.title,
             author=meta.author,
             language=meta.language,
             cover_url=str(meta.cover_image),
+            stats=BookStats(),
         )
         db.add(book)
         db.commit()
@@ -85,33 +106,98 @@ def _upsert_book_meta(
 
 
 def _upsert_chapter_index_from_refs(
-    db: Session, prov: Provider, refs: list[ChapterRef], book_id: int
+    db: Session,
+    prov: Provider,
+    refs: list[ChapterRef],
+    book_id: int,
+    *,
+    start_index: int = 0,
 ) -> None:
-    """Insert/update Chapter rows with provider_chapter_id + URL only."""
-
-    for idx, ref in enumerate(refs):
-        existing = db.execute(
-            select(Chapter).where(
-                Chapter.book_id == book_id,
-                Chapter.provider_chapter_id == ref.id,
+    """
+    Insert/update Chapter rows with provider_chapter_id + URL only. `refs`
+    are numbered from `start_index` (e.g. to append new chapters).
+
+    One SELECT loads the book's existing chapters; new ones are inserted and
+    changed ones updated in bulk (executemany), whatever the ToC size. The
+    book's stats are updated along (see book_stats).
+    """
+
+    existing = {
+        row.provider_chapter_id: row
+        for row in db.execute(
+            select(
+                Chapter.id,
+                Chapter.provider_chapter_id,
+                Chapter.index.label("position"),  # `index` is a tuple method
+                Chapter.title,
+                Chapter.source_url,
+                Chapter.published_at,
+            ).where(Chapter.book_id == book_id)
+        )
+    }
+
+    # A ref listed twice keeps its last position
+    numbered = {ref.id: (idx, ref) for idx, ref in enumerate(refs, start=start_index)}
+
+    inserts: list[dict[str, Any]] = []
+    updates: list[dict[str, Any]] = []
+    for idx, ref in numbered.values():
+        row = existing.get(ref.id)
+        if row is None:
+            inserts.append(
+                {
+                    "book_id": book_id,
+                    "index": idx,
+                    "title": ref.title or f"Chapter {idx+1}",
+                    "content_html": None,
+                    "provider_chapter_id": ref.id,
+                    "source_url": str(ref.url),
+                    "published_at": ref.published_at,
+                    "is_fetched": False,
+                }
             )
-        ).scalar_one_or_none()
-
-        if not existing:
-            db.add(
-                Chapter(
-                    book_id=book_id,
-                    index=idx,
-                    title=ref.title or f"Chapter {idx+1}",
-                    content_html=None,
-                    provider_chapter_id=ref.id,
-                    source_url=str(ref.url),
-                    is_fetched=False,
-                )
+            continue
+
+        published_at = ref.published_at or row.published_at
+        if (
+            row.position != idx
+            or row.title != (ref.title or row.title)
+            or row.source_url != str(ref.url)
+            or ensure_aware(row.published_at) != ensure_aware(published_at)
+        ):
+            updates.append(
+                {
+                    "id": row.id,
+                    "index": idx,
+                    "title": ref.title or row.title,
+                    "source_url": str(ref.url),
+                    "published_at": published_at,
+                }
             )
-        else:
-            existing.index = idx
-            if ref.title:
-                existing.title = ref.title
-            existing.source_url = str(ref.url)
+
+    inserted = len(inserts)
+    if inserts:
+        # Fewer rows come back if a concurrent ingest inserted some
+        stmt = insert_ignoring_duplicates(db, Chapter).returning(Chapter.id)
+        inserted = len(db.scalars(stmt, inserts).all())
+    if updates:
+        db.execute(update(Chapter), updates)
+    if updates or inserted != len(inserts):
+        # Renumbering may move the latest chapter; skipped rows were counted
+        # by whoever inserted them
+        refresh_book_stats(db, book_id)
+    elif inserts:
+        bump_book_stats(
+            db,
+            book_id,
+            chapters=len(inserts),
+            latest_index=max(r["index"] for r in inserts),
+            latest_published_at=max(
+                (naive_utc(d) for r in inserts if (d := r["published_at"])),
+                default=None,
+            ),
+        )
     db.commit()
+    if updates:
+        # Bulk updates bypass the identity map; don't serve stale chapters
+        db.expire_all()
@@ -1,20 +1,32 @@
 # Example factory that returns the right WebBook subclass from a DB Book row
+import shutil
+from datetime import datetime
 from pathlib import Path
 from typing import Any
 
 import dramatiq
 from pydantic_core import Url
+from sqlalchemy import update
 
 from mywbooks import models
 from mywbooks.book import DEFAULT_COVER_URL, EPUB_DIR, BookConfig
 from mywbooks.ebook_generator import EbookGeneratorConfig
+from mywbooks.epub_writer import get_compression_preset
 from mywbooks.task_cleanup import register_cleanup
 
 from . import queue  # This import is IMPORTANT
 from .db import SessionLocal
 from .download_manager import DownlaodManager
-from .models import Book, Task, TaskStatus, TaskType
-from .services.book_ops import export_book_to_epub_from_db, upsert_fiction_toc
+from .models import Book, BookUser, Task, TaskStatus, TaskType
+from .services.book_ops import (
+    ChapterSelection,
+    NothingToExportError,
+    ensure_chapter_content,
+    export_book_to_epub_from_db,
+    export_fingerprint,
+    find_reusable_export,
+    refresh_fiction_toc,
+)
 from .utils import utcnow
 
 
@@ -43,9 +55,10 @@ def download_book_task(task_id: int) -> None:
         out_path = out_dir / f"book-{book.id}-task-{task.id}.epub"
 
         # NOTE: Should probably not be doing this her here
-        upsert_fiction_toc(
-            db, book, dm
-        )  ## Look for new chapters and changes to metadata
+        refresh_fiction_toc(db, book, dm)  ## Look for new chapters
+        # Before the delivery time is taken below, so that the next delta
+        # does not send the chapters fetched now again
+        ensure_chapter_content(db, book, dm)
 
         cover_url: Url = Url(book.cover_url) if book.cover_url else DEFAULT_COVER_URL
         bcfg = BookConfig(
@@ -63,13 +76,55 @@ def download_book_task(task_id: int) -> None:
         ]
         cfg = EbookGeneratorConfig(
             book_config=bcfg,
+            compression=get_compression_preset(payload.get("epub-compression", "fast")),
             **{k: payload[k.replace("-", "_")] for k in keys if k in payload},
         )
-        export_book_to_epub_from_db(db, book, dm=dm, cfg=cfg, out_path=out_path)
+        since_date = payload.get("since-date")
+        selection = ChapterSelection(
+            after_index=payload.get("since-index"),
+            since=datetime.fromisoformat(since_date) if since_date else None,
+        )
+
+        export_started_at = utcnow()
+        fingerprint = export_fingerprint(book, payload)
+        previous = find_reusable_export(db, book.id, fingerprint)
+        if previous is not None:
+            # Nothing changed since that export; deliver a copy of it
+            shutil.copyfile(previous, out_path)
+        else:
+            try:
+                export_book_to_epub_from_db(
+                    db,
+                    book,
+                    dm=dm,
+                    cfg=cfg,
+                    out_path=out_path,
+                    selection=selection,
+                    ensure_content=False,
+                )
+            except NothingToExportError:
+                # Nothing new since the last delivery: done, without an EPUB
+                task.status = TaskStatus.SUCCEEDED
+                task.payload = {**payload, "nothing-to-export": True}
+                task.finished_at = utcnow()
+                db.commit()
+                return
+
+        # Record the delivery, so the next delta export starts from here
+        if task.user_id is not None:
+            db.execute(
+                update(BookUser)
+                .where(BookUser.user_id == task.user_id, BookUser.book_id == book.id)
+                .values(last_sent_at=export_started_at)
+            )
 
         # Mark success (you could store a file path in payload)
         task.status = TaskStatus.SUCCEEDED
-        task.payload = {"output_path": str(out_path)}
+        task.payload = {
+            **payload,
+            "output_path": str(out_path),
+            "export-fingerprint": fingerprint,
+        }
         task.finished_at = utcnow()
         db.commit()
 
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
+
+from pydantic_core import Url
+
+# Interned URLs; a ToC refresh of a large fiction touches a few thousand
+_CACHE_SIZE = 1 << 16
+
+_SCHEME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+@dataclass(frozen=True, slots=True)
+class CanonicalUrl:
+    """
+    An absolute, canonical URL with its parsed form and hash computed once.
+    Obtain instances with `canonical_url`, which interns them.
+    """
+
+    text: str  # canonical string form (str(self.url))
+    url: Url
+    hash: str  # md5 hex digest of `text`, used for cache file names and ids
+
+    def __str__(self) -> str:
+        return self.text
+
+
+UrlLike = str | Url | CanonicalUrl
+
+
+def canonical_url(url: UrlLike, base: Optional[str] = None) -> CanonicalUrl:
+    """
+    Canonicalize `url`: resolve it against `base` (e.g. the chapter
+    source_url) if relative, lower-case scheme and host, and strip the
+    fragment. Results are interned, so repeated calls are cheap.
+    """
+    if isinstance(url, CanonicalUrl):
+        return url
+    return _canonical_url(str(url), base)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _canonical_url(raw: str, base: Optional[str]) -> CanonicalUrl:
+    raw = raw.strip().partition("#")[0]
+    if base is not None and not _SCHEME_RE.match(raw):
+        if raw.startswith("/") and not raw.startswith("//"):
+            # Root-relative, by far the most common form in ToCs
+            raw = _origin(base) + raw
+        else:
+            raw = urljoin(base, raw)
+
+    # Url() does the rest (WHATWG): lower-cases scheme and host, resolves dot
+    # segments and drops default ports
+    parsed = Url(raw)
+    text = str(parsed)
+    return CanonicalUrl(text=text, url=parsed, hash=md5_hex(text))
+
+
+@lru_cache(maxsize=1024)
+def _origin(base: str) -> str:
+    parts = urlsplit(base)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def md5_hex(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
@@ -1,8 +1,8 @@
-import hashlib
 from datetime import date, datetime, timezone
 
 import httpx
-from pydantic_core import Url
+
+from .urls import UrlLike, canonical_url
 
 
 def utcnow() -> datetime:
@@ -17,8 +17,18 @@ def ensure_aware(dt: datetime | None) -> datetime | None:
     return dt
 
 
-def url_hash(url: Url) -> str:
-    return hashlib.md5(str(url).encode("utf-8")).hexdigest()
+def naive_utc(dt: datetime) -> datetime:
+    """
+    `dt` as naive UTC, for comparing with the (naive UTC) DateTime columns.
+    PostgreSQL would shift an aware value by the session's time zone.
+    """
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def url_hash(url: UrlLike) -> str:
+    return canonical_url(url).hash
 
 
 def _get_text(url: str, *, timeout: float = 30.0) -> str:
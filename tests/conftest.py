@@ -1,23 +1,28 @@
 # tests/conftest.py
 from __future__ import annotations
 
-from collections.abc import Iterator
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session, sessionmaker
 
 from mywbooks.api.app import app
+from mywbooks.db import make_async_engine, make_engine
 from mywbooks.models import Base
 
-# One shared in-memory SQLite for all sessions/connections
-engine = create_engine(
-    "sqlite+pysqlite:///:memory:",
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
+# One shared SQLite for all sessions/connections. A file, so the async
+# engine (for the async routes) sees the same database
+_db_dir = tempfile.TemporaryDirectory(prefix="mywbooks-tests-")
+TEST_DATABASE_URL = f"sqlite:///{Path(_db_dir.name) / 'test.db'}"
+engine = make_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+TestingAsyncSessionLocal = async_sessionmaker(
+    make_async_engine(TEST_DATABASE_URL), expire_on_commit=False
+)
 
 # Create all tables once for the test DB
 Base.metadata.create_all(bind=engine)
@@ -31,6 +36,11 @@ def _test_get_db():
         db.close()
 
 
+async def _test_get_async_db() -> AsyncIterator[AsyncSession]:
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 def _fake_current_user():
     return {
         "sub": "test-user-sub-123",
@@ -47,6 +57,7 @@ def client():
     from mywbooks import db
 
     app.dependency_overrides[db.get_db] = _test_get_db
+    app.dependency_overrides[db.get_async_db] = _test_get_async_db
 
     # 2) override CurrentUser dependency:
     from mywbooks.api.auth import verify_jwt
@@ -2,16 +2,19 @@
 from __future__ import annotations
 
 import json
+from datetime import datetime
 
 from fastapi import Response
 from pydantic import Json
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 
 from mywbooks import models
 from mywbooks.api.routers.books import ResponseMsg
 from mywbooks.library import add_book_to_user
 
+from .conftest import TestingAsyncSessionLocal
+
 
 def test_add_royalroad_book_by_url(client, db_session: Session, monkeypatch):
     # Pre-create a Book row in the SAME test DB
@@ -107,6 +110,66 @@ def test_list_my_books(client, db_session: Session):
     assert "Another Book" in titles
 
 
+def test_list_my_books_with_stats_in_one_query(client, db_session: Session):
+    user = db_session.execute(
+        select(models.User).where(models.User.auth_subject == "test-user-sub-123")
+    ).scalar_one()
+    books = [
+        models.Book(
+            provider=models.ProviderKey.ROYALROAD,
+            provider_fiction_uid=f"royalroad:lib{i}",
+            source_url=f"https://rr/fiction/lib{i}",
+            title=f"Library {i:03}",
+            language="en",
+            stats=models.BookStats(
+                chapter_count=i + 1,
+                fetched_count=i,
+                total_bytes=1000 * i,
+                latest_chapter_index=i,
+                latest_published_at=datetime(2025, 1, 1),
+            ),
+        )
+        for i in range(200)
+    ]
+    db_session.add_all(books)
+    db_session.commit()
+    for b in books:
+        db_session.add(models.BookUser(user_id=user.id, book_id=b.id))
+    db_session.commit()
+
+    statements: list[str] = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # The route runs on the async engine
+    bind = TestingAsyncSessionLocal.kw["bind"].sync_engine
+    event.listen(bind, "before_cursor_execute", on_execute)
+    try:
+        resp = client.get("/api/books")
+    finally:
+        event.remove(bind, "before_cursor_execute", on_execute)
+    assert resp.status_code == 200
+
+    # The user lookup, then books with their stats
+    assert len([s for s in statements if "FROM books" in s]) == 1
+    assert not [s for s in statements if "FROM chapters" in s]
+
+    rows = {row["title"]: row for row in resp.json()}
+    assert rows["Library 199"]["stats"] == {
+        "chapter_count": 200,
+        "fetched_count": 199,
+        "total_bytes": 199_000,
+        "latest_chapter_index": 199,
+        "latest_published_at": "2025-01-01T00:00:00Z",
+        "content_fingerprint": None,
+    }
+
+    for b in books:
+        db_session.delete(b)
+    db_session.commit()
+
+
 def test_unsubscribe_book(client, db_session: Session):
     # Pick any book and ensure relation exists
     book = db_session.execute(select(models.Book)).scalars().first()
@@ -166,3 +229,124 @@ def test_download_requires_subscription(client, db_session: Session):
     db_session.refresh(b)
     resp = client.post(f"/api/books/{b.id}/download")
     assert resp.status_code == 403
+
+
+def test_download_delta_records_since_in_payload(
+    client, db_session: Session, monkeypatch
+):
+    from mywbooks.api.routers import books
+
+    sent: list[int] = []
+    monkeypatch.setattr(books.download_book_task, "send", sent.append)
+
+    user = db_session.execute(
+        select(models.User).where(models.User.auth_subject == "test-user-sub-123")
+    ).scalar_one()
+    b = models.Book(
+        provider=models.ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:delta",
+        source_url="https://rr/fiction/delta",
+        title="Delta",
+        author="D",
+        language="en",
+        cover_url=None,
+    )
+    db_session.add(b)
+    db_session.commit()
+    add_book_to_user(db_session, user.id, b.id)
+
+    # Never delivered: a delta without bounds is the full book
+    resp = client.post(f"/api/books/{b.id}/download", json={"mode": "delta"})
+    assert resp.status_code == 200, resp.text
+    task = db_session.get(models.Task, resp.json()["task_id"])
+    assert task is not None and task.payload == {
+        "epub-compression": "fast",
+        "export-mode": "delta",
+    }
+
+    # Delivered before: the delta starts at last_sent_at
+    rel = db_session.execute(
+        select(models.BookUser).where(
+            models.BookUser.user_id == user.id, models.BookUser.book_id == b.id
+        )
+    ).scalar_one()
+    rel.last_sent_at = datetime(2025, 1, 2, 3, 4, 5)
+    db_session.commit()
+
+    resp = client.post(f"/api/books/{b.id}/download", json={"mode": "delta"})
+    task = db_session.get(models.Task, resp.json()["task_id"])
+    assert task is not None and task.payload is not None
+    assert task.payload["since-date"] == "2025-01-02T03:04:05+00:00"
+
+    resp = client.post(
+        f"/api/books/{b.id}/download",
+        json={"mode": "delta", "since_index": 7, "compression": "small"},
+    )
+    task = db_session.get(models.Task, resp.json()["task_id"])
+    assert task is not None and task.payload == {
+        "epub-compression": "small",
+        "export-mode": "delta",
+        "since-index": 7,
+    }
+    assert len(sent) == 3
+
+    # Bounds without delta mode are rejected
+    resp = client.post(f"/api/books/{b.id}/download", json={"since_index": 7})
+    assert resp.status_code == 422
+
+
+def test_delta_with_nothing_new_succeeds_without_epub(
+    client, db_session: Session, monkeypatch
+):
+    from mywbooks import tasks
+
+    from .conftest import TestingSessionLocal
+
+    monkeypatch.setattr(tasks, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(tasks, "refresh_fiction_toc", lambda db, book, dm: 0)
+    monkeypatch.setattr(tasks, "ensure_chapter_content", lambda db, book, dm: None)
+
+    user = db_session.execute(
+        select(models.User).where(models.User.auth_subject == "test-user-sub-123")
+    ).scalar_one()
+    b = models.Book(
+        provider=models.ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:nothing-new",
+        source_url="https://rr/fiction/nothing-new",
+        title="Nothing new",
+        language="en",
+        chapters=[
+            models.Chapter(
+                index=0,
+                title="One",
+                provider_chapter_id="royalroad:nothing-new:0",
+                source_url="https://rr/chapter/nothing-new/0",
+                is_fetched=True,
+            )
+        ],
+    )
+    db_session.add(b)
+    db_session.commit()
+    add_book_to_user(db_session, user.id, b.id)
+    task = models.Task(
+        type=models.TaskType.DOWNLOAD_BOOK,
+        status=models.TaskStatus.QUEUED,
+        user_id=user.id,
+        book_id=b.id,
+        payload={"export-mode": "delta", "since-index": 0},
+    )
+    db_session.add(task)
+    db_session.commit()
+
+    # Not a failure (which Dramatiq would retry)
+    tasks.download_book_task.fn(task.id)
+    db_session.refresh(task)
+    assert task.status == models.TaskStatus.SUCCEEDED
+    assert task.payload is not None and task.payload["nothing-to-export"] is True
+
+    resp = client.get(f"/api/books/tasks/{task.id}/download")
+    assert resp.status_code == 204
+
+    db_session.delete(task)
+    db_session.delete(b)
+    db_session.commit()
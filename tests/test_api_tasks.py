@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.utils import utcnow
+
+
+def test_list_and_get_my_tasks(client, db_session: Session):
+    # The user the API authenticates as (see conftest)
+    client.get("/api/books")
+    user = db_session.execute(
+        select(models.User).where(models.User.auth_subject == "test-user-sub-123")
+    ).scalar_one()
+    other = models.User(email="other-tasks@example.com")
+    book = models.Book(
+        provider=models.ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:tasks",
+        source_url="https://rr/fiction/tasks",
+        title="Tasks",
+        language="en",
+    )
+    db_session.add_all([other, book])
+    db_session.commit()
+
+    now = utcnow()
+    mine = [
+        models.Task(
+            type=models.TaskType.DOWNLOAD_BOOK,
+            status=status,
+            user_id=user.id,
+            book_id=book.id,
+            created_at=now + timedelta(minutes=i),
+        )
+        for i, status in enumerate(
+            [models.TaskStatus.SUCCEEDED, models.TaskStatus.FAILED]
+        )
+    ]
+    theirs = models.Task(
+        type=models.TaskType.DOWNLOAD_BOOK,
+        status=models.TaskStatus.QUEUED,
+        user_id=other.id,
+        book_id=book.id,
+    )
+    db_session.add_all([*mine, theirs])
+    db_session.commit()
+
+    resp = client.get("/api/tasks", params={"limit": 200})
+    assert resp.status_code == 200, resp.text
+    ids = [t["id"] for t in resp.json() if t["book_id"] == book.id]
+    assert ids == [mine[1].id, mine[0].id]  # newest first, own tasks only
+
+    resp = client.get("/api/tasks", params={"status": "failed", "limit": 200})
+    assert mine[1].id in {t["id"] for t in resp.json()}
+    assert mine[0].id not in {t["id"] for t in resp.json()}
+
+    resp = client.get(f"/api/tasks/{mine[0].id}")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "succeeded"
+    assert client.get(f"/api/tasks/{theirs.id}").status_code == 404
+
+    for obj in [*mine, theirs, book, other]:
+        db_session.delete(obj)
+    db_session.commit()
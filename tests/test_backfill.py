@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.book_stats import refresh_book_stats
+from mywbooks.content_store import read_chapter_html
+from mywbooks.models import ProviderKey
+from mywbooks.services.book_ops import ensure_chapter_content
+
+from .fakes import FakeDownloadManager
+
+BASE = "https://www.royalroad.com/fiction/12/chapter"
+
+
+def page(i: int) -> bytes:
+    return f"""<html><body>
+      <div class="fic-header"><h1>Chapter {i}</h1></div>
+      <div class="chapter-inner"><p>Text {i}.</p></div>
+    </body></html>""".encode()
+
+
+def test_backfill_commits_in_batches_and_resumes(db_session: Session, tmp_path: Path):
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:backfill",
+        source_url="https://www.royalroad.com/fiction/12",
+        title="Backfill",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    for i in range(7):
+        db_session.add(
+            models.Chapter(
+                book_id=book.id,
+                index=i,
+                title=f"Chapter {i}",
+                provider_chapter_id=f"royalroad:b{i}",
+                source_url=f"{BASE}/{i}",
+                is_fetched=False,
+            )
+        )
+    db_session.commit()
+
+    # Chapter 5 cannot be downloaded (the fake raises AssertionError)
+    pages = {f"{BASE}/{i}": page(i) for i in range(7) if i != 5}
+    fdm = FakeDownloadManager(tmp_path, pages)
+    with pytest.raises(AssertionError):
+        ensure_chapter_content(db_session, book, fdm, concurrency=1, batch_size=2)
+
+    def stored() -> list[int]:
+        return [c.index for c in book.chapters if c.content_hash is not None]
+
+    # Everything before the failure was committed
+    assert stored() == [0, 1, 2, 3, 4]
+
+    pages[f"{BASE}/5"] = page(5)
+    progress = ensure_chapter_content(db_session, book, fdm, batch_size=2)
+    assert (progress.total, progress.fetched, progress.commits) == (2, 2, 1)
+    assert stored() == list(range(7))
+    assert book.content_fingerprint is not None
+    assert book.stats is not None and book.stats.fetched_count == 7
+    assert book.stats.total_bytes == sum(c.content_size for c in book.chapters)
+    assert sum(c.word_count for c in book.chapters) == 7 * 2  # "Text i."
+    assert book.chapters[5].title == "Chapter 5"
+    assert "<p>Text 5.</p>" in read_chapter_html(db_session, book.chapters[5])
+
+    # A chapter re-filled (its content lost, the page since edited) is not
+    # counted twice
+    book.chapters[5].content_hash = None
+    db_session.commit()
+    pages[f"{BASE}/5"] = page(55)
+    ensure_chapter_content(db_session, book, fdm)
+    db_session.refresh(book.stats)
+    bumped = (book.stats.fetched_count, book.stats.total_bytes)
+    refreshed = refresh_book_stats(db_session, book.id)
+    assert bumped == (refreshed.fetched_count, refreshed.total_bytes)
+    assert bumped[0] == 7
+
+    db_session.delete(book)
+    db_session.commit()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import zipfile
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.book import BookConfig
+from mywbooks.content_store import chapter_values, encode_content, put_contents
+from mywbooks.ebook_generator import EbookGeneratorConfig
+from mywbooks.providers import get_provider_by_key
+from mywbooks.services.book_ops import (
+    ChapterSelection,
+    NothingToExportError,
+    export_book_to_epub_from_db,
+    export_fingerprint,
+    find_reusable_export,
+    iter_export_chapters,
+)
+
+from .fakes import FakeDownloadManager
+
+COVER_URL = "https://example.test/export-cover.jpg"
+
+
+def make_jpeg_bytes(w=120, h=80) -> bytes:
+    img = Image.new("RGB", (w, h), (10, 120, 200))
+    b = BytesIO()
+    img.save(b, format="JPEG")
+    return b.getvalue()
+
+
+def make_book(db: Session, uid: str, n_chapters: int) -> models.Book:
+    book = models.Book(
+        provider=models.ProviderKey.ROYALROAD,
+        provider_fiction_uid=uid,
+        source_url=f"https://rr/fiction/{uid}",
+        title="Export Book",
+        author="E",
+        language="en",
+        cover_url=COVER_URL,
+    )
+    db.add(book)
+    db.commit()
+
+    base = datetime(2025, 1, 1)
+    for i in range(n_chapters):
+        db.add(
+            models.Chapter(
+                book_id=book.id,
+                index=i,
+                title=f"Chapter {i + 1}",
+                content_html=f"<p>Text of chapter {i + 1}</p>",
+                provider_chapter_id=f"{uid}:{i}",
+                source_url=f"https://rr/chapter/{i}",
+                created_at=base + timedelta(days=i),
+                fetched_at=base + timedelta(days=i),
+                is_fetched=True,
+            )
+        )
+    db.commit()
+    return book
+
+
+def export(db: Session, book: models.Book, tmp_path: Path, **kw) -> Path:
+    fdm = FakeDownloadManager(tmp_path, {COVER_URL: make_jpeg_bytes()})
+    cfg = EbookGeneratorConfig(
+        book_config=BookConfig.from_model(book), include_chapter_titles=True
+    )
+    out = tmp_path / "out.epub"
+    return export_book_to_epub_from_db(db, book, cfg, out, dm=fdm, **kw)
+
+
+def chapter_files(epub_path: Path) -> list[str]:
+    with zipfile.ZipFile(epub_path) as zf:
+        return [n for n in zf.namelist() if n.rsplit("/", 1)[-1].startswith("chapter_")]
+
+
+def test_export_full_book(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, "export:full", 5)
+    out = export(db_session, book, tmp_path)
+    assert len(chapter_files(out)) == 5
+
+
+def test_export_delta_after_index(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, "export:index", 5)
+    out = export(db_session, book, tmp_path, selection=ChapterSelection(after_index=2))
+    assert len(chapter_files(out)) == 2
+    with zipfile.ZipFile(out) as zf:
+        opf = zf.read("EPUB/content.opf").decode()
+    assert "Export Book (Ch. 4-5)" in opf
+
+
+def test_export_delta_since_date(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, "export:since", 5)
+    out = export(
+        db_session,
+        book,
+        tmp_path,
+        selection=ChapterSelection(since=datetime(2025, 1, 2, 12)),
+    )
+    assert len(chapter_files(out)) == 3
+
+
+def test_delta_since_compares_naive_utc():
+    # The chapter timestamps are naive UTC; an aware bound would be shifted
+    # by PostgreSQL
+    since = datetime(2025, 1, 2, 12, tzinfo=timezone(timedelta(hours=2)))
+    (clause,) = ChapterSelection(since=since).clauses()
+    assert set(clause.compile().params.values()) == {datetime(2025, 1, 2, 10)}
+
+
+def test_export_delta_empty_raises(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, "export:empty", 3)
+    with pytest.raises(NothingToExportError):
+        export(db_session, book, tmp_path, selection=ChapterSelection(after_index=2))
+
+
+def test_reuse_export_with_same_fingerprint(
+    db_session: Session, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    book = make_book(db_session, "export:reuse", 2)
+    assert export_fingerprint(book, {}) is None
+
+    book.content_fingerprint = "f" * 64
+    options = {"include-images": False}
+    fingerprint = export_fingerprint(book, options)
+    assert fingerprint is not None
+    assert export_fingerprint(book, {**options, "output_path": "x"}) == fingerprint
+    assert export_fingerprint(book, {"include-images": True}) != fingerprint
+    prov = get_provider_by_key(book.provider)
+    with monkeypatch.context() as m:
+        m.setattr(type(prov), "EXTRACTOR_VERSION", prov.EXTRACTOR_VERSION + 1)
+        assert export_fingerprint(book, options) != fingerprint
+
+    out = export(db_session, book, tmp_path)
+    task = models.Task(
+        type=models.TaskType.DOWNLOAD_BOOK,
+        status=models.TaskStatus.SUCCEEDED,
+        book_id=book.id,
+        payload={**options, "output_path": str(out), "export-fingerprint": fingerprint},
+    )
+    db_session.add(task)
+    db_session.commit()
+
+    assert find_reusable_export(db_session, book.id, fingerprint) == out
+    book.title = "Renamed"
+    assert (
+        find_reusable_export(db_session, book.id, export_fingerprint(book, options))
+        is None
+    )
+
+    out.unlink()  # cleaned up since
+    assert find_reusable_export(db_session, book.id, fingerprint) is None
+
+    db_session.delete(task)
+    db_session.delete(book)
+    db_session.commit()
+
+
+def test_export_reads_chapter_metadata_without_content(
+    db_session: Session, tmp_path: Path
+):
+    book = make_book(db_session, "export:deferred", 3)
+    db_session.expire_all()
+
+    ch = db_session.query(models.Chapter).filter_by(book_id=book.id).first()
+    assert "content_html" not in sa_inspect(ch).dict  # deferred
+
+    out = export(db_session, book, tmp_path)
+    assert len(chapter_files(out)) == 3
+    # Emptiness checks ran as queries, not by loading book.chapters
+    assert "chapters" not in sa_inspect(book).dict
+
+
+def test_export_streams_chapters_in_chunks(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, "export:stream", 5)
+    # Chapters 2 and 4 are in the content store, the others legacy
+    for ch in book.chapters[1::2]:
+        stored = encode_content(f"<p>Stored chapter {ch.index + 1}</p>")
+        put_contents(db_session, [stored])
+        for key, value in chapter_values(stored).items():
+            setattr(ch, key, value)
+    db_session.commit()
+    book_id = book.id
+    db_session.expunge_all()
+
+    chapters = iter_export_chapters(
+        db_session, book_id, ChapterSelection(), chunk_size=2
+    )
+    got = []
+    for dto in chapters:
+        got.append((dto.title, dto.content))
+        # Converted rows don't pile up in the session
+        assert len([o for o in db_session if isinstance(o, models.Chapter)]) <= 2
+    assert got == [
+        ("Chapter 1", "<p>Text of chapter 1</p>"),
+        ("Chapter 2", "<p>Stored chapter 2</p>"),
+        ("Chapter 3", "<p>Text of chapter 3</p>"),
+        ("Chapter 4", "<p>Stored chapter 4</p>"),
+        ("Chapter 5", "<p>Text of chapter 5</p>"),
+    ]
+
+    out = export(db_session, db_session.get(models.Book, book_id), tmp_path)
+    with zipfile.ZipFile(out) as zf:
+        names = sorted(chapter_files(out), key=lambda n: int(n.split("_")[-1][:-6]))
+        bodies = [zf.read(n).decode() for n in names]
+    assert len(bodies) == 5
+    assert "Stored chapter 4" in bodies[3]
+    assert "Chapter 5</h1>" in bodies[4] and "Text of chapter 5" in bodies[4]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.maintenance.cleanup import expired_tasks
+from mywbooks.utils import utcnow
+
+
+def test_expired_tasks_by_status_retention(db_session: Session):
+    now = utcnow()
+    tasks = {
+        (status, days): models.Task(
+            type=models.TaskType.DOWNLOAD_BOOK,
+            status=status,
+            finished_at=now - timedelta(days=days),
+        )
+        for status in models.TaskStatus
+        for days in (1, 10, 40)
+    }
+    db_session.add_all(tasks.values())
+    db_session.commit()
+
+    ids = {t.id for t in tasks.values()}
+    expired = set(
+        db_session.scalars(
+            select(models.Task.id).where(models.Task.id.in_(ids), expired_tasks(now))
+        )
+    )
+    # Succeeded after 7 days, failed after 30, others kept
+    assert expired == {
+        tasks[models.TaskStatus.SUCCEEDED, 10].id,
+        tasks[models.TaskStatus.SUCCEEDED, 40].id,
+        tasks[models.TaskStatus.FAILED, 40].id,
+    }
+
+    for t in tasks.values():
+        db_session.delete(t)
+    db_session.commit()
+
+
+def test_expired_tasks_compares_naive_utc():
+    # finished_at is naive UTC; an aware bound would be shifted by PostgreSQL
+    now = datetime(2025, 1, 31, 12, tzinfo=timezone(timedelta(hours=2)))
+    params = expired_tasks(now).compile().params
+    assert set(params.values()) >= {datetime(2025, 1, 24, 10)}
+    assert all(v.tzinfo is None for v in params.values() if isinstance(v, datetime))
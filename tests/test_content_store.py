@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.content_store import (
+    MissingContentError,
+    chapter_values,
+    content_stats,
+    decode_content,
+    delete_orphan_contents,
+    encode_content,
+    put_contents,
+    read_chapter_html,
+    update_content_fingerprint,
+)
+from mywbooks.models import ProviderKey
+from mywbooks.services.book_ops import ChapterSelection, iter_export_chapters
+
+HTML = "<p>Ünïcode chapter text.</p>" * 50
+
+
+@pytest.mark.parametrize("encoding", ["zstd", "zlib", "identity"])
+def test_encode_roundtrip(encoding: str):
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+    content = encode_content(HTML, encoding)
+    assert content.size == len(HTML.encode("utf-8"))
+    if encoding != "identity":
+        assert len(content.data) < content.size / 5
+    assert decode_content(content.encoding, content.data) == HTML
+
+
+def test_store_dedupes_and_reads_legacy(db_session: Session):
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:store",
+        source_url="https://www.royalroad.com/fiction/13",
+        title="Store",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    delete_orphan_contents(db_session)  # left by other tests
+
+    content = encode_content(HTML)
+    put_contents(db_session, [content, content])
+    put_contents(db_session, [content])  # already stored
+    chapters = [
+        models.Chapter(
+            book_id=book.id,
+            index=i,
+            title=f"Chapter {i}",
+            provider_chapter_id=f"royalroad:st{i}",
+            source_url=f"https://www.royalroad.com/fiction/13/chapter/{i}",
+            is_fetched=True,
+            **chapter_values(content),
+        )
+        for i in range(2)
+    ]
+    legacy = models.Chapter(
+        book_id=book.id,
+        index=2,
+        title="Legacy",
+        provider_chapter_id="royalroad:st2",
+        source_url="https://www.royalroad.com/fiction/13/chapter/2",
+        is_fetched=True,
+        content_html="<p>Old</p>",
+    )
+    db_session.add_all([*chapters, legacy])
+    db_session.commit()
+
+    def stored() -> int:
+        return db_session.scalar(
+            select(func.count()).select_from(models.ChapterContent)
+        )
+
+    assert db_session.get(models.ChapterContent, content.hash) is not None
+    before = stored()
+    assert [read_chapter_html(db_session, c) for c in chapters] == [HTML, HTML]
+    assert read_chapter_html(db_session, legacy) == "<p>Old</p>"
+
+    assert delete_orphan_contents(db_session) == 0
+    db_session.delete(book)
+    db_session.commit()
+    assert delete_orphan_contents(db_session) == 1
+    assert stored() == before - 1
+
+
+def test_missing_blob_is_an_error(db_session: Session):
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:missing-blob",
+        source_url="https://www.royalroad.com/fiction/15",
+        title="Missing",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    content = encode_content("<p>Gone</p>")
+    ch = models.Chapter(
+        book_id=book.id,
+        index=0,
+        title="Gone",
+        provider_chapter_id="royalroad:mb0",
+        source_url="https://www.royalroad.com/fiction/15/chapter/0",
+        is_fetched=True,
+        **chapter_values(content),  # blob never stored
+    )
+    db_session.add(ch)
+    db_session.commit()
+
+    with pytest.raises(MissingContentError) as e:
+        read_chapter_html(db_session, ch)
+    assert (e.value.chapter_id, e.value.content_hash) == (ch.id, content.hash)
+    with pytest.raises(MissingContentError):
+        list(iter_export_chapters(db_session, book.id, ChapterSelection()))
+
+    db_session.delete(book)
+    db_session.commit()
+
+
+def test_content_stats_ignore_markup_only_changes():
+    base = content_stats('<div class="a1"><p>Hello   brave</p>\n<p>new world</p></div>')
+    assert base.word_count == 4
+    same = content_stats(
+        '<div class="zz9"><p class="x">Hello brave</p><p>new&#32;world</p>'
+        "<style>.zz9{display:none}</style></div>"
+    )
+    assert same == base
+    assert content_stats("<p>Hello brave new world!</p>") != base
+    # Inline tags don't split words
+    assert content_stats("<p>Hel<b>lo</b> brave <em>new</em> world</p>") == base
+    assert content_stats('<p>Hello brave new world</p><img src="a.jpg">') != base
+
+
+def test_fingerprint_follows_chapter_content(db_session: Session):
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:fingerprint",
+        source_url="https://www.royalroad.com/fiction/14",
+        title="Fingerprint",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    assert update_content_fingerprint(db_session, book.id) is None
+
+    ch = models.Chapter(
+        book_id=book.id,
+        index=0,
+        title="One",
+        provider_chapter_id="royalroad:fp1",
+        source_url="https://www.royalroad.com/fiction/14/chapter/1",
+        is_fetched=True,
+        **chapter_values(encode_content("<p>First draft</p>")),
+    )
+    db_session.add(ch)
+    db_session.commit()
+
+    first = update_content_fingerprint(db_session, book.id)
+    assert first is not None and book.content_fingerprint == first
+    assert update_content_fingerprint(db_session, book.id) == first
+
+    # Other markup (the export renders it) and edited text both change it
+    text_hash = ch.text_hash
+    for key, value in chapter_values(
+        encode_content("<p><i>First</i> draft</p>")
+    ).items():
+        setattr(ch, key, value)
+    db_session.flush()
+    assert ch.text_hash == text_hash
+    marked_up = update_content_fingerprint(db_session, book.id)
+    assert marked_up not in (None, first)
+    for key, value in chapter_values(encode_content("<p>Second draft</p>")).items():
+        setattr(ch, key, value)
+    db_session.flush()
+    assert update_content_fingerprint(db_session, book.id) not in (first, marked_up)
+
+    db_session.delete(book)
+    db_session.commit()
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from sqlalchemy import text
+
+from mywbooks.db import engine_options, make_engine
+
+
+def test_sqlite_engine_applies_pragmas(tmp_path: Path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.connect() as conn:
+
+        def pragma(name: str):
+            return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 10_000
+        assert pragma("mmap_size") > 0
+    engine.dispose()
+
+    engine = make_engine(f"sqlite:///{tmp_path / 'plain.db'}", sqlite_pragmas={})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    engine.dispose()
+
+
+def test_postgres_engine_is_pooled_and_pre_pinged():
+    options = engine_options("postgresql+psycopg://u:pw@db.example/mywbooks")
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] >= 1 and options["pool_recycle"] > 0
+    assert "pool_size" not in engine_options("sqlite:///./x.db")
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import random
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from pydantic_core import Url
+
+from mywbooks.book import BookConfig, Chapter
+from mywbooks.ebook_generator import EbookGenerator, EbookGeneratorConfig
+from mywbooks.epub_writer import (
+    COMPRESSION_PRESETS,
+    EpubCompression,
+    get_compression_preset,
+)
+
+from .fakes import FakeDownloadManager
+
+COVER_URL = "https://example.test/cover.jpg"
+IMG_URL = "https://example.test/img.jpg"
+
+
+def make_jpeg_bytes(w=120, h=80) -> bytes:
+    img = Image.new("RGB", (w, h), (40, 80, 120))
+    b = BytesIO()
+    img.save(b, format="JPEG")
+    return b.getvalue()
+
+
+def build(tmp_path: Path, compression: EpubCompression) -> Path:
+    tmp_path.mkdir(exist_ok=True)
+    fdm = FakeDownloadManager(
+        tmp_path, {COVER_URL: make_jpeg_bytes(), IMG_URL: make_jpeg_bytes()}
+    )
+    cfg = EbookGeneratorConfig(
+        book_config=BookConfig(
+            title="Zip", language="en", author="Z", cover_image=Url(COVER_URL)
+        ),
+        compression=compression,
+    )
+    gen = EbookGenerator("zip-test", fdm, cfg)
+    rnd = random.Random(0)
+    words = "a witch walked the silent hall while ember light flickered".split()
+    text = " ".join(rnd.choice(words) for _ in range(3000))
+    gen.add_chapter(Chapter("One", f"<p>{text}</p><img src='{IMG_URL}'>", {}, None))
+    out = tmp_path / "zip.epub"
+    gen.export_as_epub(out)
+    return out
+
+
+def test_images_are_stored_and_text_deflated(tmp_path: Path):
+    out = build(tmp_path, COMPRESSION_PRESETS["fast"])
+
+    with zipfile.ZipFile(out) as zf:
+        infos = {i.filename: i for i in zf.infolist()}
+        assert zf.infolist()[0].filename == "mimetype"
+
+    assert infos["mimetype"].compress_type == zipfile.ZIP_STORED
+    jpgs = [i for n, i in infos.items() if n.endswith(".jpg")]
+    assert jpgs and all(i.compress_type == zipfile.ZIP_STORED for i in jpgs)
+    xhtml = [i for n, i in infos.items() if n.endswith(".xhtml")]
+    assert xhtml and all(i.compress_type == zipfile.ZIP_DEFLATED for i in xhtml)
+
+
+def test_small_preset_is_not_larger_than_fast(tmp_path: Path):
+    fast = build(tmp_path, get_compression_preset("fast")).stat().st_size
+    small = build(tmp_path, get_compression_preset("small")).stat().st_size
+    assert small <= fast
+
+
+def test_text_deflate_level_follows_preset(tmp_path: Path):
+    def xhtml_size(compression: EpubCompression) -> int:
+        with zipfile.ZipFile(build(tmp_path, compression)) as zf:
+            return sum(
+                i.compress_size for i in zf.infolist() if i.filename.endswith(".xhtml")
+            )
+
+    assert xhtml_size(get_compression_preset("small")) < xhtml_size(
+        get_compression_preset("fast")
+    )
+
+
+def test_unknown_preset():
+    with pytest.raises(ValueError):
+        get_compression_preset("tiny")
+
+
+def test_builds_are_byte_identical(tmp_path: Path, monkeypatch):
+    first = build(tmp_path / "a", EpubCompression()).read_bytes()
+
+    # A later wall clock must not leak into the file
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 3 * 3600)
+    second = build(tmp_path / "b", EpubCompression()).read_bytes()
+
+    assert first == second
+
+
+def test_chapter_uids_come_from_chapter_ids(tmp_path: Path):
+    fdm = FakeDownloadManager(tmp_path, {COVER_URL: make_jpeg_bytes()})
+    cfg = EbookGeneratorConfig(
+        book_config=BookConfig(
+            title="Ids", language="en", author="I", cover_image=Url(COVER_URL)
+        ),
+    )
+    gen = EbookGenerator("ids-test", fdm, cfg)
+    gen.add_chapter(Chapter("One", "<p>1</p>", {}, None, id="royalroad:1269041"))
+    out = tmp_path / "ids.epub"
+    gen.export_as_epub(out)
+
+    with zipfile.ZipFile(out) as zf:
+        opf = zf.read("EPUB/content.opf").decode()
+    assert 'id="ch-royalroad-1269041"' in opf
+    assert "1980-01-01T00:00:00Z" in opf
+
+
+def test_images_are_streamed_from_the_cache(tmp_path: Path):
+    fdm = FakeDownloadManager(
+        tmp_path, {COVER_URL: make_jpeg_bytes(), IMG_URL: make_jpeg_bytes(900, 700)}
+    )
+    cfg = EbookGeneratorConfig(
+        book_config=BookConfig(
+            title="Img", language="en", author="I", cover_image=Url(COVER_URL)
+        ),
+    )
+    gen = EbookGenerator("img-test", fdm, cfg)
+    gen.add_chapter(Chapter("One", f"<img src='{IMG_URL}'>", {}, None))
+    out = tmp_path / "img.epub"
+    gen.export_as_epub(out)
+
+    [im] = gen.images_new.values()
+    # Only a handle to the resized file is kept, no payload
+    assert im.image_path is not None and im.image_path.parent == tmp_path
+    assert not any(isinstance(v, bytes) for v in vars(im).values())
+
+    with zipfile.ZipFile(out) as zf:
+        packed = zf.read("EPUB/" + im.get_ebook_src(cfg.epub_images_path))
+    assert packed == im.image_data == im.image_path.read_bytes()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import dataclasses
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from pydantic_core import Url
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.book import ChapterRef
+from mywbooks.book_stats import refresh_book_stats
+from mywbooks.models import ProviderKey
+from mywbooks.providers import get_provider_by_key
+from mywbooks.services.ingest import _upsert_chapter_index_from_refs
+
+BASE = "https://www.royalroad.com/fiction/77/chapter"
+
+
+def refs(*ids: int, title: str | None = None) -> list[ChapterRef]:
+    return [
+        ChapterRef(
+            id=f"royalroad:{i}",
+            url=Url(f"{BASE}/{i}"),
+            title=title or f"Chapter {i}",
+            published_at=datetime(2025, 1, i, tzinfo=timezone.utc),
+        )
+        for i in ids
+    ]
+
+
+@contextmanager
+def statements_of(db: Session) -> Iterator[list[str]]:
+    """Collects the verb (SELECT, INSERT, ...) of every statement executed."""
+    statements: list[str] = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+
+    event.listen(db.get_bind(), "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", on_execute)
+
+
+def test_upsert_chapter_index_in_bulk(db_session: Session):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:77",
+        source_url="https://www.royalroad.com/fiction/77",
+        title="Bulk",
+        language="en",
+        stats=models.BookStats(),
+    )
+    db_session.add(book)
+    db_session.commit()
+    book_id = book.id
+
+    def chapters() -> list[tuple[str, int, str]]:
+        return [
+            (c.provider_chapter_id, c.index, c.title)
+            for c in db_session.query(models.Chapter)
+            .filter_by(book_id=book_id)
+            .order_by(models.Chapter.index)
+        ]
+
+    with statements_of(db_session) as statements:
+        _upsert_chapter_index_from_refs(db_session, prov, refs(*range(1, 21)), book_id)
+        assert statements.count("SELECT") == 1
+        assert statements.count("INSERT") == 1
+        assert len(chapters()) == 20
+
+        # Unchanged ToC: nothing written
+        statements.clear()
+        _upsert_chapter_index_from_refs(db_session, prov, refs(*range(1, 21)), book_id)
+        assert statements == ["SELECT"]
+
+        # A chapter inserted at the front renumbers all the others
+        statements.clear()
+        new = refs(21) + [ChapterRef(id=r.id, url=r.url) for r in refs(*range(1, 21))]
+        _upsert_chapter_index_from_refs(db_session, prov, new, book_id)
+        assert statements.count("UPDATE") == 2  # chapters, then the book's stats
+
+    got = chapters()
+    assert got[0] == ("royalroad:21", 0, "Chapter 21")
+    # Refs without a title keep the stored one
+    assert got[1:3] == [
+        ("royalroad:1", 1, "Chapter 1"),
+        ("royalroad:2", 2, "Chapter 2"),
+    ]
+    ch = db_session.query(models.Chapter).filter_by(provider_chapter_id="royalroad:3")
+    assert ch.one().published_at is not None
+
+    db_session.delete(book)
+    db_session.commit()
+
+
+def test_upsert_chapter_index_keeps_book_stats(db_session: Session):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:78",
+        source_url="https://www.royalroad.com/fiction/78",
+        title="Stats",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    book_id = book.id
+
+    def stats() -> tuple[int, int | None, int | None]:
+        s = db_session.get(models.BookStats, book_id, populate_existing=True)
+        assert s is not None
+        day = s.latest_published_at.day if s.latest_published_at else None
+        return s.chapter_count, s.latest_chapter_index, day
+
+    # No stats yet: computed from the chapters
+    _upsert_chapter_index_from_refs(db_session, prov, refs(1, 2, 3), book_id)
+    assert stats() == (3, 2, 3)
+
+    # Appended chapters are added to them
+    with statements_of(db_session) as statements:
+        _upsert_chapter_index_from_refs(
+            db_session, prov, refs(4, 5), book_id, start_index=3
+        )
+    assert statements == ["SELECT", "INSERT", "UPDATE"]
+    assert stats() == (5, 4, 5)
+
+    # A renumbered ToC recomputes them
+    _upsert_chapter_index_from_refs(db_session, prov, refs(5, 4, 3, 2), book_id)
+    assert stats() == (5, 3, 5)
+
+    # A chapter inserted (and counted) concurrently, between the SELECT and
+    # the INSERT, is skipped and not counted twice
+    raced: list[str] = []
+
+    def concurrent_insert(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO chapters") and not raced:
+            raced.append(statement)
+            cursor.execute(
+                'INSERT INTO chapters (book_id, "index", title,'
+                " provider_chapter_id, source_url, created_at, is_fetched)"
+                " VALUES (?, 5, 'Chapter 6', 'royalroad:6', ?, ?, 0)",
+                (book_id, f"{BASE}/6", datetime(2025, 1, 6)),
+            )
+            cursor.execute(
+                "UPDATE book_stats SET chapter_count = chapter_count + 1"
+                " WHERE book_id = ?",
+                (book_id,),
+            )
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", concurrent_insert)
+    try:
+        _upsert_chapter_index_from_refs(
+            db_session, prov, refs(6, 7), book_id, start_index=5
+        )
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", concurrent_insert)
+    assert raced
+    assert stats() == (7, 6, 7)
+    assert refresh_book_stats(db_session, book_id).chapter_count == 7
+
+    db_session.delete(book)
+    db_session.commit()
+
+
+def test_book_stats_keep_naive_utc_publication_dates(db_session: Session):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:79",
+        source_url="https://www.royalroad.com/fiction/79",
+        title="Time zones",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    _upsert_chapter_index_from_refs(db_session, prov, refs(1), book.id)
+
+    # Appended (stats bumped) with a date in UTC+2
+    ref = dataclasses.replace(
+        refs(2)[0],
+        published_at=datetime(2025, 1, 8, 1, tzinfo=timezone(timedelta(hours=2))),
+    )
+    _upsert_chapter_index_from_refs(db_session, prov, [ref], book.id, start_index=1)
+    stats = db_session.get(models.BookStats, book.id, populate_existing=True)
+    assert stats is not None
+    assert stats.latest_published_at == datetime(2025, 1, 7, 23)
+
+    db_session.delete(book)
+    db_session.commit()
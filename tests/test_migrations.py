@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine, create_engine, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from mywbooks.book_stats import refresh_book_stats
+from mywbooks.content_store import read_chapter_html
+from mywbooks.migrations import (
+    BACKFILLS,
+    MIGRATIONS,
+    backfill_status,
+    run_backfill,
+    run_backfills,
+    run_migrations,
+)
+from mywbooks.models import Base, Book, BookStats, Chapter, ProviderKey
+
+
+def _old_schema(engine: Engine, n_chapters: int) -> None:
+    with engine.begin() as conn:
+        # chapters as created before published_at existed
+        conn.execute(
+            text(
+                "CREATE TABLE chapters (id INTEGER PRIMARY KEY, book_id INTEGER, "
+                '"index" INTEGER, title VARCHAR(255), content_html TEXT, '
+                "provider_chapter_id VARCHAR(32), source_url VARCHAR(1024), "
+                "created_at DATETIME, fetched_at DATETIME, is_fetched BOOLEAN)"
+            )
+        )
+        conn.execute(
+            text(
+                'INSERT INTO chapters (id, book_id, "index", title, content_html, '
+                "is_fetched) VALUES (:id, 1, :id - 1, 'One', '<p>Legacy</p>', 1)"
+            ),
+            [{"id": i} for i in range(1, n_chapters + 1)],
+        )
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Book).values(
+                id=1,
+                provider=ProviderKey.ROYALROAD,
+                provider_fiction_uid="royalroad:1",
+                source_url="https://www.royalroad.com/fiction/1",
+                title="Old",
+                language="en",
+            )
+        )
+
+
+def test_migrations_upgrade_an_old_schema(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    _old_schema(engine, 1)
+
+    assert run_migrations(engine) == sorted(MIGRATIONS)
+    columns = {c["name"] for c in inspect(engine).get_columns("chapters")}
+    assert {"published_at", "content_hash", "content_size"} <= columns
+    indexes = {i["name"] for i in inspect(engine).get_indexes("chapters")}
+    assert {"ix_chapters_book_fetched_index", "ix_chapters_book_missing_content"} <= (
+        indexes
+    )
+
+    # Legacy content is still readable until the backfills have run
+    with Session(engine) as db:
+        ch = db.get(Chapter, 1)
+        assert ch.content_hash is None
+        assert read_chapter_html(db, ch) == "<p>Legacy</p>"
+
+    assert run_backfills(engine) == {
+        "chapters.content_hash": 1,
+        "chapters.text_hash": 0,  # set by the move
+        "book_stats": 1,
+    }
+
+    # Legacy content moved to the content store
+    with Session(engine) as db:
+        ch = db.get(Chapter, 1)
+        assert ch.content_html is None and ch.content_size == len("<p>Legacy</p>")
+        assert read_chapter_html(db, ch) == "<p>Legacy</p>"
+        assert ch.text_hash is not None and ch.word_count == 1
+
+        stats = db.get(BookStats, 1)
+        assert (stats.chapter_count, stats.fetched_count) == (1, 1)
+        assert stats.total_bytes == ch.content_size
+
+    # Applied once only
+    assert run_migrations(engine) == []
+    assert run_backfills(engine) == dict.fromkeys(BACKFILLS, 0)
+
+
+def test_backfills_in_any_order(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    _old_schema(engine, 2)
+    run_migrations(engine)
+
+    # The app computes stats (with legacy chapters still unsized) and the
+    # backfills run in reverse order
+    with Session(engine) as db:
+        refresh_book_stats(db, 1)
+        db.commit()
+    assert run_backfills(engine, ["book_stats", "chapters.text_hash"]) == {
+        "book_stats": 0,
+        "chapters.text_hash": 0,
+    }
+    assert run_backfills(engine, ["chapters.content_hash"]) == {
+        "chapters.content_hash": 2
+    }
+
+    with Session(engine) as db:
+        chapters = db.scalars(select(Chapter)).all()
+        assert all(c.text_hash is not None and c.word_count == 1 for c in chapters)
+        stats = db.get(BookStats, 1)
+        assert stats.total_bytes == 2 * len("<p>Legacy</p>")
+
+
+def test_backfill_resumes_after_a_failed_batch(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    _old_schema(engine, 5)
+    run_migrations(engine)
+
+    bf = BACKFILLS["chapters.content_hash"]
+    batches = []
+
+    def fail_on_second_batch(conn, lo, hi):
+        batches.append((lo, hi))
+        if len(batches) == 2:
+            raise RuntimeError("interrupted")
+        return bf.fn(conn, lo, hi)
+
+    with pytest.raises(RuntimeError):
+        run_backfill(engine, bf._replace(fn=fail_on_second_batch), batch_size=2)
+    assert batches == [(0, 2), (2, 4)]
+
+    # The first batch is kept, the failed one rolled back
+    with engine.connect() as conn:
+        moved = conn.scalars(
+            select(Chapter.id).where(Chapter.content_hash.is_not(None))
+        ).all()
+    assert moved == [1, 2]
+    status = {
+        b.name: (last_id, rows, done)
+        for b, last_id, rows, done in backfill_status(engine)
+    }
+    assert status["chapters.content_hash"] == (2, 2, False)
+
+    progress = []
+    rows = run_backfill(
+        engine,
+        bf,
+        batch_size=2,
+        progress=lambda b, last_id, n: progress.append(last_id),
+    )
+    assert (rows, progress) == (3, [4, 5])
+    status = {
+        b.name: (last_id, rows, done)
+        for b, last_id, rows, done in backfill_status(engine)
+    }
+    assert status["chapters.content_hash"] == (5, 5, True)
+
+
+def test_migrations_on_a_fresh_schema_are_noops(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert run_migrations(engine) == sorted(MIGRATIONS)
+    assert run_backfills(engine) == dict.fromkeys(BACKFILLS, 0)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.content_store import read_chapter_html
+from mywbooks.models import ProviderKey
+from mywbooks.parse_cache import ParseCache
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.base import ExtractedChapter
+from mywbooks.services.book_ops import ensure_chapter_content
+
+from .fakes import FakeDownloadManager
+
+PAGE = b"""<html><body>
+  <div class="fic-header"><h1>Cached</h1></div>
+  <div class="chapter-inner"><p>Caf\xc3\xa9 text.</p></div>
+</body></html>"""
+
+
+@pytest.fixture
+def counted_extract(monkeypatch):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    calls = []
+    real = type(prov).extract_chapter_html
+
+    def extract(self, page, **kw):
+        calls.append(page)
+        return real(self, page, **kw)
+
+    monkeypatch.setattr(type(prov), "extract_chapter_html", extract)
+    return prov, calls
+
+
+def test_cache_roundtrip_and_version_bump(tmp_path: Path, counted_extract, monkeypatch):
+    prov, calls = counted_extract
+    cache = ParseCache(tmp_path)
+
+    first = cache.extract(prov, PAGE)
+    second = cache.extract(prov, PAGE)
+    assert first == second == ExtractedChapter("Cached", second.content_html)
+    assert "Café text." in second.content_html
+    assert len(calls) == 1
+
+    # Other bytes, other entry
+    cache.extract(prov, PAGE.replace(b"text", b"words"))
+    assert len(calls) == 2
+
+    monkeypatch.setattr(type(prov), "EXTRACTOR_VERSION", prov.EXTRACTOR_VERSION + 1)
+    cache.extract(prov, PAGE)
+    assert len(calls) == 3
+    assert cache.prune(prov) == 2
+    assert cache.get(prov, PAGE) is not None
+
+
+def test_ensure_chapter_content_reuses_extraction(
+    db_session: Session, tmp_path: Path, counted_extract
+):
+    prov, calls = counted_extract
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:cache",
+        source_url="https://www.royalroad.com/fiction/9",
+        title="Cache",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    db_session.add(
+        models.Chapter(
+            book_id=book.id,
+            index=0,
+            title="Chapter 1",
+            provider_chapter_id="royalroad:c1",
+            source_url="https://www.royalroad.com/fiction/9/chapter/1",
+            is_fetched=False,
+        )
+    )
+    db_session.commit()
+
+    fdm = FakeDownloadManager(tmp_path, {book.chapters[0].source_url: PAGE})
+    assert ensure_chapter_content(db_session, book, fdm).fetched == 1
+
+    # e.g. re-ingest after a DB restore: content is gone, pages are cached
+    book.chapters[0].content_hash = None
+    db_session.commit()
+    assert ensure_chapter_content(db_session, book, fdm).fetched == 1
+
+    assert len(calls) == 1
+    assert "Café text." in read_chapter_html(db_session, book.chapters[0])
+
+    db_session.delete(book)
+    db_session.commit()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import pytest
+from bs4 import BeautifulSoup
+
+from mywbooks.ebook_generator import ExtractOptions
+from mywbooks.models import ProviderKey
+from mywbooks.parsing import (
+    ParserUnavailableError,
+    available_parser_backends,
+    get_parser_backend,
+    regions,
+)
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.royalroad import ChapterParseError
+
+CHAPTER_HTML = """
+<html>
+  <body>
+    <div class="fic-header"><h1> Fiction <b>Title</b> </h1></div>
+    <div class="chapter-inner chapter-content">
+      <p>First paragraph.</p>
+      <p>Second <em>paragraph</em>.<br>With a break.</p>
+    </div>
+  </body>
+</html>
+""".encode()
+
+
+def text_of(html: str) -> str:
+    return BeautifulSoup(html, "lxml").get_text()
+
+
+@pytest.mark.parametrize("name", ["bs4", "lxml", "selectolax"])
+def test_backends_extract_the_same_chapter(name: str):
+    try:
+        backend = get_parser_backend(name)
+    except ParserUnavailableError:
+        pytest.skip(f"{name} not installed")
+
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    reference = prov.extract_chapter_html(
+        CHAPTER_HTML, parser=get_parser_backend("bs4")
+    )
+    page = prov.extract_chapter_html(CHAPTER_HTML, parser=backend)
+
+    assert reference is not None and page is not None
+    assert page.title == reference.title == "FictionTitle"
+    assert page.content_html.startswith("<div")
+    assert text_of(page.content_html) == text_of(reference.content_html)
+
+
+@pytest.mark.parametrize("name", available_parser_backends())
+def test_backends_strict_errors(name: str):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    with pytest.raises(ChapterParseError):
+        prov.extract_chapter_html(
+            b"<html><body>No chapter</body></html>",
+            options=ExtractOptions(url="https://rr/chap/1", strict=True),
+            parser=get_parser_backend(name),
+        )
+
+
+def test_selectors_are_compiled_once():
+    backend = get_parser_backend("bs4")
+    assert backend.compiled("div.chapter-inner") is backend.compiled(
+        "div.chapter-inner"
+    )
+    assert get_parser_backend("bs4") is backend
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_parser_backend("regex")
+
+
+PAGE_WITH_NOISE = b"""
+<html>
+  <head>
+    <style>.x1 { display: none; }</style>
+    <script>var tracking = "<div class='chapter-inner'>fake</div>";</script>
+  </head>
+  <body>
+    <nav><a href="/">Home</a></nav>
+    <!-- a comment -->
+    <div class="fic-header"><h1>Fiction</h1></div>
+    <div class="chapter-inner chapter-content"><p>Real text.</p></div>
+    <aside class="sidebar"><p>Sidebar text</p></aside>
+  </body>
+</html>
+"""
+
+
+def test_region_matching():
+    [r] = regions('div.chapter-inner[data-x="1"]')
+    assert r.matches("div", {"class": "a chapter-inner", "data-x": "1"})
+    assert r.matches("div", {"class": ["chapter-inner"], "data-x": "1"})
+    assert not r.matches("div", {"class": "chapter-inner"})
+    assert not r.matches("span", {"class": "chapter-inner", "data-x": "1"})
+
+    with pytest.raises(ValueError):
+        regions("div > p")
+
+
+@pytest.mark.parametrize("name", available_parser_backends())
+def test_partial_parse_keeps_only_regions(name: str):
+    backend = get_parser_backend(name)
+    root = backend.parse(PAGE_WITH_NOISE, regions=regions("div.chapter-inner", "style"))
+
+    assert root.select_one("div.chapter-inner p").text() == "Real text."
+    assert "display: none" in root.select_one("style").text()
+    if name != "selectolax":  # lexbor always builds the full page
+        assert root.select_one("nav") is None
+        assert root.select_one("script") is None
+        assert "Sidebar" not in root.text()
+
+
+@pytest.mark.parametrize("name", available_parser_backends())
+def test_partial_parse_extracts_like_a_full_parse(name: str):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    backend = get_parser_backend(name)
+
+    partial = prov.extract_chapter_html(PAGE_WITH_NOISE, parser=backend)
+    root = backend.parse(PAGE_WITH_NOISE)
+    full = prov._extractor.extract_nodes(root)
+
+    assert partial is not None and full is not None
+    assert partial.title == full[0] == "Fiction"
+    assert partial.content_html == full[1].html()
+
+
+HIDDEN_HTML = b"""
+<html>
+  <head>
+    <style>
+      .aGlkZGVu { display: none; speak: never; }
+      .shown, .b3RoZXI { display:none }
+      .chapter-inner p { display: none; }
+    </style>
+  </head>
+  <body>
+    <div class="chapter-inner">
+      <p class="x">Kept.</p>
+      <span class="aGlkZGVu"><br>Stolen from RoyalRoad.<br></span>
+      <p class="b3RoZXI other">Also hidden.</p>
+      <p>Tail kept.</p>
+    </div>
+  </body>
+</html>
+"""
+
+
+@pytest.mark.parametrize("name", available_parser_backends())
+def test_hidden_elements_are_stripped(name: str):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    page = prov.extract_chapter_html(HIDDEN_HTML, parser=get_parser_backend(name))
+
+    assert page is not None
+    text = text_of(page.content_html)
+    assert "Kept." in text and "Tail kept." in text
+    assert "Stolen" not in text and "Also hidden" not in text
+
+
+def test_hidden_class_names_from_style_blocks():
+    ex = get_provider_by_key(ProviderKey.ROYALROAD)._extractor
+    root = get_parser_backend("bs4").parse(HIDDEN_HTML)
+    # Only bare class selectors count, not `.chapter-inner p`
+    assert ex.identify_hiddden_class_names(root) == {"aGlkZGVu", "shown", "b3RoZXI"}
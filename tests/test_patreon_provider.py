@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pytest
+from bs4 import BeautifulSoup
+from pydantic_core import Url
+
+from mywbooks.ebook_generator import ExtractOptions
+from mywbooks.models import ProviderKey
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.patreon import COLLECTION_API, POSTS_API, PostParseError
+
+from .fakes import FakeDownloadManager
+
+
+def post_page(attributes: dict) -> bytes:
+    data = {
+        "props": {
+            "pageProps": {
+                "bootstrapEnvelope": {
+                    "pageBootstrap": {
+                        "post": {
+                            "data": {
+                                "id": "2",
+                                "type": "post",
+                                "attributes": attributes,
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+    return (
+        "<html><head><script>var x = 1;</script></head><body>"
+        '<span data-tag="post-title">Ignored</span>'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script>'
+        "</body></html>"
+    ).encode()
+
+
+CONTENT = (
+    '<p>&lt;&lt; <a href="https://www.patreon.com/posts/1">Chapter 1</a> | '
+    '<a href="https://www.patreon.com/posts/0">Table of Contents</a></p>'
+    "<p>Chapter text.</p><p>More | text.</p>"
+    '<p><a href="https://www.patreon.com/posts/3">Next</a> &gt;&gt;</p>'
+)
+
+
+def test_extract_post_from_embedded_json():
+    prov = get_provider_by_key(ProviderKey.PATREON)
+    page = prov.extract_chapter_html(
+        post_page({"title": "Serial - 2", "content": CONTENT})
+    )
+
+    assert page is not None
+    assert page.title == "Serial - 2"
+    assert page.content_html == (
+        '<div class="chapter-inner"><p>Chapter text.</p><p>More | text.</p></div>'
+    )
+
+    # The soup API gives the same result
+    soup_page = prov.extract_chapter(
+        BeautifulSoup(post_page({"title": "Serial - 2", "content": CONTENT}), "lxml")
+    )
+    assert soup_page is not None and str(soup_page.content) == page.content_html
+
+
+def test_locked_post_is_an_error_in_strict_mode():
+    prov = get_provider_by_key(ProviderKey.PATREON)
+    page = post_page({"title": "Locked", "content": None})
+
+    assert prov.extract_chapter_html(page) is None
+    with pytest.raises(PostParseError):
+        prov.extract_chapter_html(page, options=ExtractOptions(strict=True))
+
+
+def test_fiction_uid_from_url():
+    prov = get_provider_by_key(ProviderKey.PATREON)
+    assert (
+        prov.fiction_uid_from_url("https://www.patreon.com/collection/1270974?view=x")
+        == "patreon:1270974"
+    )
+    assert prov.fiction_uid_from_url("https://www.patreon.com/posts/x-1") is None
+
+
+def test_discover_collection(tmp_path: Path):
+    collection_url = (
+        COLLECTION_API.format(id=77)
+        + "?"
+        + urlencode(
+            {
+                "include": "campaign",
+                "fields[collection]": "title,thumbnail",
+                "fields[campaign]": "name,avatar_photo_url",
+            }
+        )
+    )
+    posts_url = (
+        POSTS_API
+        + "?"
+        + urlencode(
+            {
+                "filter[collection_id]": "77",
+                "sort": "collection_order",
+                "fields[post]": "title,url,published_at",
+                "page[count]": "100",
+            }
+        )
+    )
+    next_url = "https://www.patreon.com/api/posts?page%5Bcursor%5D=abc"
+
+    def post(pid: int) -> dict:
+        return {
+            "id": str(pid),
+            "type": "post",
+            "attributes": {
+                "title": f"Serial - {pid}",
+                "url": f"https://www.patreon.com/posts/serial-{pid}-{pid}",
+                "published_at": f"2025-07-0{pid}T16:00:07.000+00:00",
+            },
+        }
+
+    mapping = {
+        collection_url: {
+            "data": {"id": "77", "attributes": {"title": "Serial", "thumbnail": {}}},
+            "included": [
+                {
+                    "type": "campaign",
+                    "attributes": {
+                        "name": "Writer",
+                        "avatar_photo_url": "https://c10.example/avatar.png",
+                    },
+                }
+            ],
+        },
+        posts_url: {"data": [post(1), post(2)], "links": {"next": next_url}},
+        next_url: {"data": [post(3)], "links": {}},
+    }
+    fdm = FakeDownloadManager(
+        tmp_path, {str(Url(u)): json.dumps(d).encode() for u, d in mapping.items()}
+    )
+
+    prov = get_provider_by_key(ProviderKey.PATREON)
+    fic = prov.discover_fiction(fdm, Url("https://www.patreon.com/collection/77"))
+
+    assert fic.uid == "patreon:77"
+    assert (fic.meta.title, fic.meta.author) == ("Serial", "Writer")
+    assert str(fic.meta.cover_image) == "https://c10.example/avatar.png"
+    assert [r.id for r in fic.chapter_refs] == ["patreon:1", "patreon:2", "patreon:3"]
+    assert fic.chapter_refs[2].title == "Serial - 3"
+    assert fic.chapter_refs[0].published_at is not None
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mywbooks import providers
+from mywbooks.models import ProviderKey
+from mywbooks.providers.base import Provider
+from mywbooks.providers.royalroad import RoyalRoadProvider
+
+
+def test_provider_is_loaded_once():
+    a = providers.get_provider_by_key(ProviderKey.ROYALROAD)
+    assert isinstance(a, RoyalRoadProvider)
+    assert providers.get_provider_by_key(ProviderKey.ROYALROAD) is a
+    assert a.provider_key() == "royalroad"
+
+
+def test_concurrent_first_lookup_imports_once(monkeypatch):
+    monkeypatch.setattr(providers, "_provider_register", {})
+
+    imports: list[str] = []
+    real_import = importlib.import_module
+
+    def counting_import(name, package=None):
+        imports.append(name)
+        return real_import(name, package)
+
+    monkeypatch.setattr(providers.importlib, "import_module", counting_import)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        found = list(
+            pool.map(
+                lambda _: providers.get_provider_by_key(ProviderKey.ROYALROAD),
+                range(32),
+            )
+        )
+
+    assert imports == [".royalroad"]
+    assert all(p is found[0] for p in found)
+
+
+def test_unknown_provider_key():
+    with pytest.raises(ValueError):
+        providers.get_provider_by_key("no-such-provider")
+
+
+def test_entry_point_providers_are_discovered(monkeypatch):
+    # A third-party provider module, as an entry point would name it
+    module = types.ModuleType("third_party_provider")
+
+    class FakeProvider(Provider):
+        def fiction_uid_from_url(self, url):
+            return None
+
+        def discover_fiction(self, dm, fiction_url):
+            raise NotImplementedError
+
+        def extract_chapter(self, soup, *, options=None):
+            return None
+
+    module.PROVIDER_SHORT_NAME = "Fake"
+    module.FakeProvider = FakeProvider
+    monkeypatch.setitem(sys.modules, "third_party_provider", module)
+    monkeypatch.setattr(
+        providers, "_entry_point_modules", {"fake": "third_party_provider"}
+    )
+    monkeypatch.setattr(providers, "_provider_register", {})
+
+    assert set(providers.warm_providers()) == {"royalroad", "patreon", "fake"}
+    fake = providers.get_provider_by_key("fake")
+    assert isinstance(fake, FakeProvider)
+    assert fake.provider_key() == "fake"
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.models import ProviderKey
+from mywbooks.providers import get_provider_by_key
+from mywbooks.services.book_ops import refresh_fiction_toc
+
+from .fakes import FakeDownloadManager
+
+FEED_URL = "https://www.royalroad.com/fiction/syndication/4242"
+FICTION_URL = "https://www.royalroad.com/fiction/4242"
+
+
+def feed(*items: tuple[int, str, str]) -> bytes:
+    body = "".join(f"""<item>
+              <title>Feed Fiction - {title}</title>
+              <link>https://www.royalroad.com/fiction/4242/feed/chapter/{cid}/x</link>
+              <guid isPermaLink="false">{cid}</guid>
+              <pubDate>{date}</pubDate>
+            </item>""" for cid, title, date in items)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+        <rss version="2.0"><channel>
+          <title>Feed Fiction</title>
+          <link>{FICTION_URL}</link>
+          {body}
+        </channel></rss>""".encode()
+
+
+# Newest first, like the real feed
+FEED = feed(
+    (3, "Chapter 3", "Sat, 03 May 2025 10:00:00 GMT"),
+    (2, "Chapter 2", "Fri, 02 May 2025 10:00:00 GMT"),
+    (1, "Chapter 1", "Thu, 01 May 2025 10:00:00 GMT"),
+)
+
+
+def poll(tmp_path: Path, since: datetime | None, data: bytes = FEED):
+    fdm = FakeDownloadManager(tmp_path, {FEED_URL: data})
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    return prov.poll_updates(fdm, "royalroad:4242", since)
+
+
+def test_poll_returns_only_new_chapters(tmp_path: Path):
+    upd = poll(tmp_path, datetime(2025, 5, 1, 10, tzinfo=timezone.utc))
+
+    assert upd is not None and upd.complete
+    assert [r.id for r in upd.refs] == ["royalroad:2", "royalroad:3"]
+    assert upd.refs[0].title == "Chapter 2"
+    assert upd.refs[0].published_at == datetime(2025, 5, 2, 10, tzinfo=timezone.utc)
+
+
+def test_poll_nothing_new(tmp_path: Path):
+    upd = poll(tmp_path, datetime(2025, 5, 3, 10))  # naive means UTC
+    assert upd is not None and upd.complete and upd.refs == []
+
+
+def test_poll_reports_gap(tmp_path: Path):
+    # The feed does not reach back to `since`: chapters may be missing
+    upd = poll(tmp_path, datetime(2025, 4, 1, tzinfo=timezone.utc))
+    assert upd is not None and not upd.complete
+
+    assert not poll(tmp_path, None).complete
+
+
+def make_book(db: Session, last_chapter: int) -> models.Book:
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:4242",
+        source_url=FICTION_URL,
+        title="Feed Fiction",
+        language="en",
+    )
+    db.add(book)
+    db.commit()
+    for i in range(last_chapter):
+        db.add(
+            models.Chapter(
+                book_id=book.id,
+                index=i,
+                title=f"Chapter {i + 1}",
+                provider_chapter_id=f"royalroad:{i + 1}",
+                source_url=f"https://www.royalroad.com/fiction/4242/feed/chapter/{i + 1}/x",
+                published_at=datetime(2025, 5, i + 1, 10),
+                is_fetched=False,
+            )
+        )
+    db.commit()
+    return book
+
+
+def test_refresh_appends_polled_chapters(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, 1)
+    # No fiction page in the mapping: the full ToC must not be fetched
+    fdm = FakeDownloadManager(tmp_path, {FEED_URL: FEED})
+
+    assert refresh_fiction_toc(db_session, book, fdm) == 2
+    assert [(c.index, c.provider_chapter_id, c.title) for c in book.chapters] == [
+        (0, "royalroad:1", "Chapter 1"),
+        (1, "royalroad:2", "Chapter 2"),
+        (2, "royalroad:3", "Chapter 3"),
+    ]
+    assert fdm.calls == {FEED_URL: 1}
+
+    db_session.delete(book)
+    db_session.commit()
+
+
+def test_refresh_falls_back_to_full_toc_on_gap(db_session: Session, tmp_path: Path):
+    book = make_book(db_session, 0)
+    page = b"""<html><body>
+        <div class="fic-header"><h1>Feed Fiction</h1></div>
+        <script>window.chapters = [
+          {"id": 1, "title": "Chapter 1", "order": 0,
+           "url": "/fiction/4242/feed/chapter/1/x"}];</script>
+        </body></html>"""
+    fdm = FakeDownloadManager(tmp_path, {FEED_URL: FEED, FICTION_URL: page})
+
+    assert refresh_fiction_toc(db_session, book, fdm) == 1
+    assert fdm.calls.get(FICTION_URL) == 1
+
+    db_session.delete(book)
+    db_session.commit()
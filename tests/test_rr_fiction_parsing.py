@@ -90,3 +90,89 @@ def test_parse_fiction_page_case2_chapters_fail():
             chapter_toc_strategies=1,  # Should fail with =1
         )
     assert "Could not locate chapter table of contents" in str(ei.value)
+
+
+FICTION_HTML_EMBEDDED = """
+<html>
+  <head><meta name="language" content="EN"></head>
+  <body>
+    <div class="fic-header">
+      <h1>Embedded Fiction</h1>
+      <a href="/profile/7/someone">Someone</a>
+      <img src="https://royalroadcdn.com/covers/emb.jpg">
+    </div>
+    <script>
+      window.chapters = [
+        {"id": 101, "title": "1. Start]; not the end", "slug": "1-start",
+         "date": "2020-05-01T10:00:00Z", "order": 0, "visible": 1,
+         "url": "/fiction/7777/emb/chapter/101/1-start"},
+        {"id": 103, "title": " 3. Hidden ", "date": "2020-05-03T10:00:00Z",
+         "order": 2, "visible": 0, "url": "/fiction/7777/emb/chapter/103/x"},
+        {"id": 102, "title": "2. Middle", "date": "2020-05-02T10:00:00Z",
+         "order": 1, "visible": 1}
+      ];
+      window.somethingElse = 1;
+    </script>
+  </body>
+</html>
+"""
+
+
+def test_parse_fiction_page_embedded_chapters():
+    from mywbooks.providers.royalroad import _parse_fiction_page_toc
+
+    base = "https://www.royalroad.com/fiction/7777/emb"
+    # The selector strategies would fail on this page, the JSON is used instead
+    meta, toc = _parse_fiction_page_toc(base, FICTION_HTML_EMBEDDED)
+
+    assert meta.title == "Embedded Fiction"
+    assert meta.author == "Someone"
+    assert meta.language == "en"
+    assert "emb.jpg" in str(meta.cover_image)
+
+    assert [e.title for e in toc] == ["1. Start]; not the end", "2. Middle"]
+    assert (
+        toc[0].url == "https://www.royalroad.com/fiction/7777/emb/chapter/101/1-start"
+    )
+    assert toc[1].url == "https://www.royalroad.com/fiction/7777/chapter/102"
+    assert toc[0].published_at is not None
+    assert toc[0].published_at.isoformat() == "2020-05-01T10:00:00+00:00"
+
+
+def test_embedded_chapters_skip_malformed_entries():
+    from mywbooks.providers.royalroad import _extract_embedded_chapters
+
+    base = "https://www.royalroad.com/fiction/7777/emb"
+    html = """<script>window.chapters = [
+        1, "x", null, {"title": "No id"},
+        {"id": 102, "order": "2", "title": "Two"},
+        {"id": 101, "order": 1, "url": 5, "title": "One"}
+    ];</script>"""
+    toc = _extract_embedded_chapters(base, html)
+    assert toc is not None
+    assert [(e.title, e.url) for e in toc] == [
+        ("Two", "https://www.royalroad.com/fiction/7777/chapter/102"),
+        ("One", "https://www.royalroad.com/fiction/7777/chapter/101"),
+    ]
+
+    # Nothing usable: the caller falls back to the chapter table
+    html = '<script>window.chapters = [1, "x", null, {"title": "No id"}];</script>'
+    assert _extract_embedded_chapters(base, html) is None
+
+
+def test_discover_fiction_refs_have_titles(tmp_path):
+    from mywbooks.models import ProviderKey
+    from mywbooks.providers import get_provider_by_key
+    from pydantic_core import Url
+
+    from tests.fakes import FakeDownloadManager
+
+    url = "https://www.royalroad.com/fiction/7777"
+    fdm = FakeDownloadManager(tmp_path, {url: FICTION_HTML_EMBEDDED.encode()})
+
+    fic = get_provider_by_key(ProviderKey.ROYALROAD).discover_fiction(fdm, Url(url))
+
+    assert fic.uid == "royalroad:7777"
+    assert [r.id for r in fic.chapter_refs] == ["royalroad:101", "royalroad:102"]
+    assert fic.chapter_refs[1].title == "2. Middle"
+    assert fic.chapter_refs[1].published_at is not None
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from pydantic_core import Url
+from sqlalchemy.orm import Session
+
+from mywbooks import models
+from mywbooks.content_store import read_chapter_html
+from mywbooks.ebook_generator import ExtractOptions
+from mywbooks.models import ProviderKey
+from mywbooks.providers import get_provider_by_key
+from mywbooks.providers.royalroad import ChapterParseError
+from mywbooks.sandbox import ParseFailure, ParseLimits, ParseSandbox
+from mywbooks.services.book_ops import ensure_chapter_content
+
+from .fakes import FakeDownloadManager
+
+PAGE = b"""<html><body>
+  <div class="fic-header"><h1>Boxed</h1></div>
+  <div class="chapter-inner"><p>Inside the box.</p></div>
+</body></html>"""
+
+FICTION_URL = "https://www.royalroad.com/fiction/5555"
+FICTION_PAGE = b"""<html><body>
+  <div class="fic-header"><h1>Boxed Fiction</h1></div>
+  <table id="chapters"><tbody>
+    <tr class="chapter-row"><td>
+      <a href="/fiction/5555/boxed/chapter/1/one">One</a>
+    </td></tr>
+  </tbody></table>
+</body></html>"""
+
+
+# Worker functions are pickled by reference, so they live at module level
+
+
+def _spin(seconds: float) -> None:
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def _allocate(mb: int) -> int:
+    return len(bytearray(mb << 20))
+
+
+def _die() -> None:
+    os._exit(3)
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+def _stuck(seconds: float) -> None:
+    # As if stuck in C code: the worker's SIGALRM never gets through
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    _spin(seconds)
+
+
+@pytest.fixture(scope="module")
+def sandbox():
+    sb = ParseSandbox(ParseLimits(timeout=1.0, max_memory_mb=768, workers=1))
+    yield sb
+    sb.shutdown()
+
+
+def test_extracts_in_worker(sandbox: ParseSandbox):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    extracted = sandbox.extract_chapter_html(prov, PAGE)
+    assert extracted == prov.extract_chapter_html(PAGE)
+    assert sandbox.call(_pid) != os.getpid()
+
+
+def test_limits_raise_typed_failures(sandbox: ParseSandbox):
+    with pytest.raises(ParseFailure) as e:
+        sandbox.call(_spin, 10.0, url="https://x/slow")
+    assert e.value.kind == "timeout"
+    assert e.value.url == "https://x/slow"
+
+    with pytest.raises(ParseFailure) as e:
+        sandbox.call(_allocate, 2048)
+    assert e.value.kind == "memory"
+
+    # The worker survives both
+    assert sandbox.call(_allocate, 16) == 16 << 20
+
+
+def test_crashed_worker_is_replaced(sandbox: ParseSandbox):
+    with pytest.raises(ParseFailure) as e:
+        sandbox.call(_die)
+    assert e.value.kind == "crash"
+    assert sandbox.call(_allocate, 1) == 1 << 20
+
+
+def test_stuck_worker_is_killed(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("mywbooks.sandbox._KILL_GRACE", 0.5)
+    sb = ParseSandbox(ParseLimits(timeout=0.5, workers=1))
+    try:
+        pid = sb.call(_pid)
+        with pytest.raises(ParseFailure) as e:
+            sb.call(_stuck, 30.0)
+        assert e.value.kind == "timeout"
+
+        deadline = time.monotonic() + 5
+        while pid in {p.pid for p in multiprocessing.active_children()}:
+            assert time.monotonic() < deadline, "stuck worker still running"
+            time.sleep(0.05)
+        assert sb.call(_pid) != pid
+    finally:
+        sb.shutdown()
+
+
+def test_other_calls_survive_a_killed_worker(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("mywbooks.sandbox._KILL_GRACE", 1.0)
+    sb = ParseSandbox(ParseLimits(timeout=1.0, workers=2))
+    try:
+        with ThreadPoolExecutor(2) as ex:
+            sb.call(_pid)
+            list(ex.map(lambda _: sb.call(_spin, 0.2), range(2)))  # both started
+            stuck = ex.submit(sb.call, _stuck, 30.0)
+            time.sleep(1.8)
+            # Still running when the stuck worker is killed (at 2s): retried
+            healthy = ex.submit(sb.call, _spin, 0.4)
+            with pytest.raises(ParseFailure) as e:
+                stuck.result()
+            assert e.value.kind == "timeout"
+            assert healthy.result() is None
+    finally:
+        sb.shutdown()
+
+
+def test_queued_calls_do_not_time_out(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("mywbooks.sandbox._KILL_GRACE", 0.2)
+    sb = ParseSandbox(ParseLimits(timeout=1.0, workers=1))
+    try:
+        sb.call(_pid)  # worker started
+        # Each call fits its limit, but not along with the wait for the other
+        with ThreadPoolExecutor(2) as ex:
+            calls = [ex.submit(sb.call, _spin, 0.8) for _ in range(2)]
+            assert [c.result() for c in calls] == [None, None]
+    finally:
+        sb.shutdown()
+
+
+def test_discovers_fiction_from_a_page_downloaded_here(
+    sandbox: ParseSandbox, tmp_path: Path
+):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    fdm = FakeDownloadManager(tmp_path, {FICTION_URL: FICTION_PAGE})
+    fiction = sandbox.discover_fiction(prov, fdm, Url(f"{FICTION_URL}/boxed"))
+    # The download ran in this process, the parse in the worker
+    assert fdm.calls == {FICTION_URL: 1}
+    assert fiction == prov.discover_fiction(fdm, Url(FICTION_URL))
+    assert fiction.meta.title == "Boxed Fiction"
+
+
+def test_provider_errors_keep_their_type(sandbox: ParseSandbox):
+    prov = get_provider_by_key(ProviderKey.ROYALROAD)
+    with pytest.raises(ChapterParseError) as e:
+        sandbox.extract_chapter_html(
+            prov, b"<html></html>", options=ExtractOptions(url="u", strict=True)
+        )
+    assert e.value.url == "u"
+    assert e.value.tried_selectors
+
+
+class _FailingSandbox(ParseSandbox):
+    def call(self, fn, *args, url=None):
+        raise ParseFailure("timeout", "exceeded 1s", url)
+
+
+def test_ensure_chapter_content_records_failures(db_session: Session, tmp_path: Path):
+    book = models.Book(
+        provider=ProviderKey.ROYALROAD,
+        provider_fiction_uid="royalroad:sandbox",
+        source_url="https://www.royalroad.com/fiction/11",
+        title="Sandbox",
+        language="en",
+    )
+    db_session.add(book)
+    db_session.commit()
+    db_session.add(
+        models.Chapter(
+            book_id=book.id,
+            index=0,
+            title="Chapter 1",
+            provider_chapter_id="royalroad:s1",
+            source_url="https://www.royalroad.com/fiction/11/chapter/1",
+            is_fetched=False,
+        )
+    )
+    db_session.commit()
+    ch = book.chapters[0]
+    fdm = FakeDownloadManager(tmp_path, {ch.source_url: PAGE})
+
+    progress = ensure_chapter_content(db_session, book, fdm, sandbox=_FailingSandbox())
+    assert progress.failed == 1 and progress.fetched == 0
+    assert ch.parse_error == "timeout: exceeded 1s"
+    assert ch.content_hash is None
+
+    assert ensure_chapter_content(db_session, book, fdm).fetched == 1
+    assert ch.parse_error is None
+    assert "Inside the box." in read_chapter_html(db_session, ch)
+
+    db_session.delete(book)
+    db_session.commit()
@@ -0,0 +1,41 @@
+import hashlib
+
+from pydantic_core import Url
+
+from mywbooks.urls import canonical_url
+from mywbooks.utils import url_hash
+
+
+def test_canonical_url_normalizes():
+    cu = canonical_url("HTTPS://WWW.RoyalRoad.com/fiction/21220/x#chapter-3")
+    assert cu.text == "https://www.royalroad.com/fiction/21220/x"
+    assert cu.url == Url(cu.text)
+
+
+def test_canonical_url_resolves_against_base():
+    base = "https://www.royalroad.com/fiction/21220/mother-of-learning/chapter/1"
+    cu = canonical_url("/fiction/21220/mother-of-learning/chapter/2", base)
+    assert (
+        cu.text
+        == "https://www.royalroad.com/fiction/21220/mother-of-learning/chapter/2"
+    )
+    assert canonical_url("img/a.png", base).text.endswith("/chapter/img/a.png")
+    # absolute urls ignore the base
+    assert canonical_url("https://cdn.example/a.png", base).text == (
+        "https://cdn.example/a.png"
+    )
+
+
+def test_canonical_url_is_interned():
+    a = canonical_url("https://example.test/page")
+    assert canonical_url("https://example.test/page") is a
+    assert canonical_url(a) is a
+    assert canonical_url(Url("https://example.test/page")) is a
+
+
+def test_hash_is_compatible_with_cache_filenames():
+    # Existing cache files are named by md5(str(Url(...)))
+    url = Url("https://example.test/image.jpg")
+    expected = hashlib.md5(str(url).encode("utf-8")).hexdigest()
+    assert canonical_url(url).hash == expected
+    assert url_hash(url) == expected